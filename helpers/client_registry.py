@@ -0,0 +1,236 @@
+"""
+Process-wide registry of long-lived LLM provider clients.
+
+Clients are keyed by (provider, base_url, api key fingerprint) and share a single
+pooled httpx transport, so requests reuse keep-alive connections instead of paying a
+fresh TLS handshake per call. Provider verification (a `models.list()` round trip)
+runs once per client in a background thread instead of on every request.
+"""
+import hashlib
+import logging
+import os
+import threading
+import traceback
+from typing import Any, Callable, Dict, Optional, Tuple
+
+import httpx
+from openai import AsyncOpenAI, OpenAI
+
+logger = logging.getLogger(__name__)
+
+HTTP_MAX_CONNECTIONS = int(os.getenv("LLM_HTTP_MAX_CONNECTIONS", "100"))
+HTTP_MAX_KEEPALIVE = int(os.getenv("LLM_HTTP_MAX_KEEPALIVE", "20"))
+HTTP_KEEPALIVE_EXPIRY = float(os.getenv("LLM_HTTP_KEEPALIVE_EXPIRY", "60"))
+HTTP_TIMEOUT = float(os.getenv("LLM_HTTP_TIMEOUT", "120"))
+HTTP_CONNECT_TIMEOUT = float(os.getenv("LLM_HTTP_CONNECT_TIMEOUT", "5"))
+
+# Verification status values
+VERIFY_PENDING = "pending"
+VERIFY_RUNNING = "verifying"
+VERIFY_OK = "ok"
+VERIFY_FAILED = "failed"
+
+
+def _key_fingerprint(api_key: str) -> str:
+    """Stable fingerprint of an API key so raw secrets are never used as dict keys."""
+    return hashlib.sha256(api_key.encode("utf-8")).hexdigest()[:16]
+
+
+def _http_limits() -> httpx.Limits:
+    return httpx.Limits(
+        max_connections=HTTP_MAX_CONNECTIONS,
+        max_keepalive_connections=HTTP_MAX_KEEPALIVE,
+        keepalive_expiry=HTTP_KEEPALIVE_EXPIRY,
+    )
+
+
+def _http_timeout() -> httpx.Timeout:
+    return httpx.Timeout(HTTP_TIMEOUT, connect=HTTP_CONNECT_TIMEOUT)
+
+
+class ClientRegistry:
+    """Thread-safe cache of provider clients sharing pooled HTTP connections."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._clients: Dict[Tuple[str, Optional[str], str], Any] = {}
+        self._async_clients: Dict[Tuple[str, Tuple[str, Optional[str], str]], Any] = {}
+        self._active_keys: Dict[Tuple[str, Optional[str]], str] = {}
+        self._verification: Dict[Tuple[str, Optional[str], str], str] = {}
+        self._http_client: Optional[httpx.Client] = None
+        self._async_http_client: Optional[httpx.AsyncClient] = None
+
+    def get_http_client(self) -> httpx.Client:
+        """Shared synchronous HTTP client with connection pooling and keep-alive."""
+        with self._lock:
+            if self._http_client is None or self._http_client.is_closed:
+                self._http_client = httpx.Client(limits=_http_limits(), timeout=_http_timeout())
+            return self._http_client
+
+    def get_async_http_client(self) -> httpx.AsyncClient:
+        """Shared asynchronous HTTP client with connection pooling and keep-alive."""
+        with self._lock:
+            if self._async_http_client is None or self._async_http_client.is_closed:
+                self._async_http_client = httpx.AsyncClient(limits=_http_limits(), timeout=_http_timeout())
+            return self._async_http_client
+
+    def get_openai_client(self, provider: str, api_key: str, base_url: Optional[str] = None,
+                          wrapper: Optional[Callable[[Any], Any]] = None,
+                          http_client: Optional[httpx.Client] = None) -> Any:
+        """
+        Return the cached OpenAI-compatible client for (provider, base_url, key),
+        creating it on first use. A changed API key for the same provider/base_url
+        replaces the previous client. `http_client` overrides the shared pool
+        (e.g. the in-process stub provider transport).
+        """
+        fingerprint = _key_fingerprint(api_key)
+        cache_key = (provider, base_url, fingerprint)
+        with self._lock:
+            client = self._clients.get(cache_key)
+            if client is not None:
+                return client
+        # Build outside the lock, then publish (first writer wins)
+        client_params = {"api_key": api_key, "http_client": http_client or self.get_http_client()}
+        if base_url:
+            client_params["base_url"] = base_url
+        client = OpenAI(**client_params)
+        if wrapper:
+            client = wrapper(client)
+        client = self._publish(cache_key, client)
+        logger.info(f"Registered pooled {provider} client (base_url={base_url or 'default'})")
+        return client
+
+    def get_async_openai_client(self, provider: str, api_key: str, base_url: Optional[str] = None,
+                                wrapper: Optional[Callable[[Any], Any]] = None,
+                                http_client: Optional[httpx.AsyncClient] = None) -> Any:
+        """Async counterpart of `get_openai_client`, sharing the same key and verification state."""
+        fingerprint = _key_fingerprint(api_key)
+        cache_key = (provider, base_url, fingerprint)
+        async_key = ("async", cache_key)
+        with self._lock:
+            client = self._async_clients.get(async_key)
+            if client is not None:
+                return client
+        client_params = {"api_key": api_key, "http_client": http_client or self.get_async_http_client()}
+        if base_url:
+            client_params["base_url"] = base_url
+        client = AsyncOpenAI(**client_params)
+        if wrapper:
+            client = wrapper(client)
+        with self._lock:
+            existing = self._async_clients.get(async_key)
+            if existing is not None:
+                return existing
+            self._drop_stale_locked(provider, base_url, fingerprint)
+            self._async_clients[async_key] = client
+            self._active_keys[(provider, base_url)] = fingerprint
+        logger.info(f"Registered pooled async {provider} client (base_url={base_url or 'default'})")
+        return client
+
+    def _publish(self, cache_key, client) -> Any:
+        """Store a freshly built client unless another thread won the race."""
+        provider, base_url, fingerprint = cache_key
+        with self._lock:
+            existing = self._clients.get(cache_key)
+            if existing is not None:
+                return existing
+            self._drop_stale_locked(provider, base_url, fingerprint)
+            self._clients[cache_key] = client
+            self._active_keys[(provider, base_url)] = fingerprint
+            self._verification.setdefault(cache_key, VERIFY_PENDING)
+        return client
+
+    def get_client(self, provider: str, api_key: str, factory: Callable[[], Any]) -> Any:
+        """Return a cached client for providers that are not OpenAI-compatible."""
+        fingerprint = _key_fingerprint(api_key)
+        cache_key = (provider, None, fingerprint)
+        with self._lock:
+            client = self._clients.get(cache_key)
+            if client is not None:
+                return client
+        client = factory()
+        with self._lock:
+            existing = self._clients.get(cache_key)
+            if existing is not None:
+                return existing
+            self._drop_stale_locked(provider, None, fingerprint)
+            self._clients[cache_key] = client
+            self._active_keys[(provider, None)] = fingerprint
+            self._verification.setdefault(cache_key, VERIFY_OK)
+        return client
+
+    def _drop_stale_locked(self, provider: str, base_url: Optional[str], fingerprint: str):
+        """Forget clients built from previous credentials. Caller holds the lock."""
+        previous = self._active_keys.get((provider, base_url))
+        if previous and previous != fingerprint:
+            stale_key = (provider, base_url, previous)
+            self._clients.pop(stale_key, None)
+            self._async_clients.pop(("async", stale_key), None)
+            self._verification.pop(stale_key, None)
+            logger.info(f"Credentials changed for {provider}; discarded cached client")
+
+    def verification_status(self, provider: str, api_key: str, base_url: Optional[str] = None) -> Optional[str]:
+        """Return the verification status, or None if no client is registered."""
+        with self._lock:
+            return self._verification.get((provider, base_url, _key_fingerprint(api_key)))
+
+    def verify_in_background(self, provider: str, api_key: str, base_url: Optional[str] = None):
+        """Schedule a one-off `models.list()` check for a registered client, if still pending."""
+        cache_key = (provider, base_url, _key_fingerprint(api_key))
+        with self._lock:
+            client = self._clients.get(cache_key)
+            if client is None or self._verification.get(cache_key) != VERIFY_PENDING:
+                return
+            # Mark as in progress so concurrent callers don't spawn duplicate checks
+            self._verification[cache_key] = VERIFY_RUNNING
+        thread = threading.Thread(
+            target=self._verify, args=(cache_key, client), daemon=True, name=f"verify-{provider}"
+        )
+        thread.start()
+
+    def verify(self, provider: str, api_key: str, base_url: Optional[str] = None) -> Optional[str]:
+        """Synchronously verify a registered client (used at warm-up)."""
+        cache_key = (provider, base_url, _key_fingerprint(api_key))
+        with self._lock:
+            client = self._clients.get(cache_key)
+        if client is None:
+            return None
+        return self._verify(cache_key, client)
+
+    def _verify(self, cache_key, client) -> str:
+        provider = cache_key[0]
+        try:
+            models = client.models.list()
+            model_ids = [m.id for m in models.data[:3]] if hasattr(models, 'data') else []
+            status = VERIFY_OK
+            logger.info(f"{provider} client verified with models: {model_ids}")
+        except Exception as e:
+            status = VERIFY_FAILED
+            logger.error(f"{provider} client failed to list models: {str(e)}")
+            logger.debug(traceback.format_exc())
+        with self._lock:
+            if cache_key in self._clients:
+                self._verification[cache_key] = status
+        return status
+
+    def clear(self):
+        """Drop all cached clients and close the shared sync HTTP pool."""
+        with self._lock:
+            self._clients.clear()
+            self._async_clients.clear()
+            self._active_keys.clear()
+            self._verification.clear()
+            http_client, self._http_client = self._http_client, None
+            self._async_http_client = None
+        if http_client is not None and not http_client.is_closed:
+            http_client.close()
+
+    async def aclose(self):
+        """Close the shared async HTTP pool, then clear everything else."""
+        async_http_client = self._async_http_client
+        if async_http_client is not None and not async_http_client.is_closed:
+            await async_http_client.aclose()
+        self.clear()
+
+
+client_registry = ClientRegistry()
@@ -3,10 +3,12 @@ from enum import Enum
 import os
 from pathlib import Path
 from dotenv import load_dotenv
-from openai import OpenAI
 import logging
 import traceback
 from langsmith.wrappers import wrap_openai
+from helpers.client_registry import client_registry
+from helpers.provider_router import provider_router
+from helpers.stub_provider import LLM_STUB_ENABLED, STUB_API_KEY, STUB_BASE_URL, STUB_MODELS
 
 logging.basicConfig(level=logging.INFO, 
                    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
@@ -17,18 +19,24 @@ class ModelProvider(str, Enum):
     GROQ = "groq"
     GEMINI = "gemini"
     NVIDIA = "nvidia"
+    STUB = "stub"
     
 GPT_MODELS = ["gpt-4o", "gpt-4-turbo", "gpt-3.5-turbo"]
 GROQ_MODELS = ["deepseek-r1-distill-qwen-32b", "llama3-70b-8192", "llama-3.3-70b-specdec"]
 GEMINI_MODELS = ["gemini-2.0-flash", "gemini-2.5-pro-exp-03-25", "models/gemini-2.0-flash-lite"]
 NVIDIA_MODELS = ["deepseek-ai/deepseek-r1", "nvidia/llama-3.3-nemotron-super-49b-v1", "qwq-32b", "meta/llama-3.3-70b-instruct"]
 
+# Order used to break ties between providers the router has no latency data for
+DEFAULT_PROVIDER_PREFERENCE = [ModelProvider.GROQ, ModelProvider.GPT, ModelProvider.NVIDIA, ModelProvider.GEMINI, ModelProvider.STUB]
+
 # Provider configuration
 PROVIDER_CONFIG = {
     ModelProvider.GPT: {"base_url": None, "key_env": "OPENAI_API_KEY", "default_model": "gpt-4o", "models": GPT_MODELS},
     ModelProvider.GROQ: {"base_url": "https://api.groq.com/openai/v1", "key_env": "GROQ_API_KEY", "default_model": "llama3-70b-8192", "models": GROQ_MODELS},
     ModelProvider.NVIDIA: {"base_url": "https://integrate.api.nvidia.com/v1", "key_env": "NVIDIA_API_KEY", "default_model": "deepseek-ai/deepseek-r1", "models": NVIDIA_MODELS},
     ModelProvider.GEMINI: {"key_env": "GEMINI_API_KEY", "default_model": "gemini-2.0-flash", "models": GEMINI_MODELS},
+    # In-process stub for load testing; only available with LLM_STUB_ENABLED=true
+    ModelProvider.STUB: {"base_url": STUB_BASE_URL, "key_env": None, "default_model": STUB_MODELS[0], "models": STUB_MODELS},
 }
 
 project_root = Path(__file__).parents[2] 
@@ -62,43 +70,44 @@ def setup_langsmith_env():
         return True
     return False
 
-def init_openai_compatible_client(api_key: str, base_url: Optional[str] = None) -> Tuple[Any, bool]:
-    """Initialize an OpenAI-compatible client."""
+def _wrap_with_langsmith(client: Any) -> Any:
+    """Apply LangSmith tracing to a freshly built client if tracing is enabled."""
+    if setup_langsmith_env():
+        try:
+            client = wrap_openai(client)
+            logger.info("Successfully wrapped client with LangSmith")
+        except Exception as e:
+            logger.error(f"Failed to wrap client with LangSmith: {str(e)}")
+    return client
+
+def init_openai_compatible_client(api_key: str, base_url: Optional[str] = None, provider: str = "openai",
+                                  asynchronous: bool = False) -> Tuple[Any, bool]:
+    """
+    Get a pooled OpenAI-compatible client from the process-wide registry.
+    The client is built once per (provider, base_url, key) and verified in the background.
+    With asynchronous=True an AsyncOpenAI client sharing the same credentials is returned.
+    """
     if not api_key:
         return None, False
     
     try:
-        # Initialize client with appropriate base URL if needed
-        client_params = {"api_key": api_key}
-        if base_url:
-            client_params["base_url"] = base_url
-        
-        client = OpenAI(**client_params)
-        
-        # Try to list models to verify the client works
-        try:
-            models = client.models.list()
-            model_ids = [m.id for m in models.data[:3]] if hasattr(models, 'data') else []
-            logger.info(f"Client initialized successfully with models: {model_ids}")
-        except Exception as model_error:
-            logger.error(f"Client created but failed to list models: {str(model_error)}")
-        
-        # Apply LangSmith wrapping if enabled
-        if setup_langsmith_env():
-            try:
-                client = wrap_openai(client)
-                logger.info("Successfully wrapped client with LangSmith")
-            except Exception as e:
-                logger.error(f"Failed to wrap client with LangSmith: {str(e)}")
-        
+        client = client_registry.get_openai_client(provider, api_key, base_url, wrapper=_wrap_with_langsmith)
+        if asynchronous:
+            client = client_registry.get_async_openai_client(provider, api_key, base_url, wrapper=_wrap_with_langsmith)
+        # Verification only runs once per client, off the request path
+        client_registry.verify_in_background(provider, api_key, base_url)
         return client, True
     except Exception as e:
         logger.error(f"Failed to initialize client: {str(e)}")
         logger.debug(traceback.format_exc())
         return None, False
 
-def initialize_client(provider: ModelProvider) -> Tuple[Any, bool]:
-    """Initialize a client for the specified provider on demand."""
+def initialize_client(provider: ModelProvider, asynchronous: bool = False) -> Tuple[Any, bool]:
+    """
+    Initialize a client for the specified provider on demand.
+    With asynchronous=True, OpenAI-compatible providers return an async client;
+    blocking-only providers (Gemini) still return their sync client.
+    """
     try:
         if isinstance(provider, str):
             provider = ModelProvider(provider.lower())
@@ -111,7 +120,22 @@ def initialize_client(provider: ModelProvider) -> Tuple[Any, bool]:
         config = PROVIDER_CONFIG[provider]
         api_key = os.getenv(config["key_env"])
         base_url = config["base_url"]
-        return init_openai_compatible_client(api_key, base_url)
+        return init_openai_compatible_client(api_key, base_url, provider=provider.value, asynchronous=asynchronous)
+    
+    # In-process stub provider, served by an httpx transport instead of the network
+    elif provider == ModelProvider.STUB:
+        if not LLM_STUB_ENABLED:
+            logger.warning("Stub provider requested but LLM_STUB_ENABLED is not set")
+            return None, False
+        from helpers.stub_provider import stub_async_http_client, stub_http_client
+        client = client_registry.get_openai_client(
+            provider.value, STUB_API_KEY, STUB_BASE_URL, http_client=stub_http_client()
+        )
+        if asynchronous:
+            client = client_registry.get_async_openai_client(
+                provider.value, STUB_API_KEY, STUB_BASE_URL, http_client=stub_async_http_client()
+            )
+        return client, True
     
     # Handle Gemini separately
     elif provider == ModelProvider.GEMINI:
@@ -121,8 +145,11 @@ def initialize_client(provider: ModelProvider) -> Tuple[Any, bool]:
             
         try:
             from google import genai
-            client = genai.Client(api_key=GEMINI_API_KEY)
-            logger.info("Gemini client initialized successfully")
+            client = client_registry.get_client(
+                ModelProvider.GEMINI.value,
+                GEMINI_API_KEY,
+                lambda: genai.Client(api_key=GEMINI_API_KEY)
+            )
             return client, True
         except Exception as e:
             logger.error(f"Failed to initialize Gemini client: {str(e)}")
@@ -131,10 +158,41 @@ def initialize_client(provider: ModelProvider) -> Tuple[Any, bool]:
     
     return None, False
 
-def select_model(provider: str, requested_model: Optional[str], creativity: Optional[float]) -> tuple:
+def provider_has_credentials(provider: ModelProvider) -> bool:
+    """Whether an API key is configured for the provider (the stub only needs enabling)."""
+    if provider == ModelProvider.STUB:
+        return LLM_STUB_ENABLED
+    return bool(os.getenv(PROVIDER_CONFIG[provider]["key_env"]))
+
+def provider_for_model(model: str) -> Optional[ModelProvider]:
+    """Find which provider serves a model name, if any."""
+    for provider, config in PROVIDER_CONFIG.items():
+        if model in config["models"]:
+            return provider
+    return None
+
+def is_provider_eligible(provider: ModelProvider) -> bool:
+    """A provider can take traffic if it has credentials and its circuit breaker isn't open."""
+    return provider_has_credentials(provider) and not provider_router.is_open(provider.value)
+
+def healthiest_providers(exclude: Optional[ModelProvider] = None) -> list:
+    """
+    Eligible providers with their default models, healthiest first according to the
+    provider router. Providers without samples keep DEFAULT_PROVIDER_PREFERENCE order.
+    """
+    candidates = [
+        (provider.value, PROVIDER_CONFIG[provider]["default_model"])
+        for provider in DEFAULT_PROVIDER_PREFERENCE
+        if provider != exclude and provider_has_credentials(provider)
+    ]
+    return [(ModelProvider(provider), model) for provider, model in provider_router.rank(candidates)]
+
+def select_model(provider: str, requested_model: Optional[str], creativity: Optional[float], asynchronous: bool = False) -> tuple:
     """
     Select the appropriate model and client based on provider and requested model.
-    This function initializes the client on-demand.
+    This function initializes the client on-demand. Pass asynchronous=True to get
+    async clients for OpenAI-compatible providers. If the requested provider has no
+    credentials or its circuit breaker is open, the healthiest eligible provider is used.
     
     Returns:
         For GPT/GROQ/NVIDIA: (client, model, temperature)
@@ -153,37 +211,33 @@ def select_model(provider: str, requested_model: Optional[str], creativity: Opti
     
     logger.info(f"Selecting model with provider: {provider}, requested_model: {requested_model}, creativity: {creativity}")
     
-    # Try to initialize the requested provider first
-    client, success = initialize_client(provider)
-    
-    if success:
-        logger.info(f"Successfully initialized {provider} client")
-        config = PROVIDER_CONFIG[provider]
-        model_list = config["models"]
-        default_model = config["default_model"]
-        
-        # Use requested model if it's in the list of valid models, otherwise use default
-        model = requested_model if requested_model in model_list else default_model
-        logger.info(f"Using {provider} model: {model}")
-        
-        # For Gemini, return None as the third value to indicate special handling is needed
-        if provider == ModelProvider.GEMINI:
-            return client, model, None
-        else:
-            return client, model, temperature
-    else:
+    # Try the requested provider first, unless it is known to be unavailable
+    if is_provider_eligible(provider):
+        client, success = initialize_client(provider, asynchronous)
+        if success:
+            logger.info(f"Successfully initialized {provider} client")
+            config = PROVIDER_CONFIG[provider]
+            model_list = config["models"]
+            default_model = config["default_model"]
+            
+            # Use requested model if it's in the list of valid models, otherwise use default
+            model = requested_model if requested_model in model_list else default_model
+            logger.info(f"Using {provider} model: {model}")
+            
+            # For Gemini, return None as the third value to indicate special handling is needed
+            if provider == ModelProvider.GEMINI:
+                return client, model, None
+            else:
+                return client, model, temperature
         logger.warning(f"Failed to initialize {provider} client")
+    else:
+        logger.warning(f"Provider {provider} is unavailable (missing credentials or circuit open)")
     
-    # If requested provider initialization failed, try others in order of preference for fallback
-    fallback_providers = [p for p in ModelProvider if p != provider]
-    
-    for fallback_provider in fallback_providers:
-        logger.warning(f"Trying fallback provider: {fallback_provider}")
-        client, success = initialize_client(fallback_provider)
+    # Fall back to the healthiest eligible provider
+    for fallback_provider, default_model in healthiest_providers(exclude=provider):
+        client, success = initialize_client(fallback_provider, asynchronous)
         
         if success:
-            config = PROVIDER_CONFIG[fallback_provider]
-            default_model = config["default_model"]
             logger.info(f"Falling back to {fallback_provider} with model {default_model}")
             
             # For Gemini, return None as the third value
@@ -196,29 +250,55 @@ def select_model(provider: str, requested_model: Optional[str], creativity: Opti
     logger.error("No language model clients could be initialized")
     raise ValueError("No language model clients could be initialized. Please check your API keys.")
 
-def determine_provider_and_model(model: Optional[str] = None) -> tuple:
+def determine_provider_and_model(model: Optional[str] = None, asynchronous: bool = False) -> tuple:
     """
     Determine the appropriate provider, client, and model based on the requested model name.
-    Initializes clients on-demand.
+    Initializes clients on-demand; asynchronous=True returns async clients where available.
+    Requests for a provider whose circuit breaker is open are routed to the healthiest
+    eligible provider's default model.
     """
     logger.info(f"Determining provider and model for requested model: {model}")
     
     # If model is specified, find which provider supports it
     if model:
-        for provider in ModelProvider:
-            if model in PROVIDER_CONFIG[provider]["models"]:
-                client, success = initialize_client(provider)
+        provider = provider_for_model(model)
+        if provider is not None:
+            if is_provider_eligible(provider):
+                client, success = initialize_client(provider, asynchronous)
                 if success:
                     return client, model, provider
+            else:
+                logger.warning(f"Provider {provider.value} for model {model} is unavailable, rerouting")
     
-    # If no model specified or couldn't find a provider for the model,
-    # try providers in order of preference
-    for provider in [ModelProvider.GROQ, ModelProvider.GPT, ModelProvider.NVIDIA, ModelProvider.GEMINI]:
-        client, success = initialize_client(provider)
+    # If no model specified or its provider is unavailable, pick the healthiest provider
+    for provider, default_model in healthiest_providers():
+        client, success = initialize_client(provider, asynchronous)
         if success:
-            default_model = PROVIDER_CONFIG[provider]["default_model"]
             return client, default_model, provider
     
     # If we get here, no clients could be initialized
     logger.error("No language model clients could be initialized")
-    raise ValueError("No language model clients could be initialized. Please check your API keys.")
\ No newline at end of file
+    raise ValueError("No language model clients could be initialized. Please check your API keys.")
+
+def probe_provider(provider_value: str):
+    """Cheap liveness check used by the provider router for half-open circuit breakers."""
+    provider = ModelProvider(provider_value)
+    client, success = initialize_client(provider)
+    if not success:
+        raise RuntimeError(f"Could not initialize {provider_value} client")
+    client.models.list()
+
+def warm_up_clients():
+    """
+    Build and verify clients for every provider with configured credentials.
+    Intended to run once at startup so request handlers never pay for verification.
+    """
+    for provider in [ModelProvider.GPT, ModelProvider.GROQ, ModelProvider.NVIDIA]:
+        config = PROVIDER_CONFIG[provider]
+        api_key = os.getenv(config["key_env"])
+        if not api_key:
+            continue
+        client, success = initialize_client(provider)
+        if success:
+            status = client_registry.verify(provider.value, api_key, config["base_url"])
+            logger.info(f"Warm-up for {provider.value}: {status}")
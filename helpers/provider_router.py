@@ -0,0 +1,193 @@
+"""
+Latency-aware LLM provider routing with per-provider circuit breakers.
+
+Every provider call is wrapped in `provider_router.track(provider, model)`, which feeds
+an EWMA of latency and error rate per (provider, model) and drives a `circuitbreaker`
+breaker per provider. Open breakers take a provider out of rotation; once the recovery
+timeout elapses (half-open), a background prober checks it with a cheap `models.list()`
+call and closes or re-opens the breaker. Routing picks the healthiest eligible provider
+instead of walking `ModelProvider` in enum order.
+"""
+import asyncio
+import logging
+import os
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+from dataclasses import dataclass, field
+from typing import Callable, Dict, Iterable, List, Optional, Tuple
+
+import openai
+from circuitbreaker import CircuitBreaker, STATE_CLOSED, STATE_HALF_OPEN, STATE_OPEN
+from prometheus_client import Gauge
+
+logger = logging.getLogger(__name__)
+
+ROUTER_EWMA_ALPHA = float(os.getenv("LLM_ROUTER_EWMA_ALPHA", "0.2"))
+ROUTER_FAILURE_THRESHOLD = int(os.getenv("LLM_ROUTER_FAILURE_THRESHOLD", "3"))
+ROUTER_RECOVERY_TIMEOUT = int(os.getenv("LLM_ROUTER_RECOVERY_TIMEOUT", "30"))
+ROUTER_PROBE_INTERVAL = float(os.getenv("LLM_ROUTER_PROBE_INTERVAL", "10"))
+# Latency assumed for a provider/model with no samples yet
+ROUTER_PRIOR_LATENCY = float(os.getenv("LLM_ROUTER_PRIOR_LATENCY", "2.0"))
+# How strongly recent errors penalise a provider's score
+ROUTER_ERROR_PENALTY = float(os.getenv("LLM_ROUTER_ERROR_PENALTY", "5.0"))
+# Successful latencies kept per provider/model for percentile estimates
+ROUTER_LATENCY_WINDOW = int(os.getenv("LLM_ROUTER_LATENCY_WINDOW", "200"))
+
+_BREAKER_STATE_VALUES = {STATE_CLOSED: 0, STATE_HALF_OPEN: 1, STATE_OPEN: 2}
+
+ROUTER_LATENCY = Gauge("llm_router_latency_ewma_seconds", "EWMA of LLM call latency", ["provider", "model"])
+ROUTER_ERROR_RATE = Gauge("llm_router_error_rate_ewma", "EWMA of LLM call error rate", ["provider", "model"])
+ROUTER_BREAKER_STATE = Gauge("llm_router_breaker_state", "Circuit breaker state (0=closed, 1=half-open, 2=open)", ["provider"])
+
+
+def is_provider_failure(error: BaseException) -> bool:
+    """Transport errors, timeouts, 429 and 5xx responses: the provider is unreachable, overloaded or failing."""
+    if isinstance(error, (openai.APIConnectionError, openai.RateLimitError)):  # APITimeoutError included
+        return True
+    return isinstance(error, openai.APIStatusError) and error.status_code >= 500
+
+
+@dataclass
+class ProviderHealth:
+    """Exponentially weighted health statistics for one provider/model."""
+    latency: float = ROUTER_PRIOR_LATENCY
+    error_rate: float = 0.0
+    samples: int = 0
+    recent: deque = field(default_factory=lambda: deque(maxlen=ROUTER_LATENCY_WINDOW))
+
+    def update(self, latency: float, failed: bool, alpha: float):
+        if self.samples == 0:
+            self.latency = latency
+            self.error_rate = 1.0 if failed else 0.0
+        else:
+            self.latency = alpha * latency + (1 - alpha) * self.latency
+            self.error_rate = alpha * (1.0 if failed else 0.0) + (1 - alpha) * self.error_rate
+        self.samples += 1
+        if not failed:
+            self.recent.append(latency)
+
+
+class ProviderRouter:
+    """Tracks provider health and ranks candidate providers for a request."""
+
+    def __init__(self, alpha: float = ROUTER_EWMA_ALPHA, failure_threshold: int = ROUTER_FAILURE_THRESHOLD,
+                 recovery_timeout: int = ROUTER_RECOVERY_TIMEOUT):
+        self.alpha = alpha
+        self.failure_threshold = failure_threshold
+        self.recovery_timeout = recovery_timeout
+        self._lock = threading.Lock()
+        self._breakers: Dict[str, CircuitBreaker] = {}
+        self._health: Dict[Tuple[str, str], ProviderHealth] = {}
+        self._probe_thread: Optional[threading.Thread] = None
+
+    def breaker(self, provider: str) -> CircuitBreaker:
+        with self._lock:
+            breaker = self._breakers.get(provider)
+            if breaker is None:
+                breaker = CircuitBreaker(
+                    failure_threshold=self.failure_threshold,
+                    recovery_timeout=self.recovery_timeout,
+                    name=f"llm-{provider}",
+                )
+                self._breakers[provider] = breaker
+                ROUTER_BREAKER_STATE.labels(provider=provider).set_function(
+                    lambda b=breaker: _BREAKER_STATE_VALUES.get(b.state, 0)
+                )
+            return breaker
+
+    def is_open(self, provider: str) -> bool:
+        """True while the provider's breaker is open (half-open counts as available)."""
+        return self.breaker(provider).state == STATE_OPEN
+
+    def health(self, provider: str, model: str) -> ProviderHealth:
+        with self._lock:
+            return self._health.setdefault((provider, model), ProviderHealth())
+
+    def record(self, provider: str, model: str, latency: float, failed: bool):
+        health = self.health(provider, model)
+        with self._lock:
+            health.update(latency, failed, self.alpha)
+        ROUTER_LATENCY.labels(provider=provider, model=model).set(health.latency)
+        ROUTER_ERROR_RATE.labels(provider=provider, model=model).set(health.error_rate)
+
+    @contextmanager
+    def track(self, provider: str, model: str):
+        """
+        Time a provider call and feed its outcome to the EWMA stats and the breaker.
+        Cancelled calls (hedge losers, abandoned requests) say nothing about the provider's
+        health and are not recorded. Other errors count against the provider only when
+        `is_provider_failure`; client errors (4xx, unparseable output, admission timeouts)
+        are raised without recording the call.
+        """
+        breaker = self.breaker(provider)
+        start = time.monotonic()
+        try:
+            yield
+        except asyncio.CancelledError:
+            # The breaker would count a BaseException as a success and reset itself
+            raise
+        except Exception as e:
+            if not is_provider_failure(e):
+                breaker.__exit__(None, None, None)
+                raise
+            breaker.__exit__(type(e), e, e.__traceback__)
+            self.record(provider, model, time.monotonic() - start, True)
+            if self.is_open(provider):
+                logger.warning(f"Circuit breaker opened for LLM provider '{provider}'")
+            raise
+        breaker.__exit__(None, None, None)
+        self.record(provider, model, time.monotonic() - start, False)
+
+    def latency_percentile(self, provider: str, model: str, percentile: float, min_samples: int = 1) -> Optional[float]:
+        """Percentile (0-1) of recent successful latencies, or None with fewer than min_samples."""
+        health = self.health(provider, model)
+        with self._lock:
+            samples = sorted(health.recent)
+        if len(samples) < max(min_samples, 1):
+            return None
+        index = min(int(percentile * len(samples)), len(samples) - 1)
+        return samples[index]
+
+    def score(self, provider: str, model: str) -> float:
+        """Lower is better: expected latency inflated by the recent error rate."""
+        health = self.health(provider, model)
+        return health.latency * (1 + ROUTER_ERROR_PENALTY * health.error_rate)
+
+    def rank(self, candidates: Iterable[Tuple[str, str]]) -> List[Tuple[str, str]]:
+        """
+        Order (provider, model) candidates healthiest first, dropping providers with an
+        open breaker. Ties keep the caller's preference order.
+        """
+        candidates = list(candidates)
+        eligible = [(i, c) for i, c in enumerate(candidates) if not self.is_open(c[0])]
+        eligible.sort(key=lambda item: (self.score(*item[1]), item[0]))
+        return [c for _, c in eligible]
+
+    def start_probing(self, probe: Callable[[str], None], interval: float = ROUTER_PROBE_INTERVAL):
+        """
+        Start a daemon thread that probes half-open providers with `probe(provider)`.
+        The probe runs inside the breaker, so success closes it and failure re-opens it.
+        """
+        if self._probe_thread is not None:
+            return
+
+        def _loop():
+            while True:
+                time.sleep(interval)
+                with self._lock:
+                    half_open = [p for p, b in self._breakers.items() if b.state == STATE_HALF_OPEN]
+                for provider in half_open:
+                    try:
+                        with self.breaker(provider):
+                            probe(provider)
+                        logger.info(f"Half-open probe succeeded for '{provider}'; breaker closed")
+                    except Exception as e:
+                        logger.warning(f"Half-open probe failed for '{provider}': {str(e)}")
+
+        self._probe_thread = threading.Thread(target=_loop, daemon=True, name="llm-router-probe")
+        self._probe_thread.start()
+
+
+provider_router = ProviderRouter()
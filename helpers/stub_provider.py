@@ -0,0 +1,367 @@
+"""
+In-process OpenAI-compatible stub provider for load and latency testing.
+
+The stub is an httpx transport, so the regular OpenAI and LangChain clients talk
+to it exactly as they would to a live provider, without any network. It serves
+`GET /models` and `POST /chat/completions` including streaming, tool calls and
+`json_schema` / `json_object` structured output.
+
+Configuration (environment):
+
+- LLM_STUB_ENABLED              register the stub as the `stub` provider (default false)
+- LLM_STUB_LATENCY              time to first token: "fixed:0.2", "uniform:0.1,0.5",
+                                "normal:0.3,0.1" or "lognormal:-1.5,0.5" (seconds)
+- LLM_STUB_TOKENS_PER_SECOND    completion token rate; 0 returns instantly after the latency
+- LLM_STUB_FAILURE_RATE         probability (0-1) of answering with LLM_STUB_FAILURE_STATUS
+- LLM_STUB_FAILURE_STATUS       HTTP status for injected failures (default 500; 429 adds Retry-After)
+- LLM_STUB_RESPONSE_TEMPLATE    text reply template; {last_user_message}, {model} and
+                                {message_count} are substituted
+- LLM_STUB_RESPONSES_PATH       JSON list of {"match": regex, "response": template} rules
+                                (canned text is returned verbatim, even for JSON prompts),
+                                optionally with "tool_call": {"name": ..., "arguments": {...}};
+                                the first rule matching the last user message wins
+- LLM_STUB_SEED                 seed for latency and failure sampling
+"""
+import asyncio
+import json
+import logging
+import os
+import random
+import re
+import threading
+import time
+import uuid
+from dataclasses import dataclass, field
+from typing import Any, Dict, Iterator, AsyncIterator, List, Optional, Tuple
+
+import httpx
+
+logger = logging.getLogger(__name__)
+
+LLM_STUB_ENABLED = os.getenv("LLM_STUB_ENABLED", "false").lower() == "true"
+STUB_BASE_URL = "http://llm-stub.local/v1"
+STUB_API_KEY = "stub"
+STUB_MODELS = ["stub-chat", "stub-fast"]
+
+DEFAULT_RESPONSE_TEMPLATE = "Stub response to: {last_user_message}"
+
+
+@dataclass
+class StubSettings:
+    latency: str = "fixed:0"
+    tokens_per_second: float = 0.0
+    failure_rate: float = 0.0
+    failure_status: int = 500
+    response_template: str = DEFAULT_RESPONSE_TEMPLATE
+    rules: List[Dict[str, Any]] = field(default_factory=list)
+    seed: Optional[int] = None
+
+    @classmethod
+    def from_env(cls) -> "StubSettings":
+        rules = []
+        rules_path = os.getenv("LLM_STUB_RESPONSES_PATH")
+        if rules_path:
+            try:
+                with open(rules_path, "r", encoding="utf-8") as f:
+                    rules = json.load(f)
+            except (OSError, ValueError) as e:
+                logger.error(f"Could not load stub responses from {rules_path}: {str(e)}")
+        seed = os.getenv("LLM_STUB_SEED")
+        return cls(
+            latency=os.getenv("LLM_STUB_LATENCY", "fixed:0"),
+            tokens_per_second=float(os.getenv("LLM_STUB_TOKENS_PER_SECOND", "0")),
+            failure_rate=float(os.getenv("LLM_STUB_FAILURE_RATE", "0")),
+            failure_status=int(os.getenv("LLM_STUB_FAILURE_STATUS", "500")),
+            response_template=os.getenv("LLM_STUB_RESPONSE_TEMPLATE", DEFAULT_RESPONSE_TEMPLATE),
+            rules=rules,
+            seed=int(seed) if seed else None,
+        )
+
+
+def _token_count(text: str) -> int:
+    return max(1, len(text) // 4) if text else 0
+
+
+def _message_text(message: Dict[str, Any]) -> str:
+    content = message.get("content") or ""
+    if isinstance(content, list):
+        return " ".join(part.get("text", "") for part in content if isinstance(part, dict))
+    return str(content)
+
+
+def instance_from_schema(schema: Dict[str, Any], defs: Optional[Dict[str, Any]] = None, text: str = "stub") -> Any:
+    """Build a minimal value that validates against a JSON schema."""
+    defs = defs if defs is not None else schema.get("$defs", schema.get("definitions", {}))
+    if "$ref" in schema:
+        return instance_from_schema(defs.get(schema["$ref"].split("/")[-1], {}), defs, text)
+    if "default" in schema:
+        return schema["default"]
+    if "const" in schema:
+        return schema["const"]
+    if "enum" in schema:
+        return schema["enum"][0]
+    for key in ("anyOf", "oneOf", "allOf"):
+        if key in schema:
+            if any(o.get("type") == "null" for o in schema[key]):
+                return None  # Optional fields stay empty
+            return instance_from_schema(schema[key][0], defs, text)
+
+    schema_type = schema.get("type", "object")
+    if isinstance(schema_type, list):
+        schema_type = next((t for t in schema_type if t != "null"), "null")
+    if schema_type == "object":
+        properties = schema.get("properties", {})
+        return {name: instance_from_schema(prop, defs, text) for name, prop in properties.items()}
+    if schema_type == "array":
+        return []
+    if schema_type == "string":
+        return text
+    if schema_type == "integer":
+        return schema.get("minimum", 0)
+    if schema_type == "number":
+        return schema.get("minimum", 0.0)
+    if schema_type == "boolean":
+        return False
+    return None
+
+
+class StubLLM:
+    """Builds chat-completion responses and timings for the stub transports."""
+
+    def __init__(self, settings: Optional[StubSettings] = None):
+        self.settings = settings or StubSettings.from_env()
+        self._random = random.Random(self.settings.seed)
+        self._lock = threading.Lock()
+
+    def _sample_latency(self) -> float:
+        kind, _, params = self.settings.latency.partition(":")
+        values = [float(v) for v in params.split(",") if v.strip()] or [0.0]
+        with self._lock:
+            if kind == "uniform":
+                sample = self._random.uniform(values[0], values[-1])
+            elif kind == "normal":
+                sample = self._random.gauss(values[0], values[1] if len(values) > 1 else 0.0)
+            elif kind == "lognormal":
+                sample = self._random.lognormvariate(values[0], values[1] if len(values) > 1 else 0.0)
+            else:
+                sample = values[0]
+        return max(sample, 0.0)
+
+    def _should_fail(self) -> bool:
+        if self.settings.failure_rate <= 0:
+            return False
+        with self._lock:
+            return self._random.random() < self.settings.failure_rate
+
+    def _token_delay(self) -> float:
+        rate = self.settings.tokens_per_second
+        return 1.0 / rate if rate > 0 else 0.0
+
+    def _reply(self, body: Dict[str, Any]) -> Tuple[str, Optional[Dict[str, Any]]]:
+        """Return (text, tool_call) for a chat-completions request body."""
+        messages = body.get("messages", [])
+        last_user = next((_message_text(m) for m in reversed(messages) if m.get("role") == "user"), "")
+        variables = {"last_user_message": last_user, "model": body.get("model"), "message_count": len(messages)}
+
+        template, tool_call, rule_matched = self.settings.response_template, None, False
+        for rule in self.settings.rules:
+            if re.search(rule.get("match", ""), last_user, re.IGNORECASE):
+                template = rule.get("response", template)
+                tool_call = rule.get("tool_call")
+                rule_matched = True
+                break
+        try:
+            text = template.format(**variables)
+        except (KeyError, IndexError, ValueError):
+            text = template
+
+        # Forced function calls (LangChain function_calling structured output) always get a tool call
+        tools = {t["function"]["name"]: t["function"] for t in body.get("tools", []) if t.get("type") == "function"}
+        tool_choice = body.get("tool_choice")
+        if isinstance(tool_choice, dict) and tool_choice.get("type") == "function":
+            name = tool_choice["function"]["name"]
+            arguments = tool_call.get("arguments") if tool_call and tool_call.get("name") == name else None
+            if arguments is None:
+                arguments = instance_from_schema(tools.get(name, {}).get("parameters", {}), text=text)
+            tool_call = {"name": name, "arguments": arguments}
+        elif tool_call and tool_call.get("name") not in tools:
+            tool_call = None
+
+        response_format = body.get("response_format") or {}
+        # Prompts that ask for JSON in prose (e.g. intent detection) get a JSON object too
+        wants_json = response_format.get("type") == "json_object" or any(
+            m.get("role") == "system" and "json" in _message_text(m).lower() for m in messages
+        )
+        if tool_call is None and response_format.get("type") == "json_schema":
+            text = json.dumps(instance_from_schema(response_format["json_schema"].get("schema", {}), text=text))
+        elif tool_call is None and wants_json and not rule_matched:
+            text = json.dumps({"response": text})
+
+        max_tokens = body.get("max_tokens") or body.get("max_completion_tokens")
+        if max_tokens and tool_call is None and response_format.get("type") is None and not wants_json:
+            text = text[: max_tokens * 4]
+        return text, tool_call
+
+    def _usage(self, body: Dict[str, Any], text: str, tool_call: Optional[Dict[str, Any]]) -> Dict[str, int]:
+        prompt_tokens = sum(_token_count(_message_text(m)) for m in body.get("messages", []))
+        completion_tokens = _token_count(json.dumps(tool_call["arguments"]) if tool_call else text)
+        return {
+            "prompt_tokens": prompt_tokens,
+            "completion_tokens": completion_tokens,
+            "total_tokens": prompt_tokens + completion_tokens,
+        }
+
+    def _completion(self, body: Dict[str, Any], text: str, tool_call: Optional[Dict[str, Any]]) -> Dict[str, Any]:
+        message: Dict[str, Any] = {"role": "assistant", "content": None if tool_call else text}
+        if tool_call:
+            message["tool_calls"] = [{
+                "id": f"call_{uuid.uuid4().hex[:12]}",
+                "type": "function",
+                "function": {"name": tool_call["name"], "arguments": json.dumps(tool_call["arguments"])},
+            }]
+        return {
+            "id": f"chatcmpl-stub-{uuid.uuid4().hex[:12]}",
+            "object": "chat.completion",
+            "created": int(time.time()),
+            "model": body.get("model"),
+            "choices": [{"index": 0, "message": message, "finish_reason": "tool_calls" if tool_call else "stop"}],
+            "usage": self._usage(body, text, tool_call),
+        }
+
+    def _chunks(self, body: Dict[str, Any], text: str, tool_call: Optional[Dict[str, Any]]) -> List[str]:
+        """Server-sent event payloads for a streamed completion, one per token."""
+        base = {"id": f"chatcmpl-stub-{uuid.uuid4().hex[:12]}", "object": "chat.completion.chunk",
+                "created": int(time.time()), "model": body.get("model")}
+
+        def chunk(delta: Dict[str, Any], finish_reason: Optional[str] = None, **extra) -> str:
+            payload = dict(base, choices=[{"index": 0, "delta": delta, "finish_reason": finish_reason}], **extra)
+            return f"data: {json.dumps(payload)}\n\n"
+
+        events = [chunk({"role": "assistant", "content": ""})]
+        if tool_call:
+            arguments = json.dumps(tool_call["arguments"])
+            events.append(chunk({"tool_calls": [{
+                "index": 0, "id": f"call_{uuid.uuid4().hex[:12]}", "type": "function",
+                "function": {"name": tool_call["name"], "arguments": ""},
+            }]}))
+            pieces = [arguments[i:i + 4] for i in range(0, len(arguments), 4)]
+            events.extend(chunk({"tool_calls": [{"index": 0, "function": {"arguments": p}}]}) for p in pieces)
+            events.append(chunk({}, "tool_calls"))
+        else:
+            events.extend(chunk({"content": token}) for token in re.findall(r"\S+\s*|\s+", text))
+            events.append(chunk({}, "stop"))
+        if (body.get("stream_options") or {}).get("include_usage"):
+            events.append(f"data: {json.dumps(dict(base, choices=[], usage=self._usage(body, text, tool_call)))}\n\n")
+        events.append("data: [DONE]\n\n")
+        return events
+
+    def _route(self, request: httpx.Request) -> Tuple[Optional[httpx.Response], Optional[Dict[str, Any]]]:
+        """Return an immediate response, or the parsed chat-completions body to answer."""
+        path = request.url.path
+        if request.method == "GET" and path.endswith("/models"):
+            return httpx.Response(200, json={
+                "object": "list",
+                "data": [{"id": m, "object": "model", "created": 0, "owned_by": "stub"} for m in STUB_MODELS],
+            }), None
+        if request.method != "POST" or not path.endswith("/chat/completions"):
+            return httpx.Response(404, json={"error": {"message": f"Stub provider does not serve {path}"}}), None
+        try:
+            body = json.loads(request.content or b"{}")
+        except ValueError:
+            return httpx.Response(400, json={"error": {"message": "Invalid JSON body"}}), None
+        if self._should_fail():
+            status = self.settings.failure_status
+            headers = {"retry-after": "1"} if status == 429 else None
+            return httpx.Response(status, headers=headers, json={
+                "error": {"message": "Injected stub failure", "type": "stub_failure"}
+            }), None
+        return None, body
+
+    def handle(self, request: httpx.Request) -> httpx.Response:
+        immediate, body = self._route(request)
+        if immediate is not None:
+            return immediate
+        text, tool_call = self._reply(body)
+        time.sleep(self._sample_latency())
+        delay = self._token_delay()
+        if not body.get("stream"):
+            completion = self._completion(body, text, tool_call)
+            time.sleep(delay * completion["usage"]["completion_tokens"])
+            return httpx.Response(200, json=completion)
+
+        events = self._chunks(body, text, tool_call)
+
+        def stream() -> Iterator[bytes]:
+            for event in events:
+                if delay:
+                    time.sleep(delay)
+                yield event.encode("utf-8")
+
+        return httpx.Response(200, headers={"content-type": "text/event-stream"}, content=stream())
+
+    async def ahandle(self, request: httpx.Request) -> httpx.Response:
+        immediate, body = self._route(request)
+        if immediate is not None:
+            return immediate
+        text, tool_call = self._reply(body)
+        await asyncio.sleep(self._sample_latency())
+        delay = self._token_delay()
+        if not body.get("stream"):
+            completion = self._completion(body, text, tool_call)
+            await asyncio.sleep(delay * completion["usage"]["completion_tokens"])
+            return httpx.Response(200, json=completion)
+
+        events = self._chunks(body, text, tool_call)
+
+        async def stream() -> AsyncIterator[bytes]:
+            for event in events:
+                if delay:
+                    await asyncio.sleep(delay)
+                yield event.encode("utf-8")
+
+        return httpx.Response(200, headers={"content-type": "text/event-stream"}, content=stream())
+
+
+_stub: Optional[StubLLM] = None
+_http_client: Optional[httpx.Client] = None
+_async_http_client: Optional[httpx.AsyncClient] = None
+_lock = threading.Lock()
+
+
+def get_stub() -> StubLLM:
+    global _stub
+    with _lock:
+        if _stub is None:
+            _stub = StubLLM()
+        return _stub
+
+
+def stub_http_client() -> httpx.Client:
+    """Synchronous HTTP client whose transport is the in-process stub."""
+    global _http_client
+    stub = get_stub()
+    with _lock:
+        if _http_client is None:
+            _http_client = httpx.Client(transport=httpx.MockTransport(stub.handle), base_url=STUB_BASE_URL)
+        return _http_client
+
+
+def stub_async_http_client() -> httpx.AsyncClient:
+    """Asynchronous HTTP client whose transport is the in-process stub."""
+    global _async_http_client
+    stub = get_stub()
+    with _lock:
+        if _async_http_client is None:
+            _async_http_client = httpx.AsyncClient(transport=httpx.MockTransport(stub.ahandle), base_url=STUB_BASE_URL)
+        return _async_http_client
+
+
+def stub_chat_openai_kwargs(model: str = STUB_MODELS[0]) -> Dict[str, Any]:
+    """Keyword arguments pointing a LangChain ChatOpenAI at the stub provider."""
+    return {
+        "model": model,
+        "api_key": STUB_API_KEY,
+        "base_url": STUB_BASE_URL,
+        "http_client": stub_http_client(),
+        "http_async_client": stub_async_http_client(),
+    }
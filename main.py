@@ -17,6 +17,9 @@ import sys
 from datetime import datetime
 import asyncio
 from services.sse import background_task
+from helpers.model_helpers import probe_provider, warm_up_clients
+from helpers.client_registry import client_registry
+from helpers.provider_router import provider_router
 
 logging.basicConfig(
     level=logging.INFO,
@@ -30,8 +33,12 @@ service_registry = ServiceRegistry()
 async def lifespan(app: FastAPI):
     service_registry.register_service()
     service_registry.start_heartbeat()
+    # Build and verify LLM clients off the request path
+    threading.Thread(target=warm_up_clients, daemon=True, name="llm-warm-up").start()
+    provider_router.start_probing(probe_provider)
     yield
     service_registry.deregister_service()
+    await client_registry.aclose()
     
 app = FastAPI(
     title="Core service",
@@ -82,7 +89,7 @@ async def log_requests(request: Request, call_next):
         request_timeout = 30.0  # 30 seconds default timeout
         
         # Customize timeout for specific endpoints that may take longer
-        if "/generate" in path or "/process" in path:
+        if "/generate" in path or "/process" in path or "/batch" in path:
             request_timeout = 120.0
         
         # Execute request with timeout
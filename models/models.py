@@ -1,4 +1,4 @@
-from sqlalchemy import Column, String, Integer, ForeignKey, DateTime, Table, Boolean
+from sqlalchemy import Column, String, Integer, ForeignKey, DateTime, Table, Boolean, LargeBinary, Index
 from sqlalchemy.dialects.postgresql import UUID
 from sqlalchemy.orm import relationship
 from sqlalchemy.ext.declarative import declarative_base
@@ -243,3 +243,46 @@ class Beat(Base):
     
     act = relationship("Act", back_populates="beats")
     project = relationship("Project", back_populates="beats")
+
+
+class AgentCheckpoint(Base):
+    __tablename__ = "agent_checkpoints"
+
+    thread_id = Column(String, primary_key=True)
+    checkpoint_ns = Column(String, primary_key=True, default="")
+    checkpoint_id = Column(String, primary_key=True)
+    parent_checkpoint_id = Column(String, nullable=True)
+    type = Column(String, nullable=True)
+    checkpoint = Column(LargeBinary, nullable=False)  # zlib-compressed, without channel values
+    checkpoint_metadata = Column("metadata", LargeBinary, nullable=True)
+    channel_versions = Column(String, nullable=True)  # JSON, used to garbage-collect blobs
+    created_at = Column(DateTime, default=datetime.utcnow)
+
+
+class AgentCheckpointBlob(Base):
+    __tablename__ = "agent_checkpoint_blobs"
+
+    thread_id = Column(String, primary_key=True)
+    checkpoint_ns = Column(String, primary_key=True, default="")
+    channel = Column(String, primary_key=True)
+    version = Column(String, primary_key=True)
+    type = Column(String, nullable=False)
+    blob = Column(LargeBinary, nullable=True)
+
+
+class AgentCheckpointWrite(Base):
+    __tablename__ = "agent_checkpoint_writes"
+
+    thread_id = Column(String, primary_key=True)
+    checkpoint_ns = Column(String, primary_key=True, default="")
+    checkpoint_id = Column(String, primary_key=True)
+    task_id = Column(String, primary_key=True)
+    idx = Column(Integer, primary_key=True)
+    channel = Column(String, nullable=False)
+    type = Column(String, nullable=True)
+    value = Column(LargeBinary, nullable=True)
+    task_path = Column(String, nullable=True, default="")
+
+    __table_args__ = (
+        Index("ix_agent_checkpoint_writes_checkpoint", "thread_id", "checkpoint_ns", "checkpoint_id"),
+    )
@@ -1,13 +1,20 @@
 from fastapi import APIRouter, Depends, HTTPException
+from fastapi.concurrency import run_in_threadpool
+from fastapi.responses import StreamingResponse
+import os
+import time
 from pydantic import Field, BaseModel
-from typing import Dict, Any, Optional
+from typing import Dict, Any, Literal, Optional, Tuple
+from prometheus_client import Histogram
 from uuid import UUID
 from sqlalchemy.orm import Session
-from database import get_db
+from database import SessionLocal, get_db
 from schemas.agent import ChatResponse
 from services.agents.chat_agent import AgentState, workflow, memory
 from services.agents.tools import CharacterLookupArgs, StoryLookupArgs, BeatLookupArgs
 from services.agents.executor import execute_suggestion_function
+from services.agents.chat.stream_events import ChatStreamRelay
+from services.sse import SSE_HEADERS, format_sse_event
 
 from langchain_core.messages import HumanMessage, AIMessage, SystemMessage
 
@@ -15,6 +22,14 @@ import logging
 
 logger = logging.getLogger(__name__)
 
+# Graph mode used when a request does not choose one: 'multi' or 'single'
+AGENT_GRAPH_MODE = os.getenv("AGENT_GRAPH_MODE", "multi")
+
+AGENT_CHAT_SECONDS = Histogram(
+    "agent_chat_turn_seconds", "Wall time of an /agent/chat turn through the graph", ["graph_mode"],
+    buckets=(0.5, 1, 2, 3, 5, 8, 13, 20, 30, 60)
+)
+
 # --- Suggestion and Response Models ---
 
 # --- Request Model ---
@@ -31,20 +46,22 @@ class ChatRequest(BaseModel):
         default_factory=dict,
         description="Parameters to pass to the be_function if specified"
     )
+    graph_mode: Optional[Literal["multi", "single"]] = Field(
+        None,
+        description="'single' answers with one structured LLM call and only falls back to the multi-call graph when needed"
+    )
 
 router = APIRouter(tags=["Agent Chat"])
 
 # --- Compile Graph ---
 compiled_graph = workflow.compile(checkpointer=memory)
 
-# --- API Endpoint ---
-@router.post("/chat", response_model=ChatResponse)
-async def chat_endpoint(request: ChatRequest, db: Session = Depends(get_db)):
+# --- Turn Setup ---
+async def _prepare_turn(request: ChatRequest, db: Session) -> Tuple[AgentState, Dict[str, Any]]:
     """
-    Receives user message or suggestion click, executes backend function if applicable,
-    and returns agent response with suggestions.
+    Executes the clicked suggestion's backend function if any, and builds the graph's
+    initial state and run config for this turn.
     """
-    
     user_input = request.message # This will be suggestion_text if suggestion was clicked
     user_id = "test_user" if not request.user_id else request.user_id
     act_id = request.act_id # Get act_id from request
@@ -64,8 +81,9 @@ async def chat_endpoint(request: ChatRequest, db: Session = Depends(get_db)):
     execution_result_message = None
     if selected_be_function:
         try:
-            # Pass function parameters directly from the request
-            result_message = execute_suggestion_function(
+            # Pass function parameters directly from the request (blocking DB work, keep it off the event loop)
+            result_message = await run_in_threadpool(
+                execute_suggestion_function,
                 function_name=selected_be_function,
                 db=db,
                 act_id=act_id,
@@ -156,20 +174,41 @@ async def chat_endpoint(request: ChatRequest, db: Session = Depends(get_db)):
         # Initialize new state fields
         pending_operation_details=None,
         awaiting_confirmation=False,
-        db_updated=False 
+        db_updated=False,
+        tool_timings=[],
+        graph_mode=request.graph_mode or AGENT_GRAPH_MODE
     )
     logger.info(f"Initial State (after potential execution): {initial_state}")
+    return initial_state, config
+
+
+# --- API Endpoint ---
+@router.post("/chat", response_model=ChatResponse)
+async def chat_endpoint(request: ChatRequest, db: Session = Depends(get_db)):
+    """
+    Receives user message or suggestion click, executes backend function if applicable,
+    and returns agent response with suggestions.
+    """
+    user_id = "test_user" if not request.user_id else request.user_id
+    initial_state, config = await _prepare_turn(request, db)
     final_state_values = None
     try:
-        logger.info("Starting graph stream...")
+        logger.info(f"Starting graph stream in '{initial_state['graph_mode']}' mode...")
+        started = time.perf_counter()
         async for event in compiled_graph.astream(initial_state, config=config, stream_mode="values"):
             logger.debug(f"Graph Event State: {event}")
             final_state_values = event
+        AGENT_CHAT_SECONDS.labels(graph_mode=initial_state['graph_mode']).observe(time.perf_counter() - started)
         logger.info("Graph stream finished.")
     except Exception as e:
         logger.error(f"Error during graph execution for user {user_id}: {e}", exc_info=True)
         raise HTTPException(status_code=500, detail=f"Agent processing error: {e}")
 
+    return _chat_response_from_state(final_state_values, request)
+
+
+def _chat_response_from_state(final_state_values: Optional[Dict[str, Any]], request: ChatRequest) -> ChatResponse:
+    """The turn's ChatResponse from the graph's final state, with fallbacks for incomplete runs."""
     # --- Extract Structured Response ---
     if final_state_values and final_state_values.get("final_response"):
         final_response_obj = final_state_values["final_response"]
@@ -228,6 +267,45 @@ async def chat_endpoint(request: ChatRequest, db: Session = Depends(get_db)):
         db_updated=db_updated_status_at_end
     )
 
+async def _stream_turn(request: ChatRequest):
+    """
+    SSE generator for /chat/stream: graph progress and response deltas as they happen,
+    then a `done` event carrying the ChatResponse (or an `error` event).
+    """
+    user_id = "test_user" if not request.user_id else request.user_id
+    # The request's `get_db` session is closed before a streamed body is sent, so the turn owns one
+    db = SessionLocal()
+    relay = ChatStreamRelay()
+    try:
+        initial_state, config = await _prepare_turn(request, db)
+        yield format_sse_event({"graph_mode": initial_state['graph_mode']}, event="start")
+        started = time.perf_counter()
+        async for mode, chunk in compiled_graph.astream(
+            initial_state, config=config, stream_mode=["debug", "messages", "values"]
+        ):
+            for sse_event in relay.relay(mode, chunk):
+                yield sse_event
+        AGENT_CHAT_SECONDS.labels(graph_mode=initial_state['graph_mode']).observe(time.perf_counter() - started)
+        response = _chat_response_from_state(relay.final_state, request)
+        yield format_sse_event(response.model_dump(mode="json"), event="done")
+    except Exception as e:
+        logger.error(f"Error during streamed graph execution for user {user_id}: {e}", exc_info=True)
+        yield format_sse_event({"detail": f"Agent processing error: {e}"}, event="error")
+    finally:
+        db.close()
+
+
+@router.post("/chat/stream")
+async def chat_stream_endpoint(request: ChatRequest):
+    """
+    Streaming variant of /chat (text/event-stream). Events: `start`, `node_start` and
+    `node_end` per graph node, `tool_call` and `tool_result`, `delta` with response text
+    as it is generated, `reset` with the full text when a retried or hedged LLM run
+    replaces the one being relayed, and finally `done` with the ChatResponse (or `error`).
+    """
+    logger.info(f"Received streaming chat request for project {request.project_id} with type {request.type}.")
+    return StreamingResponse(_stream_turn(request), media_type="text/event-stream", headers=SSE_HEADERS)
+
 # @router.post("/reset_chat")
 # async def reset_chat(
 #     user_id: str = Query(..., description="User ID"),
@@ -1,6 +1,7 @@
 from fastapi import APIRouter, HTTPException
 import logging
-from services.llm.basic_response import generate_response
+from fastapi.concurrency import run_in_threadpool
+from services.llm.basic_response import agenerate_response
 from services.name_randomizer import generate_scifi_names
 from pydantic import BaseModel
 from templates.character.randomize import randomizedNameTemplate
@@ -29,10 +30,11 @@ class CharacterNameRequest(BaseModel):
 
 
 @router.post("/randomize")
-def randomize_character_name(request: CharacterNameRequest):
+async def randomize_character_name(request: CharacterNameRequest):
     try:
-        # First attempt: Use the generate_scifi_names function
-        names = generate_scifi_names(
+        # First attempt: Use the generate_scifi_names function (blocking HTTP call, keep it off the event loop)
+        names = await run_in_threadpool(
+            generate_scifi_names,
             type_name=request.type_name,
             gender=request.gender,
             count=request.count
@@ -50,7 +52,7 @@ def randomize_character_name(request: CharacterNameRequest):
         logging.warning("API name generation failed, falling back to LLM")
         user_input = f"{request.user_input} (Type: {request.type_name}, Gender: {request.gender})"
         
-        response = generate_response(
+        response = await agenerate_response(
             system_message=randomizedNameTemplate, 
             user_input=user_input,
             temperature=0.1,
@@ -1,12 +1,19 @@
 import logging
-from fastapi import APIRouter, HTTPException, Depends
+from typing import Optional, Tuple
+from fastapi import APIRouter, HTTPException, Depends, Request
+from fastapi.responses import StreamingResponse
 from services.llm.text_analysis import extract_personality
 from templates.improvement_temps import char_temp, scene_temp, avatar_temp
 from sqlalchemy.orm import Session
 from database import get_db
-from schemas.improve import PromptInput, ImproveUniversalInput, DialogInput, DialogLine, DialogResponse, PromptInputBasic, PromptInputBasicResponse, ExtractInput, ExtractOutput, LineInput, PersonalityTraits
-from services.llm.basic_response import generate_response, get_system_prompt, get_user_prompt, generate_dialog
-from helpers.model_helpers import select_model
+from schemas.improve import PromptInput, ImproveUniversalInput, DialogInput, DialogLine, DialogResponse, PromptInputBasic, PromptInputBasicResponse, ExtractInput, ExtractOutput, LineInput, PersonalityTraits, BatchImproveRequest, BatchImproveResponse
+from services.llm.basic_response import agenerate_response, astream_response, get_system_prompt, get_user_prompt, agenerate_dialog, acomplete_with_provider
+from helpers.model_helpers import provider_for_model, select_model
+from helpers.provider_router import provider_router
+from services.llm.hedging import ahedged, hedge_delay, hedge_target, hedging_enabled
+from services.llm.response_cache import cache_policy_for
+from services.sse import SSE_HEADERS, format_sse_event
+from services.llm.batch_improve import iter_batch_results, run_batch
 
 
 logging.basicConfig(level=logging.INFO)
@@ -15,6 +22,36 @@ logger.info("Improve routes module initialized")
 
 router = APIRouter(tags=["Improve"])
 
+
+def _dialog_advanced_prompts(dialog_input: DialogInput) -> Tuple[str, str]:
+    """Build the (system, user) prompts for a structured multi-character dialog."""
+    character_descriptions = "\n".join(
+        [f"- {char.character_name}: {char.character_prompt}" for char in dialog_input.characters]
+    )
+    user_input = (
+        f"Scenery description: {dialog_input.scenery_prompt}\n\n"
+        f"Characters:\n{character_descriptions}\n\n"
+        "Generate a natural and engaging conversation between these characters, ensuring the dialog is immersive, "
+        "believable, and fits the given scenery. Structure the response as numbered dialog lines."
+    )
+
+    system_message = (
+        "You are an expert storyteller and screenwriter. Your task is to create a dynamic, engaging, and character-driven "
+        "dialog between multiple characters. Ensure each character's personality is reflected in their speech patterns, "
+        "word choices, and interaction style. Keep the dialog natural, immersive, and meaningful within the given scene."
+    )
+    return system_message, user_input
+
+
+def _parse_dialog_line(index: int, line: str) -> Optional[DialogLine]:
+    """Parse a single 'Name: text' response line into a DialogLine, or None if it isn't one."""
+    if ":" not in line:
+        return None
+    parts = line.split(":", 1)
+    character_name = parts[0].strip()
+    dialog_text = parts[1].strip()
+    return DialogLine(order=index, character_name=character_name, dialog_line=dialog_text)
+
     
 @router.post("/dialog", response_model=PromptInputBasicResponse)
 async def improve_dialog(dialog_input: PromptInputBasic):
@@ -32,19 +69,55 @@ async def improve_dialog(dialog_input: PromptInputBasic):
     client, model, temperature = select_model(
         dialog_input.model_provider, 
         dialog_input.model_name,
-        dialog_input.creativity
+        dialog_input.creativity,
+        asynchronous=True
     )
     
     # Generate dialog
     logger.info(f"Generating dialog using {model} with temperature {temperature}")
-    dialog = generate_dialog(client, model, system_prompt, user_prompt, temperature)
+    model_used = model
+    if hedging_enabled(dialog_input.hedge):
+        dialog, model_used = await _hedged_dialog(client, model, system_prompt, user_prompt, temperature)
+    else:
+        dialog = await _tracked_dialog(client, model, system_prompt, user_prompt, temperature)
     
     logger.info("Dialog generation completed successfully")
-    return {"improved_dialog": dialog, "model_used": model}
+    return {"improved_dialog": dialog, "model_used": model_used}
+
+async def _tracked_dialog(client, model: str, system_prompt: str, user_prompt: str, temperature: Optional[float]) -> str:
+    """`agenerate_dialog`, with its latency and failures recorded for the model's provider."""
+    provider = provider_for_model(model)
+    if provider is None:
+        return await agenerate_dialog(client, model, system_prompt, user_prompt, temperature)
+    with provider_router.track(provider.value, model):
+        return await agenerate_dialog(client, model, system_prompt, user_prompt, temperature)
+
+async def _hedged_dialog(client, model: str, system_prompt: str, user_prompt: str, temperature: Optional[float]) -> Tuple[str, str]:
+    """Generate dialog on the selected model, hedging to a secondary provider if it stalls."""
+    primary_provider = provider_for_model(model)
+    target = hedge_target(primary_provider) if primary_provider else None
+
+    async def primary():
+        return await _tracked_dialog(client, model, system_prompt, user_prompt, temperature), model
+
+    secondary_call = None
+    if target:
+        secondary_provider, secondary_model = target
+
+        async def secondary():
+            text = await acomplete_with_provider(
+                secondary_provider, secondary_model, system_prompt, user_prompt,
+                temperature if temperature is not None else 0.7
+            )
+            return text, secondary_model
+        secondary_call = secondary
+
+    delay = hedge_delay(primary_provider.value, model) if primary_provider else 0
+    return await ahedged(primary, secondary_call, delay, "improve.dialog")
     
 # Improve character background and story
 @router.post("/character")
-async def improve_character(prompt_input: PromptInput):
+async def improve_character(prompt_input: PromptInput, request: Request):
     """API endpoint to improve descriptions."""
     logger.info(f"Received improvement request with input: {prompt_input.text}")
     if prompt_input.type == "character":
@@ -68,32 +141,21 @@ async def improve_character(prompt_input: PromptInput):
         prompt_input.creativity
     )
     
-    improved_prompt = generate_response(system_message, prompt_input.text, model, temperature)
+    improved_prompt = await agenerate_response(
+        system_message, prompt_input.text, model, temperature,
+        cache_policy=cache_policy_for("improve.character", request.headers)
+    )
     
     logger.info(f"Improvement completed successfully using model {model}.")
     return {"improved_prompt": improved_prompt, "model_used": model}
 
 
 @router.post("/dialog-advanced", response_model=DialogResponse)
-async def improve_dialog(dialog_input: DialogInput):
+async def improve_dialog(dialog_input: DialogInput, request: Request):
     """API endpoint to generate a structured dialog between multiple characters in a given scenery."""
     logger.info(f"Received dialog improvement request with {len(dialog_input.characters)} characters.")
 
-    character_descriptions = "\n".join(
-        [f"- {char.character_name}: {char.character_prompt}" for char in dialog_input.characters]
-    )
-    user_input = (
-        f"Scenery description: {dialog_input.scenery_prompt}\n\n"
-        f"Characters:\n{character_descriptions}\n\n"
-        "Generate a natural and engaging conversation between these characters, ensuring the dialog is immersive, "
-        "believable, and fits the given scenery. Structure the response as numbered dialog lines."
-    )
-
-    system_message = (
-        "You are an expert storyteller and screenwriter. Your task is to create a dynamic, engaging, and character-driven "
-        "dialog between multiple characters. Ensure each character's personality is reflected in their speech patterns, "
-        "word choices, and interaction style. Keep the dialog natural, immersive, and meaningful within the given scene."
-    )
+    system_message, user_input = _dialog_advanced_prompts(dialog_input)
 
     # Select model and client
     client, model, temperature = select_model(
@@ -102,23 +164,24 @@ async def improve_dialog(dialog_input: DialogInput):
         dialog_input.creativity
     )
     
-    raw_response = generate_response(system_message, user_input, model, temperature)
+    raw_response = await agenerate_response(
+        system_message, user_input, model, temperature,
+        cache_policy=cache_policy_for("improve.dialog-advanced", request.headers)
+    )
 
     dialog_lines = []
     lines = raw_response.split("\n")
     for index, line in enumerate(lines, start=1):
-        if ":" in line:
-            parts = line.split(":", 1)
-            character_name = parts[0].strip()
-            dialog_text = parts[1].strip()
-            dialog_lines.append(DialogLine(order=index, character_name=character_name, dialog_line=dialog_text))
+        dialog_line = _parse_dialog_line(index, line)
+        if dialog_line:
+            dialog_lines.append(dialog_line)
 
     logger.info(f"Dialog generation completed successfully using model {model}.")
     return {"dialog": dialog_lines, "model_used": model}
 
 
 @router.post("/avatar", response_model=ExtractOutput)
-async def improve_avatar(prompt_input: ExtractInput):
+async def improve_avatar(prompt_input: ExtractInput, request: Request):
     """API endpoint to improve an avatar image of a game character"""
     logger.info(f"Received avatar improvement request with input: {prompt_input.text}")
     system_message = avatar_temp
@@ -129,14 +192,17 @@ async def improve_avatar(prompt_input: ExtractInput):
         prompt_input.model_name,
         prompt_input.creativity
     )
-    improved_prompt = generate_response(system_message, prompt_input.text, model, temperature)
+    improved_prompt = await agenerate_response(
+        system_message, prompt_input.text, model, temperature,
+        cache_policy=cache_policy_for("improve.avatar", request.headers)
+    )
     
     logger.info(f"Avatar improvement completed successfully using model {model}.")
     return {"improved_dialog": improved_prompt, "model_used": model}
 
 
 @router.post("/uni", response_model=ExtractOutput)
-async def improve_universal(prompt_input: ImproveUniversalInput):
+async def improve_universal(prompt_input: ImproveUniversalInput, request: Request):
     logger.info(f"Received universal improvement request with input: {prompt_input.instructions}")
     
     # Select model and client - fix the unpacking to match the return values
@@ -146,8 +212,145 @@ async def improve_universal(prompt_input: ImproveUniversalInput):
         0.7  # Fixed creativity for this endpoint
     )
     
-    improved_prompt = generate_response(prompt_input.instructions, prompt_input.type, model, temperature)
+    improved_prompt = await agenerate_response(
+        prompt_input.instructions, prompt_input.type, model, temperature,
+        cache_policy=cache_policy_for("improve.uni", request.headers)
+    )
     
     logger.info(f"Universal improvement completed successfully using model {model}.")
     return {"improved_dialog": improved_prompt, "model_used": model}
 
+
+# --- Streaming variants (text/event-stream) ---
+
+async def _stream_improvement(system_message: str, user_input: str, model: str, temperature: float, result_field: str):
+    """
+    Relay completion token deltas as SSE `delta` events, then a `done` event carrying
+    the full text under `result_field`, `model_used` and usage stats.
+    """
+    parts = []
+    try:
+        async for event, data in astream_response(system_message, user_input, model, temperature):
+            if event == "delta":
+                parts.append(data)
+                yield format_sse_event({"text": data}, event="delta")
+            else:
+                yield format_sse_event({result_field: "".join(parts).strip(), **data}, event="done")
+    except Exception as e:
+        logger.error(f"Streaming improvement failed using model {model}: {str(e)}")
+        yield format_sse_event({"detail": f"Failed to generate response from API using {model}."}, event="error")
+
+
+@router.post("/dialog/stream")
+async def improve_dialog_stream(dialog_input: PromptInputBasic):
+    """Streaming variant of /dialog: pushes token deltas as they are generated."""
+    logger.info(f"Received streaming dialog request: {dialog_input.model_dump_json(exclude_none=True)}")
+    system_prompt = get_system_prompt(dialog_input.tone, dialog_input.setting)
+    user_prompt = get_user_prompt(dialog_input.text, dialog_input.character_count)
+
+    client, model, temperature = select_model(
+        dialog_input.model_provider,
+        dialog_input.model_name,
+        dialog_input.creativity
+    )
+    return StreamingResponse(
+        _stream_improvement(system_prompt, user_prompt, model, temperature, "improved_dialog"),
+        media_type="text/event-stream",
+        headers=SSE_HEADERS
+    )
+
+
+@router.post("/character/stream")
+async def improve_character_stream(prompt_input: PromptInput):
+    """Streaming variant of /character: pushes token deltas as they are generated."""
+    logger.info(f"Received streaming improvement request with input: {prompt_input.text}")
+    system_message = char_temp if prompt_input.type == "character" else scene_temp
+
+    client, model, temperature = select_model(
+        prompt_input.model_provider,
+        prompt_input.model_name,
+        prompt_input.creativity
+    )
+    return StreamingResponse(
+        _stream_improvement(system_message, prompt_input.text, model, temperature, "improved_prompt"),
+        media_type="text/event-stream",
+        headers=SSE_HEADERS
+    )
+
+
+async def _stream_dialog_lines(system_message: str, user_input: str, model: str, temperature: float):
+    """Emit a `dialog_line` event as soon as each response line is complete, then `done`."""
+    buffer = ""
+    index = 0
+    try:
+        async for event, data in astream_response(system_message, user_input, model, temperature):
+            if event == "delta":
+                buffer += data
+                while "\n" in buffer:
+                    line, buffer = buffer.split("\n", 1)
+                    index += 1
+                    dialog_line = _parse_dialog_line(index, line)
+                    if dialog_line:
+                        yield format_sse_event(dialog_line.model_dump(), event="dialog_line")
+            else:
+                if buffer:
+                    index += 1
+                    dialog_line = _parse_dialog_line(index, buffer)
+                    if dialog_line:
+                        yield format_sse_event(dialog_line.model_dump(), event="dialog_line")
+                yield format_sse_event(data, event="done")
+    except Exception as e:
+        logger.error(f"Streaming dialog generation failed using model {model}: {str(e)}")
+        yield format_sse_event({"detail": f"Failed to generate dialog using {model}."}, event="error")
+
+
+@router.post("/dialog-advanced/stream")
+async def improve_dialog_advanced_stream(dialog_input: DialogInput):
+    """Streaming variant of /dialog-advanced: emits parsed DialogLine objects line by line."""
+    logger.info(f"Received streaming dialog improvement request with {len(dialog_input.characters)} characters.")
+    system_message, user_input = _dialog_advanced_prompts(dialog_input)
+
+    client, model, temperature = select_model(
+        dialog_input.model_provider,
+        dialog_input.model_name,
+        dialog_input.creativity
+    )
+    return StreamingResponse(
+        _stream_dialog_lines(system_message, user_input, model, temperature),
+        media_type="text/event-stream",
+        headers=SSE_HEADERS
+    )
+
+
+# --- Batch improvement ---
+
+async def _stream_batch_results(batch_request: BatchImproveRequest, headers):
+    """Emit one `result` event per job in completion order, then a `done` summary."""
+    succeeded = failed = 0
+    async for result in iter_batch_results(batch_request.items, headers):
+        if result.status == "ok":
+            succeeded += 1
+        else:
+            failed += 1
+        yield format_sse_event(result.model_dump(mode="json"), event="result")
+    yield format_sse_event({"succeeded": succeeded, "failed": failed}, event="done")
+
+
+@router.post("/batch", response_model=BatchImproveResponse)
+async def improve_batch(batch_request: BatchImproveRequest, request: Request):
+    """
+    API endpoint to run many character/scene/avatar/uni improvements concurrently.
+    Per-item failures are reported in their result and never fail the whole batch.
+    """
+    logger.info(f"Received batch improvement request with {len(batch_request.items)} items (stream={batch_request.stream}).")
+    if batch_request.stream:
+        return StreamingResponse(
+            _stream_batch_results(batch_request, request.headers),
+            media_type="text/event-stream",
+            headers=SSE_HEADERS
+        )
+
+    results = await run_batch(batch_request.items, request.headers)
+    succeeded = sum(1 for r in results if r.status == "ok")
+    logger.info(f"Batch improvement finished: {succeeded}/{len(results)} succeeded.")
+    return {"results": results, "succeeded": succeeded, "failed": len(results) - succeeded}
@@ -21,3 +21,8 @@ class ChatResponse(BaseModel):
     suggestions: List[Suggestion] = Field(default_factory=list)
     be_function: Optional[str] = None
     db_updated: bool
+
+class ChatResponseDraft(BaseModel):
+    """Structured LLM output for a chat reply; suggestions are referenced by their prompt IDs."""
+    response: str
+    suggestion_ids: List[str] = Field(default_factory=list)
@@ -7,6 +7,7 @@ class ModelProvider(str, Enum):
     GPT = "gpt"
     GROQ = "groq"
     GEMINI = "gemini"
+    STUB = "stub"
     
 
 class Character(BaseModel):
@@ -45,6 +46,7 @@ class PromptInputBasic(BaseModel):
     model_provider: ModelProvider = Field(ModelProvider.GPT, description="AI model provider to use")
     model_name: Optional[str] = Field(None, description="Specific model name to use")
     creativity: float = Field(0.7, description="Creativity level (0.0-1.0)", ge=0.0, le=1.0)
+    hedge: Optional[bool] = Field(None, description="Send a duplicate request to a secondary provider if the primary is slow (default: LLM_HEDGING_ENABLED)")
     
 class PromptInputBasicResponse(BaseModel):
     improved_dialog: str
@@ -129,4 +131,43 @@ class ImproveUniversalInput(BaseModel):
     instructions: str
     type: str
     model_name: Optional[str] = Field(None, description="Specific model name to use")
-    model_provider: ModelProvider = Field(ModelProvider.GPT, description="AI model provider to use")
\ No newline at end of file
+    model_provider: ModelProvider = Field(ModelProvider.GPT, description="AI model provider to use")
+
+class BatchImproveKind(str, Enum):
+    CHARACTER = "character"
+    SCENE = "scene"
+    AVATAR = "avatar"
+    UNI = "uni"
+
+class BatchImproveItem(BaseModel):
+    id: Optional[str] = Field(None, description="Caller-supplied identifier echoed back in the result")
+    kind: BatchImproveKind = Field(..., description="Improvement type: character, scene, avatar or uni")
+    text: str = Field(..., description="Text to improve (for 'uni' this is the user input)")
+    instructions: Optional[str] = Field(None, description="System instructions, required for 'uni' items")
+    model_name: Optional[str] = Field(None, description="Specific model name to use")
+    creativity: float = Field(0.7, description="Creativity level (0.0-1.0)", ge=0.0, le=1.0)
+    model_provider: ModelProvider = Field(ModelProvider.GPT, description="AI model provider to use")
+
+    @validator('instructions', always=True)
+    def validate_instructions(cls, v, values):
+        if values.get('kind') == BatchImproveKind.UNI and not v:
+            raise ValueError("instructions are required for 'uni' items")
+        return v
+
+class BatchImproveRequest(BaseModel):
+    items: List[BatchImproveItem] = Field(..., min_length=1, max_length=100)
+    stream: bool = Field(False, description="Stream results as SSE events in completion order")
+
+class BatchImproveResult(BaseModel):
+    index: int
+    id: Optional[str] = None
+    kind: BatchImproveKind
+    status: str  # 'ok' or 'error'
+    improved_text: Optional[str] = None
+    model_used: Optional[str] = None
+    error: Optional[str] = None
+
+class BatchImproveResponse(BaseModel):
+    results: List[BatchImproveResult]
+    succeeded: int
+    failed: int
@@ -28,4 +28,8 @@ class AgentState(TypedDict):
     final_response: Optional[ChatResponse]
     pending_operation_details: Optional[Dict[str, Any]] = None # Stores {'operation': str, 'params': dict}
     awaiting_confirmation: bool = False
-    db_updated: bool = False 
\ No newline at end of file
+    db_updated: bool = False
+    graph_mode: Optional[str] = None # 'multi' (default) or 'single'
+    tool_timings: Optional[List[Dict[str, Any]]] = None # [{'tool', 'tool_call_id', 'seconds', 'ok'}] for this turn
+    speculative_message: Optional[BaseMessage] = None # General LLM reply generated alongside intent detection
+    single_pass_fallback: bool = False # The single pass could not finish the turn; run intent detection
@@ -0,0 +1,230 @@
+"""
+Checkpointers for the chat agent: a bounded in-memory saver and a factory that
+picks it or the durable SQL saver (`CHECKPOINTER=memory|sql`)
+"""
+import logging
+import os
+import threading
+import time
+from collections import OrderedDict, defaultdict
+from typing import Any, Dict, Iterator, Optional, Set, Tuple
+
+from langchain_core.runnables import RunnableConfig
+from langgraph.checkpoint.base import CheckpointTuple
+from langgraph.checkpoint.memory import MemorySaver
+from prometheus_client import Counter, Gauge
+
+logger = logging.getLogger(__name__)
+
+CHECKPOINTER = os.getenv("CHECKPOINTER", "memory").lower()
+AGENT_MEMORY_MAX_THREADS = int(os.getenv("AGENT_MEMORY_MAX_THREADS", "1000"))
+AGENT_MEMORY_MAX_CHECKPOINTS = int(os.getenv("AGENT_MEMORY_MAX_CHECKPOINTS", "20"))
+AGENT_MEMORY_MAX_BYTES = int(os.getenv("AGENT_MEMORY_MAX_BYTES", str(256 * 1024 * 1024)))
+AGENT_MEMORY_TTL_SECONDS = float(os.getenv("AGENT_MEMORY_TTL_SECONDS", str(6 * 3600)))
+
+CHECKPOINTER_EVICTIONS = Counter(
+    "agent_checkpointer_evictions_total", "Chat sessions evicted from the agent checkpointer", ["reason"]
+)
+CHECKPOINTER_PRUNED = Counter(
+    "agent_checkpointer_checkpoints_pruned_total", "Old checkpoints dropped by the per-session cap"
+)
+CHECKPOINTER_THREADS = Gauge("agent_checkpointer_threads", "Chat sessions held by the agent checkpointer")
+CHECKPOINTER_BYTES = Gauge("agent_checkpointer_bytes", "Serialized bytes held by the agent checkpointer")
+
+
+def _typed_size(value: Any) -> int:
+    """Size of a serde `(type, bytes)` pair."""
+    return len(value[1]) if isinstance(value, tuple) and len(value) > 1 and value[1] else 0
+
+
+class BoundedMemorySaver(MemorySaver):
+    """
+    MemorySaver with caps on sessions, checkpoints per session and total bytes.
+
+    Sessions (thread IDs) are kept in LRU order; idle sessions expire after a TTL and
+    the least recently used ones are evicted when a cap is exceeded. Within a session
+    only the newest checkpoints are kept, along with the blobs and writes they use.
+    """
+
+    def __init__(self, *, max_threads: int = AGENT_MEMORY_MAX_THREADS,
+                 max_checkpoints_per_thread: int = AGENT_MEMORY_MAX_CHECKPOINTS,
+                 max_bytes: int = AGENT_MEMORY_MAX_BYTES, ttl_seconds: float = AGENT_MEMORY_TTL_SECONDS,
+                 serde=None):
+        super().__init__(serde=serde)
+        self.max_threads = max(1, max_threads)
+        # The newest checkpoint and its parent are needed to resume a run
+        self.max_checkpoints_per_thread = max(2, max_checkpoints_per_thread)
+        self.max_bytes = max_bytes
+        self.ttl_seconds = ttl_seconds
+        self._lock = threading.RLock()
+        self._last_access: "OrderedDict[str, float]" = OrderedDict()
+        self._sizes: Dict[str, int] = {}
+        self._blob_keys: Dict[str, Set[tuple]] = defaultdict(set)
+        self._channel_versions: Dict[Tuple[str, str, str], dict] = {}
+        self._total_bytes = 0
+
+    # --- Bookkeeping ---
+
+    def _touch(self, thread_id: str):
+        self._last_access[thread_id] = time.monotonic()
+        self._last_access.move_to_end(thread_id)
+
+    def _is_expired(self, thread_id: str, now: float) -> bool:
+        last_access = self._last_access.get(thread_id)
+        return bool(self.ttl_seconds) and last_access is not None and now - last_access > self.ttl_seconds
+
+    def _thread_size(self, thread_id: str) -> int:
+        size = 0
+        for checkpoint_ns, checkpoints in self.storage.get(thread_id, {}).items():
+            for checkpoint_id, (checkpoint, metadata, _) in checkpoints.items():
+                size += _typed_size(checkpoint) + _typed_size(metadata)
+                for _, _, value, _ in self.writes.get((thread_id, checkpoint_ns, checkpoint_id), {}).values():
+                    size += _typed_size(value)
+        for key in self._blob_keys.get(thread_id, ()):
+            size += _typed_size(self.blobs.get(key))
+        return size
+
+    def _update_size(self, thread_id: str):
+        size = self._thread_size(thread_id)
+        self._total_bytes += size - self._sizes.get(thread_id, 0)
+        self._sizes[thread_id] = size
+        self._publish_metrics()
+
+    def _publish_metrics(self):
+        CHECKPOINTER_THREADS.set(len(self._last_access))
+        CHECKPOINTER_BYTES.set(self._total_bytes)
+
+    def _discard_empty(self, thread_id: str):
+        """Reads of unknown threads create empty defaultdict entries; drop them."""
+        if thread_id not in self._last_access and thread_id in self.storage:
+            if not any(self.storage[thread_id].values()):
+                del self.storage[thread_id]
+
+    def _evict(self, thread_id: str, reason: Optional[str]):
+        for checkpoint_ns, checkpoints in self.storage.pop(thread_id, {}).items():
+            for checkpoint_id in checkpoints:
+                self.writes.pop((thread_id, checkpoint_ns, checkpoint_id), None)
+                self._channel_versions.pop((thread_id, checkpoint_ns, checkpoint_id), None)
+        for key in self._blob_keys.pop(thread_id, ()):
+            self.blobs.pop(key, None)
+        self._last_access.pop(thread_id, None)
+        self._total_bytes -= self._sizes.pop(thread_id, 0)
+        if reason:
+            CHECKPOINTER_EVICTIONS.labels(reason=reason).inc()
+            logger.info(f"Evicted chat session '{thread_id}' from checkpointer ({reason})")
+        self._publish_metrics()
+
+    def _prune_thread(self, thread_id: str, checkpoint_ns: str):
+        """Keep only the newest checkpoints of a session namespace and the blobs they reference."""
+        checkpoints = self.storage[thread_id][checkpoint_ns]
+        if len(checkpoints) <= self.max_checkpoints_per_thread:
+            return
+        # Checkpoint IDs are inserted in creation order
+        while len(checkpoints) > self.max_checkpoints_per_thread:
+            oldest_id = next(iter(checkpoints))
+            del checkpoints[oldest_id]
+            self.writes.pop((thread_id, checkpoint_ns, oldest_id), None)
+            self._channel_versions.pop((thread_id, checkpoint_ns, oldest_id), None)
+            CHECKPOINTER_PRUNED.inc()
+
+        referenced = set()
+        for checkpoint_id in checkpoints:
+            versions = self._channel_versions.get((thread_id, checkpoint_ns, checkpoint_id), {})
+            referenced.update(versions.items())
+        blob_keys = self._blob_keys[thread_id]
+        for key in [k for k in blob_keys if k[1] == checkpoint_ns and (k[2], k[3]) not in referenced]:
+            self.blobs.pop(key, None)
+            blob_keys.discard(key)
+
+    def _enforce_limits(self, current_thread: str):
+        now = time.monotonic()
+        # LRU order means expired sessions are all at the front
+        for thread_id in list(self._last_access):
+            if not self._is_expired(thread_id, now):
+                break
+            self._evict(thread_id, "ttl")
+
+        def oldest_other() -> Optional[str]:
+            return next((t for t in self._last_access if t != current_thread), None)
+
+        while len(self._last_access) > self.max_threads:
+            victim = oldest_other()
+            if victim is None:
+                break
+            self._evict(victim, "max_threads")
+        while self.max_bytes and self._total_bytes > self.max_bytes:
+            victim = oldest_other()
+            if victim is None:
+                break
+            self._evict(victim, "max_bytes")
+
+    # --- BaseCheckpointSaver interface ---
+
+    def get_tuple(self, config: RunnableConfig) -> Optional[CheckpointTuple]:
+        thread_id = config["configurable"]["thread_id"]
+        with self._lock:
+            if self._is_expired(thread_id, time.monotonic()):
+                self._evict(thread_id, "ttl")
+                return None
+            result = super().get_tuple(config)
+            if thread_id in self._last_access:
+                self._touch(thread_id)
+            else:
+                self._discard_empty(thread_id)
+            return result
+
+    def list(self, config: Optional[RunnableConfig], **kwargs) -> Iterator[CheckpointTuple]:
+        with self._lock:
+            items = list(super().list(config, **kwargs))
+            if config:
+                self._discard_empty(config["configurable"]["thread_id"])
+        return iter(items)
+
+    def put(self, config: RunnableConfig, checkpoint, metadata, new_versions) -> RunnableConfig:
+        thread_id = config["configurable"]["thread_id"]
+        checkpoint_ns = config["configurable"]["checkpoint_ns"]
+        with self._lock:
+            result = super().put(config, checkpoint, metadata, new_versions)
+            for channel, version in new_versions.items():
+                self._blob_keys[thread_id].add((thread_id, checkpoint_ns, channel, version))
+            self._channel_versions[(thread_id, checkpoint_ns, checkpoint["id"])] = dict(checkpoint["channel_versions"])
+            self._touch(thread_id)
+            self._prune_thread(thread_id, checkpoint_ns)
+            self._update_size(thread_id)
+            self._enforce_limits(thread_id)
+            return result
+
+    def put_writes(self, config: RunnableConfig, writes, task_id: str, task_path: str = "") -> None:
+        thread_id = config["configurable"]["thread_id"]
+        with self._lock:
+            super().put_writes(config, writes, task_id, task_path)
+            if thread_id not in self._last_access:
+                # The session was evicted after its checkpoint was written
+                checkpoint_ns = config["configurable"].get("checkpoint_ns", "")
+                self.writes.pop((thread_id, checkpoint_ns, config["configurable"]["checkpoint_id"]), None)
+                return
+            self._update_size(thread_id)
+            self._enforce_limits(thread_id)
+
+    def delete_thread(self, thread_id: str) -> None:
+        with self._lock:
+            self._evict(thread_id, None)
+
+
+def create_checkpointer():
+    """
+    Build the chat agent's checkpointer. The in-memory saver only works with a single
+    worker process; use `CHECKPOINTER=sql` when sessions must survive restarts or be
+    shared between workers.
+    """
+    if CHECKPOINTER == "sql":
+        from database import engine
+        from services.agents.chat.sql_checkpointer import SqlCheckpointSaver
+
+        saver = SqlCheckpointSaver(engine)
+        saver.setup()
+        logger.info("Using SQL checkpointer for chat sessions")
+        return saver
+    if CHECKPOINTER != "memory":
+        logger.warning(f"Unknown CHECKPOINTER '{CHECKPOINTER}', falling back to in-memory sessions")
+    return BoundedMemorySaver()
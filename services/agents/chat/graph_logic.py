@@ -25,6 +25,7 @@ def should_continue_or_finalize(state: AgentState) -> str:
                 "BeatLookupArgs",
                 "SceneLookupArgs",
                 "ProjectGapAnalysisArgs",
+                "ProjectContextSearchArgs",
                 "YouTubeSearchArgs",
                 "ExecutorFunctionArgs"  # Added ExecutorFunctionArgs to known tools
             }
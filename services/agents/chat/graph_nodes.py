@@ -1,141 +1,169 @@
 """
 Core graph nodes for langgraph-based agent
 """
+import asyncio
 import logging
-from typing import Dict, Any
+import os
+import time
+from typing import Any, Callable, Dict, List, Optional, Tuple
 from langchain_core.runnables import RunnableConfig
 from langchain_core.messages import AIMessage, ToolMessage, SystemMessage, HumanMessage, BaseMessage # Added BaseMessage
+from prometheus_client import Counter, Histogram
 from services.agents.chat.message_utils import ensure_tool_call_integrity
 from .agent_state import AgentState
-from .llm_config import  structured_llm 
+from fastapi.concurrency import run_in_threadpool
+from .llm_config import ainvoke_structured, llm
 from services.agents.executors.suggestion_manager import (
     get_suggestions_for_topic, 
     get_suggestion_prompt, 
-    get_fallback_suggestions
+    get_fallback_suggestions,
+    expand_suggestion_ids
 )
 from schemas.agent import ChatResponse
+from services.agents.executors.suggestion_rules import select_suggestions
 import logging
 from .message_utils import truncate_problematic_history
+from .history_compaction import compact_history
+from .model_tiers import ainvoke_tiered, latest_user_text
 
 logger = logging.getLogger(__name__)
 
+# Skip the final structured LLM call when the reply text is already determined
+AGENT_SKIP_FIXED_FINAL_LLM = os.getenv("AGENT_SKIP_FIXED_FINAL_LLM", "true").lower() == "true"
 
-def tool_node_executor(state: AgentState, config: RunnableConfig) -> Dict[str, Any]:
-    """Executes tools based on the last AI message."""
+# Lookups that never modify data; consecutive ones run concurrently, each with its own DB session
+READ_ONLY_TOOLS = {
+    "CharacterLookupArgs", "StoryLookupArgs", "BeatLookupArgs", "SceneLookupArgs",
+    "ProjectGapAnalysisArgs", "ProjectContextSearchArgs", "YouTubeSearchArgs"
+}
+
+TOOL_SECONDS = Histogram(
+    "agent_tool_seconds", "Agent tool call duration", ["tool"],
+    buckets=(0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+)
+FINAL_LLM_SKIPPED = Counter(
+    "agent_final_llm_skipped_total", "Final responses built without the structured LLM call", ["reason"]
+)
+
+
+def _run_read_only_tool(tool_call: Dict[str, Any], state: AgentState) -> Tuple[str, bool]:
+    """Runs a lookup tool on a short-lived session so lookups can run side by side."""
+    tool_name = tool_call['name']
+    if tool_name == "YouTubeSearchArgs":
+        from services.agents.tools import execute_youtube_tool
+        return str(execute_youtube_tool(tool_call['args'], state)), False
+
+    from database import SessionLocal
+    from services.agents.tools.db_tool_executor import run_db_tool
+    db = SessionLocal()
+    try:
+        return str(run_db_tool(tool_name, tool_call['args'], state, db)), False
+    finally:
+        db.close()
+
+
+def _run_executor_tool(tool_call: Dict[str, Any], state: AgentState, db_session) -> Tuple[str, bool]:
+    """Runs an ExecutorFunctionArgs call on the request's session; returns (result, db_updated)."""
+    from services.agents.executor import execute_suggestion_function
+    function_name = tool_call['args'].get("function_name")
+    params = tool_call['args'].get("params", {})
+    logger.info(f"Agent-initiated execution of '{function_name}' with params: {params}")
+
+    result = execute_suggestion_function(
+        function_name=function_name,
+        db=db_session,
+        project_id=state.get("project_id"),
+        character_id=state.get("character_id"),
+        act_id=state.get("act_id"), # Pass act_id if available in state
+        **params
+    )
+    # Determine if DB was updated based on function type (heuristic)
+    db_updated = bool(function_name) and any(kw in function_name.lower() for kw in ["create", "update", "delete", "add", "remove"])
+    logger.info(f"Tool {function_name} executed, result: {result}, db_updated_by_tool: {db_updated}")
+    return f"Executed function '{function_name}': {result}", db_updated
+
+
+async def _timed_tool(tool_call: Dict[str, Any], run: Callable[..., Tuple[str, bool]], *args) -> Tuple[str, bool, Dict[str, Any]]:
+    """Runs a blocking tool in the threadpool; returns (content, db_updated, timing)."""
+    tool_name = tool_call['name']
+    logger.info(f"Processing tool call: {tool_name} (ID: {tool_call['id']}) with args: {tool_call['args']}")
+    started = time.perf_counter()
+    ok = True
+    try:
+        content, db_updated = await run_in_threadpool(run, tool_call, *args)
+    except Exception as e:
+        logger.error(f"Error executing tool {tool_name}: {e}", exc_info=True)
+        content, db_updated, ok = f"Error executing tool {tool_name}: {str(e)}", False, False
+    elapsed = time.perf_counter() - started
+    TOOL_SECONDS.labels(tool=tool_name).observe(elapsed)
+    return content, db_updated, {"tool": tool_name, "tool_call_id": tool_call['id'], "seconds": round(elapsed, 4), "ok": ok}
+
+
+async def tool_node_executor(state: AgentState, config: RunnableConfig) -> Dict[str, Any]:
+    """
+    Executes tools based on the last AI message. Consecutive read-only lookups run
+    concurrently; ExecutorFunctionArgs calls run one at a time, in order, on the
+    request's DB session, and lookups after them only start once they finish.
+    """
     logger.info("--- Executing Tool Node ---")
     last_message = state['messages'][-1]
-    
-    # Initialize be_function and db_updated flag
-    be_function = None
-    db_updated_by_tool = False # Local flag
-    
+
     if not isinstance(last_message, AIMessage) or not last_message.tool_calls:
         logger.error("Expected AI message with tool calls, but found none")
         return {"messages": [SystemMessage(content="Error: Tool executor called without tool calls in the last AI message.")]}
     # Get the configurable components (e.g., database session)
     db_session = config['configurable'].get('db_session')
-    if not db_session:
-        logger.error("DB Session not found in config for tool node execution!")
-        tool_messages = []
-        for tool_call in last_message.tool_calls: # Iterate even in error to provide a response for each
-            tool_id = tool_call['id']
-            tool_messages.append(ToolMessage(
-                content="Error: Database connection not available for tool execution.", 
-                tool_call_id=tool_id
-            ))
-        return {"messages": tool_messages}
-    
-    tool_messages = []
-    
+
+    results: Dict[str, str] = {}
+    timings: List[Dict[str, Any]] = []
+    be_function = None
+    db_updated_by_tool = False # Local flag
+
+    async def run_lookups(batch: List[Dict[str, Any]]):
+        outcomes = await asyncio.gather(*(_timed_tool(tc, _run_read_only_tool, state) for tc in batch))
+        for tool_call, (content, _, timing) in zip(batch, outcomes):
+            results[tool_call['id']] = content
+            timings.append(timing)
+
+    batch: List[Dict[str, Any]] = []
     for tool_call in last_message.tool_calls:
-        tool_id = tool_call['id']
         tool_name = tool_call['name']
-        tool_args = tool_call['args']
-        
-        logger.info(f"Processing tool call: {tool_name} (ID: {tool_id}) with args: {tool_args}")
-        
-        try:
-            if tool_name == "ExecutorFunctionArgs":
-                function_name = tool_args.get("function_name")
-                params = tool_args.get("params", {})
-                
-                be_function = function_name # Capture the function name for the state
-                
-                logger.info(f"Agent-initiated execution of '{function_name}' with params: {params}")
-                
-                from services.agents.executor import execute_suggestion_function # Local import if preferred
-                result = execute_suggestion_function(
-                    function_name=function_name,
-                    db=db_session,
-                    project_id=state.get("project_id"),
-                    character_id=state.get("character_id"),
-                    act_id=state.get("act_id"), # Pass act_id if available in state
-                    **params
-                )
-                result_msg = f"Executed function '{function_name}': {result}"
-                # Determine if DB was updated based on function type or result (heuristic)
-                # This might need more sophisticated logic based on function names
-                if function_name and any(kw in function_name.lower() for kw in ["create", "update", "delete", "add", "remove"]):
-                    db_updated_by_tool = True
-                logger.info(f"Tool {function_name} executed, result: {result}, db_updated_by_tool: {db_updated_by_tool}")
-                
-                tool_messages.append(ToolMessage(content=result_msg, tool_call_id=tool_id))
-
-            elif tool_name in ["CharacterLookupArgs", "StoryLookupArgs", "BeatLookupArgs", "SceneLookupArgs", "ProjectGapAnalysisArgs"]:
-                from services.agents.tools.db_tool_executor import execute_db_tool
-                # execute_db_tool expects a state-like dict and db_session
-                # We need to ensure it returns a ToolMessage or content for one.
-                # The previous implementation of execute_db_tool seemed to return a dict with 'messages'.
-                # Let's adapt to ensure a single ToolMessage is created per call.
-                
-                # Construct a minimal state for the db_tool_executor if it needs specific fields
-                # For now, assuming it can work with tool_args and project/character IDs
-                tool_result_content = execute_db_tool(
-                    tool_name=tool_name, # Pass tool_name and args
-                    tool_args=tool_args,
-                    project_id=state.get("project_id"),
-                    character_id=state.get("character_id"),
-                    act_id=state.get("act_id"),
-                    db_session=db_session,
-                    # Pass other necessary state parts if db_tool_executor requires them
-                    # extracted_character_names=state.get("extracted_character_names", [])
-                )
-                # Ensure tool_result_content is a string
-                if not isinstance(tool_result_content, str):
-                    tool_result_content = str(tool_result_content)
-
-                tool_messages.append(ToolMessage(content=tool_result_content, tool_call_id=tool_id))
-            
-            elif tool_name == "YouTubeSearchArgs": # Assuming this tool exists
-                from services.agents.tools import execute_youtube_tool # Ensure this path is correct
-                tool_result = execute_youtube_tool(tool_call['args'], state) # Pass args directly
-                tool_messages.append(ToolMessage(content=str(tool_result), tool_call_id=tool_id))
-                
-            else:
-                error_msg = f"Unknown tool: {tool_name}"
-                logger.error(error_msg)
-                tool_messages.append(ToolMessage(content=error_msg, tool_call_id=tool_id))
-                
-        except Exception as e:
-            logger.error(f"Error executing tool {tool_name}: {e}", exc_info=True)
-            tool_messages.append(ToolMessage(
-                content=f"Error executing tool {tool_name}: {str(e)}",
-                tool_call_id=tool_id
-            ))
-    
-    # Ensure all tool calls got a response (LangGraph requirement)
-    # This loop might be redundant if the above logic correctly appends for each tool_call.
-    # However, it's a good safeguard.
-    all_called_ids = {tc['id'] for tc in last_message.tool_calls}
-    responded_ids = {tm.tool_call_id for tm in tool_messages}
-    for tool_id in all_called_ids:
-        if tool_id not in responded_ids:
-            logger.warning(f"Tool call {tool_id} did not receive a response. Adding fallback.")
-            tool_messages.append(ToolMessage(content="Error: Tool call did not produce a response.", tool_call_id=tool_id))
-
-    logger.info(f"Returning {len(tool_messages)} tool messages.")
+        if tool_name in READ_ONLY_TOOLS:
+            batch.append(tool_call)
+            continue
+        # Anything else is a barrier: finish the lookups requested before it first
+        if batch:
+            await run_lookups(batch)
+            batch = []
+        if tool_name == "ExecutorFunctionArgs":
+            if not db_session:
+                logger.error("DB Session not found in config for tool node execution!")
+                results[tool_call['id']] = "Error: Database connection not available for tool execution."
+                continue
+            be_function = tool_call['args'].get("function_name") # Capture the function name for the state
+            content, db_updated, timing = await _timed_tool(tool_call, _run_executor_tool, state, db_session)
+            results[tool_call['id']] = content
+            timings.append(timing)
+            db_updated_by_tool = db_updated_by_tool or db_updated
+        else:
+            error_msg = f"Unknown tool: {tool_name}"
+            logger.error(error_msg)
+            results[tool_call['id']] = error_msg
+    if batch:
+        await run_lookups(batch)
+
+    # Every tool call needs a response (LangGraph requirement), in the order they were requested
+    tool_messages = []
+    for tool_call in last_message.tool_calls:
+        content = results.get(tool_call['id'])
+        if content is None:
+            logger.warning(f"Tool call {tool_call['id']} did not receive a response. Adding fallback.")
+            content = "Error: Tool call did not produce a response."
+        tool_messages.append(ToolMessage(content=content, tool_call_id=tool_call['id']))
+
+    logger.info(f"Returning {len(tool_messages)} tool messages. Timings: {timings}")
     
-    update_dict = {"messages": tool_messages}
+    update_dict = {"messages": tool_messages, "tool_timings": (state.get("tool_timings") or []) + timings}
     if be_function: # If any ExecutorFunctionArgs was called
         update_dict["be_function"] = be_function
     if db_updated_by_tool: # If any tool likely updated the DB
@@ -147,16 +175,66 @@ def tool_node_executor(state: AgentState, config: RunnableConfig) -> Dict[str, A
     
     logger.debug(f"Tool node executor returning: {update_dict}")
     return update_dict
-def generate_final_response(state: AgentState) -> Dict[str, Any]:
+
+
+def _fixed_response_reason(state: AgentState) -> Optional[str]:
+    """
+    Why the reply text is already determined, or None: a confirmation question, a request
+    for missing parameters, or the summary of an executor result this turn.
+    """
+    messages = state['messages']
+    if not messages or not isinstance(messages[-1], AIMessage) or messages[-1].tool_calls or not messages[-1].content:
+        return None
+    if state.get('awaiting_confirmation'):
+        return "confirmation"
+    if state.get('operation_intent') and state.get('missing_params'):
+        return "parameters"
+    turn_start = max((i for i, m in enumerate(messages) if isinstance(m, HumanMessage)), default=0)
+    if any(isinstance(m, AIMessage) and any(tc.get("name") == "ExecutorFunctionArgs" for tc in m.tool_calls or [])
+           for m in messages[turn_start:]):
+        return "executor"
+    return None
+
+
+def _rule_based_final_response(state: AgentState, reason: str) -> Dict[str, Any]:
+    """Final response without an LLM call: the last AI message plus rule-selected suggestions."""
+    is_awaiting_confirmation = state.get('awaiting_confirmation', False)
+    pending_op_details = state.get('pending_operation_details') or {}
+    candidates = get_suggestions_for_topic(
+        project_id=state.get("project_id"),
+        topic=state.get("request_type", "general"),
+        entity_id=state.get("character_id") or state.get("act_id"),
+    )
+    response_text = state['messages'][-1].content
+    final_chat_response = ChatResponse(
+        response=response_text,
+        suggestions=select_suggestions(state, candidates),
+        be_function=state.get("be_function") if not is_awaiting_confirmation else None,
+        db_updated=state.get("db_updated", False) if not is_awaiting_confirmation else False
+    )
+    FINAL_LLM_SKIPPED.labels(reason=reason).inc()
+    logger.info(f"Final LLM call skipped ({reason}); pending operation: {pending_op_details.get('operation')}")
+    # The reply is already the last message of the thread
+    return {"final_response": final_chat_response}
+
+
+async def generate_final_response(state: AgentState) -> Dict[str, Any]:
     """
     Calls the LLM bound with the ChatResponse schema to generate the final
     structured output including the text response and relevant suggestions.
     If awaiting_confirmation is true, the main response is taken from the last message.
+    When the reply text is already determined the LLM call is skipped and suggestions
+    come from the initiator rules in `suggestion_rules`.
     """
     logger.info("--- Generating Final Structured Response ---")
+
+    fixed_reason = _fixed_response_reason(state)
+    if fixed_reason and AGENT_SKIP_FIXED_FINAL_LLM:
+        return _rule_based_final_response(state, fixed_reason)
     
     clean_messages = ensure_tool_call_integrity(state['messages'])
     clean_messages = truncate_problematic_history(clean_messages)
+    clean_messages = await compact_history(clean_messages, llm.model_name)
 
     is_awaiting_confirmation = state.get('awaiting_confirmation', False)
     pending_op_details = state.get('pending_operation_details')
@@ -218,17 +296,25 @@ def generate_final_response(state: AgentState) -> Dict[str, Any]:
     
     suggestion_prompt_text = None # Initialize suggestion_prompt_text
     if suggestions:
-        suggestion_prompt_text = get_suggestion_prompt(topic=state.get("request_type", "general"), potential_suggestions=suggestions)
+        suggestion_prompt_text = get_suggestion_prompt(
+            topic=state.get("request_type", "general"), potential_suggestions=suggestions,
+            entity_id=state.get("character_id") or state.get("act_id")
+        )
     if suggestion_prompt_text:
         # Append or insert suggestion prompt. Appending for now.
         llm_prompt_messages.append(SystemMessage(content=suggestion_prompt_text))
 
     # Call the structured LLM
-    # The LLM will generate a 'response' field and a 'suggestions' field in its Pydantic model.
+    # The LLM will generate a 'response' field and the IDs of relevant suggestions ('suggestion_ids'),
+    # which are expanded into full Suggestion objects from the candidates above.
     # If is_awaiting_confirmation, we will override its 'response' field.
     try:
         logger.debug(f"Messages for structured LLM: {llm_prompt_messages}")
-        structured_response_obj = structured_llm.invoke(llm_prompt_messages) # Pass the list of messages directly
+        # Only suggestions are chosen while confirming, so that call can run on a cheaper tier
+        structured_response_obj = await ainvoke_tiered(
+            "suggestions" if is_awaiting_confirmation else "final", latest_user_text(clean_messages),
+            lambda tier: ainvoke_structured(llm_prompt_messages, tier=tier) # Hedged when LLM_HEDGING_ENABLED is set
+        )
         
         # If we are awaiting confirmation, override the LLM's generated text response
         # with the actual confirmation question.
@@ -239,7 +325,7 @@ def generate_final_response(state: AgentState) -> Dict[str, Any]:
         else:
             final_text_response = llm_generated_text
 
-        suggestions_for_response = structured_response_obj.suggestions
+        suggestions_for_response = expand_suggestion_ids(structured_response_obj.suggestion_ids, suggestions)
         logger.info(f"Structured LLM Response: response='{final_text_response}' suggestions={suggestions_for_response}")
 
     except Exception as e:
@@ -262,6 +348,5 @@ def generate_final_response(state: AgentState) -> Dict[str, Any]:
     # Update state: Add the AI's final response message (text part only) to history
     # The full ChatResponse object is stored in 'final_response' key
     # The AIMessage here should contain what the user sees as the bot's reply.
-    updated_messages = clean_messages + [AIMessage(content=final_text_response)]
-
-    return {"messages": updated_messages, "final_response": final_chat_response}
\ No newline at end of file
+    # The messages channel appends, so only the new reply is returned
+    return {"messages": [AIMessage(content=final_text_response)], "final_response": final_chat_response}
\ No newline at end of file
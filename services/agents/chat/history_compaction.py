@@ -0,0 +1,302 @@
+"""
+Token-budgeted compaction of the conversation history sent to the agent's LLM nodes.
+
+The checkpointed thread keeps every message; only the prompt is compacted:
+- repeated system prompts (the route adds one each turn) are kept once, ahead of the conversation
+- the most recent turns (a turn starts at a user message) are kept verbatim, except that
+  tool outputs of earlier turns are replaced by a short stub (tool-call pairs stay intact)
+- older turns are folded into a synopsis, cached by a hash of the folded messages and
+  extended incrementally as the window slides
+- the result must fit the per-model token budget, counted with the model's tiktoken
+  encoding; the recent window shrinks (down to the current turn) until it does
+"""
+import hashlib
+import logging
+import os
+import threading
+from collections import OrderedDict
+from functools import lru_cache
+from typing import Callable, List, Optional, Sequence, Tuple
+
+from langchain_core.messages import AIMessage, BaseMessage, HumanMessage, SystemMessage, ToolMessage
+from prometheus_client import Counter, Histogram
+
+from services.llm.admission import estimate_tokens
+
+logger = logging.getLogger(__name__)
+
+AGENT_HISTORY_COMPACTION_ENABLED = os.getenv("AGENT_HISTORY_COMPACTION_ENABLED", "true").lower() == "true"
+AGENT_HISTORY_TOKEN_BUDGET = int(os.getenv("AGENT_HISTORY_TOKEN_BUDGET", "6000"))
+AGENT_HISTORY_RECENT_TURNS = int(os.getenv("AGENT_HISTORY_RECENT_TURNS", "4"))
+AGENT_HISTORY_SUMMARY_MODE = os.getenv("AGENT_HISTORY_SUMMARY_MODE", "extractive").lower()  # extractive | llm
+AGENT_HISTORY_SUMMARY_MAX_TOKENS = int(os.getenv("AGENT_HISTORY_SUMMARY_MAX_TOKENS", "600"))
+AGENT_HISTORY_SYNOPSIS_CACHE_SIZE = int(os.getenv("AGENT_HISTORY_SYNOPSIS_CACHE_SIZE", "512"))
+
+SYNOPSIS_PREFIX = "Summary of the earlier conversation:\n"
+STALE_TOOL_OUTPUT = "[Output of {name} from an earlier turn omitted; look it up again if it is needed.]"
+# Per-message overhead of the chat format (role and separators), as counted by OpenAI
+_MESSAGE_OVERHEAD_TOKENS = 4
+_EXCERPT_CHARS = 240
+
+HISTORY_PROMPT_TOKENS = Histogram(
+    "agent_history_prompt_tokens", "Conversation history tokens sent to an agent LLM node", ["stage"],
+    buckets=(250, 500, 1000, 2000, 4000, 8000, 16000, 32000, 64000)
+)
+HISTORY_TOKENS_SAVED = Counter("agent_history_tokens_saved_total", "History tokens removed by compaction")
+HISTORY_SYNOPSIS = Counter(
+    "agent_history_synopsis_total", "Synopses of older turns by source (cache, extended, built, fallback)", ["source"]
+)
+
+
+# --- Token counting ---
+
+def _budget_env_key(model: str) -> str:
+    return "AGENT_HISTORY_TOKEN_BUDGET_" + "".join(c if c.isalnum() else "_" for c in model).upper()
+
+
+def token_budget(model: Optional[str]) -> int:
+    """History budget for a model: `AGENT_HISTORY_TOKEN_BUDGET_<MODEL>` (e.g. ..._GPT_4O) or the default."""
+    if model:
+        override = os.getenv(_budget_env_key(model))
+        if override:
+            return int(override)
+    return AGENT_HISTORY_TOKEN_BUDGET
+
+
+@lru_cache(maxsize=32)
+def _encoder(model: Optional[str]) -> Optional[Callable[[str], list]]:
+    try:
+        import tiktoken
+
+        try:
+            encoding = tiktoken.encoding_for_model(model or "gpt-4o")
+        except KeyError:
+            # Models of other providers: the GPT-4o encoding is a close enough approximation
+            encoding = tiktoken.get_encoding("o200k_base")
+        return encoding.encode
+    except Exception as e:
+        # tiktoken downloads its encodings on first use; set TIKTOKEN_CACHE_DIR for offline hosts
+        logger.warning(f"tiktoken encoding unavailable for '{model}', estimating tokens from length: {e}")
+        return None
+
+
+def _message_text(message: BaseMessage) -> str:
+    text = message.content if isinstance(message.content, str) else str(message.content)
+    if isinstance(message, AIMessage) and message.tool_calls:
+        text += "".join(f"{tc.get('name')}{tc.get('args')}" for tc in message.tool_calls)
+    return text
+
+
+def count_tokens(messages: Sequence[BaseMessage], model: Optional[str] = None) -> int:
+    """Prompt tokens of a message list for `model`."""
+    encode = _encoder(model)
+    total = 0
+    for message in messages:
+        text = _message_text(message)
+        total += (len(encode(text)) if encode else estimate_tokens(text)) + _MESSAGE_OVERHEAD_TOKENS
+    return total
+
+
+# --- Structure ---
+
+def _dedupe_system_messages(messages: Sequence[BaseMessage]) -> List[BaseMessage]:
+    """Keep only the latest copy of each distinct system prompt; drop earlier synopses."""
+    latest = {}
+    for index, message in enumerate(messages):
+        if isinstance(message, SystemMessage):
+            key = SYNOPSIS_PREFIX if message.content.startswith(SYNOPSIS_PREFIX) else message.content
+            latest[key] = index
+    keep = set(latest.values())
+    return [m for i, m in enumerate(messages) if not isinstance(m, SystemMessage) or i in keep]
+
+
+def _split_turns(messages: Sequence[BaseMessage]) -> Tuple[List[BaseMessage], List[List[BaseMessage]]]:
+    """(system preamble, turns). Each turn starts at a user message; system prompts move to the preamble."""
+    preamble: List[BaseMessage] = []
+    turns: List[List[BaseMessage]] = []
+    for message in messages:
+        if isinstance(message, SystemMessage):
+            preamble.append(message)
+        elif isinstance(message, HumanMessage) or not turns:
+            turns.append([message])
+        else:
+            turns[-1].append(message)
+    return preamble, turns
+
+
+def _stub_tool_outputs(turn: List[BaseMessage]) -> List[BaseMessage]:
+    """Replace tool outputs of a finished turn by a stub; the call/response pairs are kept."""
+    names = {}
+    for message in turn:
+        if isinstance(message, AIMessage) and message.tool_calls:
+            names.update({tc.get("id"): tc.get("name", "tool") for tc in message.tool_calls})
+    stubbed = []
+    for message in turn:
+        if isinstance(message, ToolMessage):
+            stub = STALE_TOOL_OUTPUT.format(name=names.get(message.tool_call_id, "tool"))
+            if len(message.content) > len(stub):
+                message = ToolMessage(content=stub, tool_call_id=message.tool_call_id)
+        stubbed.append(message)
+    return stubbed
+
+
+# --- Synopsis ---
+
+class _SynopsisCache:
+    """LRU of synopses keyed by a hash of the folded messages (previous synopsis included)."""
+
+    def __init__(self, max_entries: int):
+        self.max_entries = max_entries
+        self._lock = threading.Lock()
+        self._entries: "OrderedDict[str, str]" = OrderedDict()
+
+    def get(self, key: str) -> Optional[str]:
+        with self._lock:
+            value = self._entries.get(key)
+            if value is not None:
+                self._entries.move_to_end(key)
+            return value
+
+    def put(self, key: str, value: str):
+        with self._lock:
+            self._entries[key] = value
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+
+_synopsis_cache = _SynopsisCache(AGENT_HISTORY_SYNOPSIS_CACHE_SIZE)
+
+
+def _turns_key(turns: Sequence[List[BaseMessage]]) -> str:
+    digest = hashlib.sha256()
+    for turn in turns:
+        for message in turn:
+            digest.update(message.type.encode())
+            digest.update(_message_text(message).encode("utf-8", "replace"))
+            digest.update(b"\x00")
+    return digest.hexdigest()
+
+
+def _excerpt(text: str) -> str:
+    text = " ".join(text.split())
+    return text if len(text) <= _EXCERPT_CHARS else text[:_EXCERPT_CHARS].rstrip() + "..."
+
+
+def _extractive_summary(previous: str, turns: Sequence[List[BaseMessage]]) -> str:
+    """One synopsis line per folded turn: the user's request and the assistant's final reply."""
+    lines = [previous] if previous else []
+    for turn in turns:
+        request = next((m for m in turn if isinstance(m, HumanMessage)), None)
+        reply = next((m for m in reversed(turn) if isinstance(m, AIMessage) and m.content), None)
+        parts = []
+        if request is not None:
+            parts.append(f"User: {_excerpt(_message_text(request))}")
+        if reply is not None:
+            parts.append(f"Assistant: {_excerpt(reply.content)}")
+        if parts:
+            lines.append("- " + " / ".join(parts))
+    return "\n".join(lines)
+
+
+async def _llm_summary(previous: str, turns: Sequence[List[BaseMessage]], model: Optional[str]) -> str:
+    from .llm_config import llm
+
+    transcript = _extractive_summary("", turns)
+    prompt = [
+        SystemMessage(content=(
+            "Condense the conversation below into a short synopsis for an assistant that continues it. "
+            "Keep names, decisions, created or changed entities and open questions; drop pleasantries. "
+            f"Stay under {AGENT_HISTORY_SUMMARY_MAX_TOKENS} tokens."
+        )),
+        HumanMessage(content=(f"Existing synopsis:\n{previous}\n\n" if previous else "") + f"New turns:\n{transcript}"),
+    ]
+    response = await llm.ainvoke(prompt)
+    return response.content.strip()
+
+
+async def _synopsis(turns: List[List[BaseMessage]], model: Optional[str]) -> str:
+    """Synopsis of `turns`, reusing the cached synopsis of the longest cached prefix."""
+    key = _turns_key(turns)
+    cached = _synopsis_cache.get(key)
+    if cached is not None:
+        HISTORY_SYNOPSIS.labels(source="cache").inc()
+        return cached
+
+    previous, start = "", 0
+    for split in range(len(turns) - 1, 0, -1):
+        prefix = _synopsis_cache.get(_turns_key(turns[:split]))
+        if prefix is not None:
+            previous, start = prefix, split
+            break
+
+    new_turns = turns[start:]
+    source = "extended" if start else "built"
+    if AGENT_HISTORY_SUMMARY_MODE == "llm":
+        try:
+            synopsis = await _llm_summary(previous, new_turns, model)
+        except Exception as e:
+            logger.warning(f"LLM history summary failed, using the extractive synopsis: {e}")
+            synopsis = _extractive_summary(previous, new_turns)
+            source = "fallback"
+    else:
+        synopsis = _extractive_summary(previous, new_turns)
+
+    # Keep the synopsis itself within its budget: the oldest lines go first
+    lines = synopsis.splitlines()
+    while len(lines) > 1 and count_tokens([SystemMessage(content="\n".join(lines))], model) > AGENT_HISTORY_SUMMARY_MAX_TOKENS:
+        lines.pop(0)
+    synopsis = "\n".join(lines)
+
+    HISTORY_SYNOPSIS.labels(source=source).inc()
+    _synopsis_cache.put(key, synopsis)
+    return synopsis
+
+
+# --- Entry point ---
+
+def _assemble(preamble, synopsis, recent_turns) -> List[BaseMessage]:
+    messages = list(preamble)
+    if synopsis:
+        messages.append(SystemMessage(content=SYNOPSIS_PREFIX + synopsis))
+    for turn in recent_turns:
+        messages.extend(turn)
+    return messages
+
+
+async def compact_history(messages: Sequence[BaseMessage], model: Optional[str] = None,
+                          budget: Optional[int] = None) -> List[BaseMessage]:
+    """
+    Compacted copy of `messages` for an LLM prompt. Run it after `ensure_tool_call_integrity`
+    and leave room in the budget for the node's own instructions.
+    """
+    if not AGENT_HISTORY_COMPACTION_ENABLED or not messages:
+        return list(messages)
+
+    budget = budget or token_budget(model)
+    before = count_tokens(messages, model)
+    preamble, turns = _split_turns(_dedupe_system_messages(messages))
+    if not turns:
+        return preamble
+
+    # Only the current turn keeps its tool outputs
+    turns = [_stub_tool_outputs(turn) for turn in turns[:-1]] + [turns[-1]]
+    window = max(1, AGENT_HISTORY_RECENT_TURNS)
+    while True:
+        folded, recent = turns[:-window], turns[-window:]
+        synopsis = await _synopsis(folded, model) if folded else ""
+        compacted = _assemble(preamble, synopsis, recent)
+        after = count_tokens(compacted, model)
+        if after <= budget or window == 1:
+            break
+        window -= 1
+
+    if after > budget:
+        logger.warning(f"History for '{model}' is {after} tokens after compaction, over the {budget} token budget")
+    HISTORY_PROMPT_TOKENS.labels(stage="before").observe(before)
+    HISTORY_PROMPT_TOKENS.labels(stage="after").observe(after)
+    if before > after:
+        HISTORY_TOKENS_SAVED.inc(before - after)
+        logger.info(f"Compacted history from {len(messages)} messages/{before} tokens "
+                    f"to {len(compacted)} messages/{after} tokens ({len(folded)} turns summarised)")
+    return compacted
@@ -2,43 +2,191 @@
 LLM configuration and initialization for agent
 """
 import logging
+import os
+from typing import Dict, List, Optional, Tuple, Type
+from langchain_core.messages import BaseMessage
 from langchain_openai import ChatOpenAI
+from pydantic import BaseModel
+from helpers.model_helpers import PROVIDER_CONFIG, ModelProvider
+from helpers.provider_router import provider_router
+from helpers.stub_provider import stub_chat_openai_kwargs
+from services.llm.admission import admission_controller, estimate_tokens
+from services.llm.hedging import ahedged, hedge_delay, hedge_target, hedging_enabled
 from services.agents.tools.tool_schemas import (
     CharacterLookupArgs,
     StoryLookupArgs,
     BeatLookupArgs,
     SceneLookupArgs,
     ProjectGapAnalysisArgs,
+    ProjectContextSearchArgs,
     # YouTubeSearchArgs,
     ExecutorFunctionArgs  # Add the new tool
 )
-from schemas.agent import ChatResponse
+from schemas.agent import ChatResponseDraft
+from .model_tiers import FAST, NODE_TIERS, STRONG, tier_model
 
 logger = logging.getLogger(__name__)
 
+
+class AdmittedChatOpenAI(ChatOpenAI):
+    """ChatOpenAI whose calls go through the shared per-provider admission control."""
+
+    admission_provider: str = ModelProvider.GPT.value
+
+    def _admission_tokens(self, messages: List[BaseMessage]) -> int:
+        return estimate_tokens(*(str(m.content) for m in messages), max_tokens=self.max_tokens or 0)
+
+    @staticmethod
+    def _used_tokens(result) -> Optional[int]:
+        usage = (result.llm_output or {}).get("token_usage") or {}
+        return usage.get("total_tokens")
+
+    def _generate(self, messages, stop=None, run_manager=None, **kwargs):
+        if self.streaming:
+            # Delegates to _stream, which is admitted itself
+            return super()._generate(messages, stop=stop, run_manager=run_manager, **kwargs)
+        with admission_controller.admit(self.admission_provider, self._admission_tokens(messages)) as ticket:
+            result = super()._generate(messages, stop=stop, run_manager=run_manager, **kwargs)
+            ticket.settle(self._used_tokens(result))
+            return result
+
+    async def _agenerate(self, messages, stop=None, run_manager=None, **kwargs):
+        if self.streaming:
+            return await super()._agenerate(messages, stop=stop, run_manager=run_manager, **kwargs)
+        async with admission_controller.aadmit(self.admission_provider, self._admission_tokens(messages)) as ticket:
+            result = await super()._agenerate(messages, stop=stop, run_manager=run_manager, **kwargs)
+            ticket.settle(self._used_tokens(result))
+            return result
+
+    def _stream(self, messages, stop=None, run_manager=None, **kwargs):
+        with admission_controller.admit(self.admission_provider, self._admission_tokens(messages)):
+            yield from super()._stream(messages, stop=stop, run_manager=run_manager, **kwargs)
+
+    async def _astream(self, messages, stop=None, run_manager=None, **kwargs):
+        async with admission_controller.aadmit(self.admission_provider, self._admission_tokens(messages)):
+            async for chunk in super()._astream(messages, stop=stop, run_manager=run_manager, **kwargs):
+                yield chunk
+
+
+# Provider for the agent's LangChain models; "stub" runs the whole graph against the in-process stub
+AGENT_LLM_PROVIDER = ModelProvider(os.getenv("AGENT_LLM_PROVIDER", ModelProvider.GPT.value))
+
+
+def chat_model_for(provider: ModelProvider, model: str) -> AdmittedChatOpenAI:
+    """Admission-controlled LangChain chat model for an OpenAI-compatible provider."""
+    if provider == ModelProvider.STUB:
+        return AdmittedChatOpenAI(admission_provider=provider.value, **stub_chat_openai_kwargs(model))
+    config = PROVIDER_CONFIG[provider]
+    return AdmittedChatOpenAI(
+        model=model, api_key=os.getenv(config["key_env"]), base_url=config["base_url"],
+        admission_provider=provider.value
+    )
+
+
+# Models per tier and their tool-bound / structured-output runnables, built on first use
+_tier_llms: Dict[str, AdmittedChatOpenAI] = {}
+_tier_runnables: Dict[Tuple[str, str], object] = {}
+
+
+def tier_llm(tier: str) -> AdmittedChatOpenAI:
+    """Chat model of a model tier (see `model_tiers`) on AGENT_LLM_PROVIDER."""
+    model = _tier_llms.get(tier)
+    if model is None:
+        model = chat_model_for(AGENT_LLM_PROVIDER, tier_model(tier, AGENT_LLM_PROVIDER))
+        _tier_llms[tier] = model
+    return model
+
+
+def _tier_runnable(tier: str, kind: str, build):
+    runnable = _tier_runnables.get((tier, kind))
+    if runnable is None:
+        runnable = build(tier_llm(tier))
+        _tier_runnables[(tier, kind)] = runnable
+    return runnable
+
+
+def tier_llm_with_tools(tier: str):
+    """Tier model bound to the agent's lookup and executor tools."""
+    return _tier_runnable(tier, "tools", lambda model: model.bind_tools(
+        [
+            CharacterLookupArgs,
+            StoryLookupArgs,
+            BeatLookupArgs,
+            SceneLookupArgs,
+            ProjectGapAnalysisArgs,
+            ProjectContextSearchArgs,
+            # YouTubeSearchArgs,
+            ExecutorFunctionArgs  # Add the new tool
+        ],
+        tool_choice="auto"
+    ))
+
+
+def tier_structured_llm(tier: str, schema: Type[BaseModel]):
+    """Tier model bound to a structured-output schema."""
+    return _tier_runnable(tier, schema.__name__, lambda model: model.with_structured_output(schema))
+
+
+def agent_chat_model() -> AdmittedChatOpenAI:
+    """Chat model of the strong tier."""
+    return tier_llm(STRONG)
+
+
 # Initialize LLM
-llm = ChatOpenAI(model="gpt-4o")
+llm = agent_chat_model()
+logger.info(f"Agent model tiers on {AGENT_LLM_PROVIDER.value}: fast={tier_model(FAST, AGENT_LLM_PROVIDER)}, "
+            f"strong={tier_model(STRONG, AGENT_LLM_PROVIDER)}; per sub-task: {NODE_TIERS}")
 # model notes:
 # -- gpt-4o-mini = is not able to fit into reasonable time limits, responses are often inaccurate VS price
 # -- gpt-4.1-mini = fair price, very fast VS little bit less accurate - GOTO FOR TESTING - FUNCTIONAL REQUESTS
 # -- gpt-4o = precise and quick VS expensive price
 
 # Bind tools to LLM
-llm_with_tools = llm.bind_tools(
-    [
-        CharacterLookupArgs,
-        StoryLookupArgs,
-        BeatLookupArgs,
-        SceneLookupArgs,
-        ProjectGapAnalysisArgs,
-        # YouTubeSearchArgs,
-        ExecutorFunctionArgs  # Add the new tool
-    ],
-    tool_choice="auto"
-)
+llm_with_tools = tier_llm_with_tools(STRONG)
 
 
 # Bind structured output for final response generation
-structured_llm = llm.with_structured_output(
-    ChatResponse
-)
\ No newline at end of file
+structured_llm = tier_structured_llm(STRONG, ChatResponseDraft)
+
+
+# Structured-output runnables on secondary providers, built on first hedge
+_hedge_structured_llms: Dict[ModelProvider, object] = {}
+
+
+def _secondary_structured_llm(provider: ModelProvider, model: str):
+    runnable = _hedge_structured_llms.get(provider)
+    if runnable is None:
+        runnable = chat_model_for(provider, model).with_structured_output(ChatResponseDraft)
+        _hedge_structured_llms[provider] = runnable
+    return runnable
+
+
+async def ainvoke_structured(messages: List[BaseMessage], hedge: Optional[bool] = None,
+                             tier: str = STRONG) -> ChatResponseDraft:
+    """
+    Await the `tier` model's ChatResponseDraft output, hedging to a secondary
+    OpenAI-compatible provider when enabled and the primary is slower than its
+    latency percentile.
+    """
+    primary_llm = tier_llm(tier)
+    primary_runnable = tier_structured_llm(tier, ChatResponseDraft)
+    primary_provider = ModelProvider(primary_llm.admission_provider)
+    primary_model = primary_llm.model_name
+
+    async def primary():
+        with provider_router.track(primary_provider.value, primary_model):
+            return await primary_runnable.ainvoke(messages)
+
+    secondary_call = None
+    target = hedge_target(primary_provider, openai_compatible=True) if hedging_enabled(hedge) else None
+    if target:
+        secondary_provider, secondary_model = target
+        secondary_runnable = _secondary_structured_llm(secondary_provider, secondary_model)
+
+        async def secondary():
+            with provider_router.track(secondary_provider.value, secondary_model):
+                return await secondary_runnable.ainvoke(messages)
+        secondary_call = secondary
+
+    delay = hedge_delay(primary_provider.value, primary_model)
+    return await ahedged(primary, secondary_call, delay, "agent.final_response")
@@ -0,0 +1,179 @@
+"""
+Model tiers for the agent's LLM sub-tasks.
+
+Each graph node that calls an LLM names its sub-task (see NODE_TIER_DEFAULTS) and gets
+the model of that task's tier: `fast` (AGENT_MODEL_FAST) or `strong` (AGENT_MODEL_STRONG).
+The tier of a task is overridden with AGENT_TIER_<TASK>, e.g. AGENT_TIER_INTENT=strong.
+
+A fast-tier call is escalated to the strong tier when
+- the user's message is long (AGENT_TIER_ESCALATE_MESSAGE_TOKENS), before the call
+- it detects an operation with less than AGENT_TIER_ESCALATE_CONFIDENCE
+- it fails (error or unparseable output)
+
+Calls, latency and escalations are counted per task and tier so the cheapest fast path
+can be tuned from the metrics.
+"""
+import asyncio
+import logging
+import os
+import time
+from contextlib import contextmanager
+from typing import Awaitable, Callable, Iterator, Optional, Sequence, TypeVar
+
+from langchain_core.messages import BaseMessage, HumanMessage
+from prometheus_client import Counter, Histogram
+
+from helpers.model_helpers import ModelProvider
+from helpers.stub_provider import STUB_MODELS
+from services.llm.admission import estimate_tokens
+
+logger = logging.getLogger(__name__)
+
+T = TypeVar("T")
+
+FAST = "fast"
+STRONG = "strong"
+TIERS = (FAST, STRONG)
+
+AGENT_MODEL_FAST = os.getenv("AGENT_MODEL_FAST", "gpt-4.1-mini")
+AGENT_MODEL_STRONG = os.getenv("AGENT_MODEL_STRONG", "gpt-4o")
+# The stub provider serves both tiers, under its own model names
+_STUB_TIER_MODELS = {FAST: STUB_MODELS[1], STRONG: STUB_MODELS[0]}
+
+AGENT_TIER_ESCALATION_ENABLED = os.getenv("AGENT_TIER_ESCALATION_ENABLED", "true").lower() == "true"
+AGENT_TIER_ESCALATE_MESSAGE_TOKENS = int(os.getenv("AGENT_TIER_ESCALATE_MESSAGE_TOKENS", "300"))
+# Same as the acceptance threshold of intent detection and the single-pass router
+AGENT_TIER_ESCALATE_CONFIDENCE = float(os.getenv("AGENT_TIER_ESCALATE_CONFIDENCE", "0.7"))
+
+# Sub-task -> default tier
+NODE_TIER_DEFAULTS = {
+    "intent": FAST,          # Operation/parameter detection (pre_processors.intent_detection)
+    "refinement": FAST,      # Parameter refinement (intent_processor)
+    "confirmation": FAST,    # Interpreting the user's yes/no/modify (confirmation_handler)
+    "general": STRONG,       # Tool-calling reply (general_llm_caller)
+    "single_pass": STRONG,   # One-call intent + reply (single_pass_router)
+    "final": STRONG,         # Structured final reply with suggestion IDs
+    "suggestions": FAST,     # Structured call whose reply text is fixed; only suggestions are chosen
+}
+
+MODEL_TIER_CALLS = Counter(
+    "agent_model_tier_calls_total", "Agent LLM calls by sub-task, tier and outcome", ["node", "tier", "outcome"]
+)
+MODEL_TIER_SECONDS = Histogram(
+    "agent_model_tier_seconds", "Agent LLM call duration by sub-task and tier", ["node", "tier"],
+    buckets=(0.25, 0.5, 1, 2, 3, 5, 8, 13, 20, 30)
+)
+MODEL_TIER_ESCALATIONS = Counter(
+    "agent_model_tier_escalations_total", "Fast-tier calls escalated to the strong tier", ["node", "reason"]
+)
+
+
+def _tier_from_env(node: str) -> str:
+    tier = os.getenv(f"AGENT_TIER_{node.upper()}", NODE_TIER_DEFAULTS[node]).lower()
+    if tier not in TIERS:
+        logger.warning(f"Unknown model tier '{tier}' for AGENT_TIER_{node.upper()}, using '{NODE_TIER_DEFAULTS[node]}'")
+        return NODE_TIER_DEFAULTS[node]
+    return tier
+
+
+NODE_TIERS = {node: _tier_from_env(node) for node in NODE_TIER_DEFAULTS}
+
+
+def tier_model(tier: str, provider: ModelProvider) -> str:
+    """Model name of `tier` on `provider`."""
+    if provider == ModelProvider.STUB:
+        return _STUB_TIER_MODELS[tier]
+    return AGENT_MODEL_FAST if tier == FAST else AGENT_MODEL_STRONG
+
+
+def latest_user_text(messages: Sequence[BaseMessage]) -> str:
+    for message in reversed(messages):
+        if isinstance(message, HumanMessage):
+            return message.content if isinstance(message.content, str) else str(message.content)
+    return ""
+
+
+def escalate(node: str, reason: str) -> str:
+    MODEL_TIER_ESCALATIONS.labels(node=node, reason=reason).inc()
+    logger.info(f"Escalating '{node}' to the {STRONG} model tier ({reason})")
+    return STRONG
+
+
+def choose_tier(node: str, user_text: str = "") -> str:
+    """Configured tier of `node`, escalated up front for long user messages."""
+    tier = NODE_TIERS[node]
+    if (tier == FAST and AGENT_TIER_ESCALATION_ENABLED
+            and estimate_tokens(user_text) > AGENT_TIER_ESCALATE_MESSAGE_TOKENS):
+        return escalate(node, "complexity")
+    return tier
+
+
+def is_uncertain(operation: Optional[str], confidence: Optional[float]) -> bool:
+    """An operation was detected, but with less than AGENT_TIER_ESCALATE_CONFIDENCE."""
+    return bool(operation) and (confidence or 0) < AGENT_TIER_ESCALATE_CONFIDENCE
+
+
+def should_escalate(tier: str, failed: bool = False, uncertain: bool = False) -> Optional[str]:
+    """Reason to retry a finished `tier` call on the strong tier, or None."""
+    if tier == STRONG or not AGENT_TIER_ESCALATION_ENABLED:
+        return None
+    if failed:
+        return "error"
+    if uncertain:
+        return "confidence"
+    return None
+
+
+class TierCall:
+    """Outcome of one tracked call; callers downgrade `outcome` from 'ok' when needed."""
+
+    def __init__(self, node: str, tier: str):
+        self.node = node
+        self.tier = tier
+        self.outcome = "ok"
+
+
+@contextmanager
+def track_tier(node: str, tier: str) -> Iterator[TierCall]:
+    """Records the latency and outcome ('ok', 'error', 'low_confidence', ...) of an LLM call."""
+    call = TierCall(node, tier)
+    start = time.perf_counter()
+    try:
+        yield call
+    except asyncio.CancelledError:
+        call.outcome = "cancelled"
+        raise
+    except BaseException:
+        call.outcome = "error"
+        raise
+    finally:
+        MODEL_TIER_SECONDS.labels(node=node, tier=tier).observe(time.perf_counter() - start)
+        MODEL_TIER_CALLS.labels(node=node, tier=tier, outcome=call.outcome).inc()
+
+
+async def ainvoke_tiered(node: str, user_text: str, invoke: Callable[[str], Awaitable[T]],
+                         uncertain: Optional[Callable[[T], bool]] = None) -> T:
+    """
+    Await `invoke(tier)` on the tier chosen for `node`. A fast-tier call that fails, or
+    whose result is `uncertain`, is retried once on the strong tier; a strong-tier
+    failure is raised.
+    """
+    tier = choose_tier(node, user_text)
+    while True:
+        is_uncertain_result = False
+        try:
+            with track_tier(node, tier) as call:
+                result = await invoke(tier)
+                if uncertain is not None and uncertain(result):
+                    is_uncertain_result = True
+                    call.outcome = "low_confidence"
+        except Exception as e:
+            reason = should_escalate(tier, failed=True)
+            if not reason:
+                raise
+            logger.warning(f"'{node}' call failed on the {tier} tier: {e}")
+        else:
+            reason = should_escalate(tier, uncertain=is_uncertain_result)
+            if not reason:
+                return result
+        tier = escalate(node, reason)
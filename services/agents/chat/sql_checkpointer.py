@@ -0,0 +1,449 @@
+"""
+SQL-backed checkpointer for the chat agent.
+
+Checkpoints live in the service database (SQLite locally, Postgres in production)
+so chat sessions survive restarts and any worker can resume any session. Channel
+values are stored once per version in a blob table instead of inside every
+checkpoint, and every payload is zlib-compressed serde output. Task writes are
+buffered and flushed in one transaction together with the next checkpoint (or
+after a short delay), and only the newest checkpoints of a session are kept.
+"""
+import asyncio
+import json
+import logging
+import os
+import random
+import threading
+import time
+import zlib
+from collections import defaultdict
+from typing import Any, AsyncIterator, Dict, Iterator, List, Optional, Sequence, Tuple
+
+from langchain_core.runnables import RunnableConfig
+from langgraph.checkpoint.base import (
+    WRITES_IDX_MAP,
+    BaseCheckpointSaver,
+    ChannelVersions,
+    Checkpoint,
+    CheckpointMetadata,
+    CheckpointTuple,
+    get_checkpoint_id,
+    get_checkpoint_metadata,
+)
+from prometheus_client import Counter, Histogram
+from sqlalchemy import and_, delete, func, insert, select
+from sqlalchemy.engine import Connection, Engine
+
+from models.models import AgentCheckpoint, AgentCheckpointBlob, AgentCheckpointWrite
+
+logger = logging.getLogger(__name__)
+
+AGENT_CHECKPOINT_KEEP = int(os.getenv("AGENT_CHECKPOINT_KEEP", "20"))
+AGENT_CHECKPOINT_PRUNE_EVERY = int(os.getenv("AGENT_CHECKPOINT_PRUNE_EVERY", "5"))
+AGENT_CHECKPOINT_COMPRESSION_LEVEL = int(os.getenv("AGENT_CHECKPOINT_COMPRESSION_LEVEL", "6"))
+# Longest a buffered task write may wait before it is flushed on its own
+AGENT_CHECKPOINT_FLUSH_INTERVAL = float(os.getenv("AGENT_CHECKPOINT_FLUSH_INTERVAL", "0.05"))
+AGENT_CHECKPOINT_MAX_PENDING_WRITES = int(os.getenv("AGENT_CHECKPOINT_MAX_PENDING_WRITES", "256"))
+
+_checkpoints = AgentCheckpoint.__table__
+_blobs = AgentCheckpointBlob.__table__
+_writes = AgentCheckpointWrite.__table__
+
+SQL_CHECKPOINTER_SECONDS = Histogram(
+    "agent_sql_checkpointer_seconds", "Time spent in SQL checkpointer operations", ["operation"],
+    buckets=(0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5)
+)
+SQL_CHECKPOINTER_BYTES = Counter(
+    "agent_sql_checkpointer_bytes_written_total", "Compressed bytes written by the SQL checkpointer", ["kind"]
+)
+SQL_CHECKPOINTER_PRUNED = Counter(
+    "agent_sql_checkpointer_checkpoints_pruned_total", "Old checkpoints deleted by the SQL checkpointer"
+)
+
+
+class SqlCheckpointSaver(BaseCheckpointSaver):
+    """LangGraph checkpoint saver storing sessions in the service database."""
+
+    def __init__(self, engine: Engine, *, keep_checkpoints: int = AGENT_CHECKPOINT_KEEP,
+                 prune_every: int = AGENT_CHECKPOINT_PRUNE_EVERY,
+                 compression_level: int = AGENT_CHECKPOINT_COMPRESSION_LEVEL,
+                 flush_interval: float = AGENT_CHECKPOINT_FLUSH_INTERVAL,
+                 max_pending_writes: int = AGENT_CHECKPOINT_MAX_PENDING_WRITES, serde=None):
+        super().__init__(serde=serde)
+        self.engine = engine
+        # The newest checkpoint and its parent are needed to resume a run
+        self.keep_checkpoints = max(2, keep_checkpoints)
+        self.prune_every = max(1, prune_every)
+        self.compression_level = compression_level
+        self.flush_interval = flush_interval
+        self.max_pending_writes = max(1, max_pending_writes)
+        self._lock = threading.Lock()
+        self._pending: Dict[str, List[dict]] = defaultdict(list)
+        self._pending_count = 0
+        self._puts_since_prune: Dict[Tuple[str, str], int] = defaultdict(int)
+        self._wakeup = threading.Event()
+        self._flusher: Optional[threading.Thread] = None
+
+    def setup(self):
+        """Create the checkpoint tables if they do not exist (migrations create them in production)."""
+        for table in (_checkpoints, _blobs, _writes):
+            table.create(bind=self.engine, checkfirst=True)
+
+    # --- Serialization ---
+
+    def _dump(self, value: Any) -> Tuple[str, bytes]:
+        type_, data = self.serde.dumps_typed(value)
+        return type_, zlib.compress(data, self.compression_level)
+
+    def _load(self, type_: str, data: Optional[bytes]) -> Any:
+        return self.serde.loads_typed((type_, zlib.decompress(data) if data else b""))
+
+    # --- Write buffering ---
+
+    def _ensure_flusher(self):
+        with self._lock:
+            if self._flusher is not None:
+                return
+            self._flusher = threading.Thread(target=self._flush_loop, daemon=True, name="agent-checkpoint-flush")
+        self._flusher.start()
+
+    def _flush_loop(self):
+        while True:
+            self._wakeup.wait()
+            time.sleep(self.flush_interval)
+            self._wakeup.clear()
+            try:
+                self.flush()
+            except Exception as e:
+                logger.error(f"Failed to flush buffered checkpoint writes: {str(e)}")
+
+    def _take_pending(self, thread_id: Optional[str] = None) -> List[dict]:
+        with self._lock:
+            if thread_id is None:
+                rows = [row for rows in self._pending.values() for row in rows]
+                self._pending.clear()
+            else:
+                rows = self._pending.pop(thread_id, [])
+            self._pending_count -= len(rows)
+            return rows
+
+    def _write_rows(self, conn: Connection, rows: List[dict]):
+        """Insert buffered task writes; non-negative indexes never overwrite an existing write."""
+        if not rows:
+            return
+        by_checkpoint: Dict[tuple, Dict[tuple, dict]] = defaultdict(dict)
+        for row in rows:
+            key = (row["task_id"], row["idx"])
+            checkpoint_rows = by_checkpoint[(row["thread_id"], row["checkpoint_ns"], row["checkpoint_id"])]
+            if row["idx"] >= 0 and key in checkpoint_rows:
+                continue
+            checkpoint_rows[key] = row
+
+        to_insert = []
+        for (thread_id, checkpoint_ns, checkpoint_id), checkpoint_rows in by_checkpoint.items():
+            existing = set(conn.execute(
+                select(_writes.c.task_id, _writes.c.idx).where(
+                    _writes.c.thread_id == thread_id,
+                    _writes.c.checkpoint_ns == checkpoint_ns,
+                    _writes.c.checkpoint_id == checkpoint_id,
+                )
+            ).all())
+            for key, row in checkpoint_rows.items():
+                if key in existing:
+                    if row["idx"] >= 0:
+                        continue
+                    conn.execute(delete(_writes).where(
+                        _writes.c.thread_id == thread_id,
+                        _writes.c.checkpoint_ns == checkpoint_ns,
+                        _writes.c.checkpoint_id == checkpoint_id,
+                        _writes.c.task_id == key[0],
+                        _writes.c.idx == key[1],
+                    ))
+                to_insert.append(row)
+        if to_insert:
+            conn.execute(insert(_writes), to_insert)
+            SQL_CHECKPOINTER_BYTES.labels(kind="write").inc(sum(len(r["value"] or b"") for r in to_insert))
+
+    def flush(self, thread_id: Optional[str] = None):
+        """Write buffered task writes (of one session, or of all sessions) to the database."""
+        rows = self._take_pending(thread_id)
+        if not rows:
+            return
+        start = time.perf_counter()
+        with self.engine.begin() as conn:
+            self._write_rows(conn, rows)
+        SQL_CHECKPOINTER_SECONDS.labels(operation="flush").observe(time.perf_counter() - start)
+
+    # --- Reads ---
+
+    def _load_tuple(self, conn: Connection, row) -> CheckpointTuple:
+        thread_id, checkpoint_ns, checkpoint_id = row.thread_id, row.checkpoint_ns, row.checkpoint_id
+        checkpoint: Checkpoint = self._load(row.type, row.checkpoint)
+        versions = checkpoint.get("channel_versions", {})
+
+        channel_values = {}
+        if versions:
+            blob_rows = conn.execute(
+                select(_blobs.c.channel, _blobs.c.version, _blobs.c.type, _blobs.c.blob).where(
+                    _blobs.c.thread_id == thread_id,
+                    _blobs.c.checkpoint_ns == checkpoint_ns,
+                    _blobs.c.channel.in_(list(versions)),
+                )
+            ).all()
+            for channel, version, type_, blob in blob_rows:
+                if str(versions.get(channel)) == version and type_ != "empty":
+                    channel_values[channel] = self._load(type_, blob)
+
+        write_rows = conn.execute(
+            select(_writes.c.task_id, _writes.c.channel, _writes.c.type, _writes.c.value).where(
+                _writes.c.thread_id == thread_id,
+                _writes.c.checkpoint_ns == checkpoint_ns,
+                _writes.c.checkpoint_id == checkpoint_id,
+            ).order_by(_writes.c.task_id, _writes.c.idx)
+        ).all()
+
+        return CheckpointTuple(
+            config={
+                "configurable": {
+                    "thread_id": thread_id,
+                    "checkpoint_ns": checkpoint_ns,
+                    "checkpoint_id": checkpoint_id,
+                }
+            },
+            checkpoint={**checkpoint, "channel_values": channel_values},
+            metadata=self._load(row.type, row._mapping["metadata"]),
+            parent_config=(
+                {
+                    "configurable": {
+                        "thread_id": thread_id,
+                        "checkpoint_ns": checkpoint_ns,
+                        "checkpoint_id": row.parent_checkpoint_id,
+                    }
+                }
+                if row.parent_checkpoint_id
+                else None
+            ),
+            pending_writes=[(task_id, channel, self._load(type_, value)) for task_id, channel, type_, value in write_rows],
+        )
+
+    def get_tuple(self, config: RunnableConfig) -> Optional[CheckpointTuple]:
+        thread_id = config["configurable"]["thread_id"]
+        checkpoint_ns = config["configurable"].get("checkpoint_ns", "")
+        checkpoint_id = get_checkpoint_id(config)
+        self.flush(thread_id)
+
+        start = time.perf_counter()
+        query = select(_checkpoints).where(
+            _checkpoints.c.thread_id == thread_id,
+            _checkpoints.c.checkpoint_ns == checkpoint_ns,
+        )
+        if checkpoint_id:
+            query = query.where(_checkpoints.c.checkpoint_id == checkpoint_id)
+        else:
+            query = query.order_by(_checkpoints.c.checkpoint_id.desc()).limit(1)
+        with self.engine.connect() as conn:
+            row = conn.execute(query).first()
+            result = self._load_tuple(conn, row) if row else None
+        SQL_CHECKPOINTER_SECONDS.labels(operation="get").observe(time.perf_counter() - start)
+        return result
+
+    def list(self, config: Optional[RunnableConfig], *, filter: Optional[Dict[str, Any]] = None,
+             before: Optional[RunnableConfig] = None, limit: Optional[int] = None) -> Iterator[CheckpointTuple]:
+        query = select(_checkpoints)
+        if config:
+            thread_id = config["configurable"]["thread_id"]
+            self.flush(thread_id)
+            query = query.where(_checkpoints.c.thread_id == thread_id)
+            if config["configurable"].get("checkpoint_ns") is not None:
+                query = query.where(_checkpoints.c.checkpoint_ns == config["configurable"]["checkpoint_ns"])
+            if checkpoint_id := get_checkpoint_id(config):
+                query = query.where(_checkpoints.c.checkpoint_id == checkpoint_id)
+        else:
+            self.flush()
+        if before and (before_checkpoint_id := get_checkpoint_id(before)):
+            query = query.where(_checkpoints.c.checkpoint_id < before_checkpoint_id)
+        query = query.order_by(_checkpoints.c.checkpoint_id.desc())
+        if limit is not None and not filter:
+            query = query.limit(limit)
+
+        items = []
+        with self.engine.connect() as conn:
+            for row in conn.execute(query).all():
+                if limit is not None and len(items) >= limit:
+                    break
+                if filter:
+                    metadata = self._load(row.type, row._mapping["metadata"])
+                    if not all(value == metadata.get(key) for key, value in filter.items()):
+                        continue
+                items.append(self._load_tuple(conn, row))
+        return iter(items)
+
+    # --- Writes ---
+
+    def _prune(self, conn: Connection, thread_id: str, checkpoint_ns: str):
+        """Delete all but the newest checkpoints of a session and the blobs only they referenced."""
+        scope = and_(_checkpoints.c.thread_id == thread_id, _checkpoints.c.checkpoint_ns == checkpoint_ns)
+        count = conn.execute(select(func.count()).select_from(_checkpoints).where(scope)).scalar()
+        if count <= self.keep_checkpoints:
+            return
+
+        kept = conn.execute(
+            select(_checkpoints.c.checkpoint_id, _checkpoints.c.channel_versions).where(scope)
+            .order_by(_checkpoints.c.checkpoint_id.desc()).limit(self.keep_checkpoints)
+        ).all()
+        oldest_kept = kept[-1].checkpoint_id
+        conn.execute(delete(_checkpoints).where(scope, _checkpoints.c.checkpoint_id < oldest_kept))
+        conn.execute(delete(_writes).where(
+            _writes.c.thread_id == thread_id,
+            _writes.c.checkpoint_ns == checkpoint_ns,
+            _writes.c.checkpoint_id < oldest_kept,
+        ))
+        SQL_CHECKPOINTER_PRUNED.inc(count - len(kept))
+
+        referenced = set()
+        for row in kept:
+            referenced.update(json.loads(row.channel_versions or "{}").items())
+        blob_scope = and_(_blobs.c.thread_id == thread_id, _blobs.c.checkpoint_ns == checkpoint_ns)
+        for channel, version in conn.execute(select(_blobs.c.channel, _blobs.c.version).where(blob_scope)).all():
+            if (channel, version) not in referenced:
+                conn.execute(delete(_blobs).where(blob_scope, _blobs.c.channel == channel, _blobs.c.version == version))
+
+    def put(self, config: RunnableConfig, checkpoint: Checkpoint, metadata: CheckpointMetadata,
+            new_versions: ChannelVersions) -> RunnableConfig:
+        thread_id = config["configurable"]["thread_id"]
+        checkpoint_ns = config["configurable"].get("checkpoint_ns", "")
+        start = time.perf_counter()
+
+        checkpoint_copy = checkpoint.copy()
+        values = checkpoint_copy.pop("channel_values")
+        blob_rows = []
+        for channel, version in new_versions.items():
+            type_, blob = self._dump(values[channel]) if channel in values else ("empty", None)
+            blob_rows.append({
+                "thread_id": thread_id, "checkpoint_ns": checkpoint_ns,
+                "channel": channel, "version": str(version), "type": type_, "blob": blob,
+            })
+        type_, checkpoint_blob = self._dump(checkpoint_copy)
+        metadata_type, metadata_blob = self._dump(get_checkpoint_metadata(config, metadata))
+        # Checkpoints and metadata share a serde type column; both are msgpack today
+        if metadata_type != type_:
+            raise ValueError(f"Checkpoint and metadata serialized as different types ({type_}, {metadata_type})")
+        checkpoint_row = {
+            "thread_id": thread_id,
+            "checkpoint_ns": checkpoint_ns,
+            "checkpoint_id": checkpoint["id"],
+            "parent_checkpoint_id": config["configurable"].get("checkpoint_id"),
+            "type": type_,
+            "checkpoint": checkpoint_blob,
+            "metadata": metadata_blob,
+            "channel_versions": json.dumps({k: str(v) for k, v in checkpoint["channel_versions"].items()}),
+        }
+
+        pending = self._take_pending(thread_id)
+        prune_key = (thread_id, checkpoint_ns)
+        with self.engine.begin() as conn:
+            self._write_rows(conn, pending)
+            for row in blob_rows:
+                conn.execute(delete(_blobs).where(
+                    _blobs.c.thread_id == thread_id,
+                    _blobs.c.checkpoint_ns == checkpoint_ns,
+                    _blobs.c.channel == row["channel"],
+                    _blobs.c.version == row["version"],
+                ))
+            if blob_rows:
+                conn.execute(insert(_blobs), blob_rows)
+            conn.execute(delete(_checkpoints).where(
+                _checkpoints.c.thread_id == thread_id,
+                _checkpoints.c.checkpoint_ns == checkpoint_ns,
+                _checkpoints.c.checkpoint_id == checkpoint["id"],
+            ))
+            conn.execute(insert(_checkpoints).values(**checkpoint_row))
+
+            self._puts_since_prune[prune_key] += 1
+            if self._puts_since_prune[prune_key] >= self.prune_every:
+                self._puts_since_prune[prune_key] = 0
+                self._prune(conn, thread_id, checkpoint_ns)
+
+        SQL_CHECKPOINTER_BYTES.labels(kind="checkpoint").inc(len(checkpoint_blob) + len(metadata_blob or b""))
+        SQL_CHECKPOINTER_BYTES.labels(kind="blob").inc(sum(len(r["blob"] or b"") for r in blob_rows))
+        SQL_CHECKPOINTER_SECONDS.labels(operation="put").observe(time.perf_counter() - start)
+        return {
+            "configurable": {
+                "thread_id": thread_id,
+                "checkpoint_ns": checkpoint_ns,
+                "checkpoint_id": checkpoint["id"],
+            }
+        }
+
+    def _buffer_writes(self, config: RunnableConfig, writes: Sequence[Tuple[str, Any]], task_id: str,
+                       task_path: str) -> bool:
+        """Queue task writes for the next flush; returns True when the buffer is full."""
+        thread_id = config["configurable"]["thread_id"]
+        checkpoint_ns = config["configurable"].get("checkpoint_ns", "")
+        checkpoint_id = config["configurable"]["checkpoint_id"]
+        rows = []
+        for idx, (channel, value) in enumerate(writes):
+            type_, blob = self._dump(value)
+            rows.append({
+                "thread_id": thread_id, "checkpoint_ns": checkpoint_ns, "checkpoint_id": checkpoint_id,
+                "task_id": task_id, "idx": WRITES_IDX_MAP.get(channel, idx), "channel": channel,
+                "type": type_, "value": blob, "task_path": task_path,
+            })
+        with self._lock:
+            self._pending[thread_id].extend(rows)
+            self._pending_count += len(rows)
+            if self._pending_count >= self.max_pending_writes:
+                return True
+        self._ensure_flusher()
+        self._wakeup.set()
+        return False
+
+    def put_writes(self, config: RunnableConfig, writes: Sequence[Tuple[str, Any]], task_id: str,
+                   task_path: str = "") -> None:
+        if self._buffer_writes(config, writes, task_id, task_path):
+            self.flush()
+
+    def delete_thread(self, thread_id: str) -> None:
+        self._take_pending(thread_id)
+        with self.engine.begin() as conn:
+            conn.execute(delete(_writes).where(_writes.c.thread_id == thread_id))
+            conn.execute(delete(_blobs).where(_blobs.c.thread_id == thread_id))
+            conn.execute(delete(_checkpoints).where(_checkpoints.c.thread_id == thread_id))
+        with self._lock:
+            for key in [k for k in self._puts_since_prune if k[0] == thread_id]:
+                del self._puts_since_prune[key]
+
+    def get_next_version(self, current: Optional[str], channel: None) -> str:
+        if current is None:
+            current_v = 0
+        elif isinstance(current, int):
+            current_v = current
+        else:
+            current_v = int(current.split(".")[0])
+        return f"{current_v + 1:032}.{random.random():016}"
+
+    # --- Async interface (the engine is synchronous, so calls run in a worker thread) ---
+
+    async def aget_tuple(self, config: RunnableConfig) -> Optional[CheckpointTuple]:
+        return await asyncio.to_thread(self.get_tuple, config)
+
+    async def alist(self, config: Optional[RunnableConfig], *, filter: Optional[Dict[str, Any]] = None,
+                    before: Optional[RunnableConfig] = None, limit: Optional[int] = None) -> AsyncIterator[CheckpointTuple]:
+        items = await asyncio.to_thread(
+            lambda: list(self.list(config, filter=filter, before=before, limit=limit))
+        )
+        for item in items:
+            yield item
+
+    async def aput(self, config: RunnableConfig, checkpoint: Checkpoint, metadata: CheckpointMetadata,
+                   new_versions: ChannelVersions) -> RunnableConfig:
+        return await asyncio.to_thread(self.put, config, checkpoint, metadata, new_versions)
+
+    async def aput_writes(self, config: RunnableConfig, writes: Sequence[Tuple[str, Any]], task_id: str,
+                          task_path: str = "") -> None:
+        # Writes are only buffered here; the database is touched only when the buffer is full
+        if self._buffer_writes(config, writes, task_id, task_path):
+            await asyncio.to_thread(self.flush)
+
+    async def adelete_thread(self, thread_id: str) -> None:
+        await asyncio.to_thread(self.delete_thread, thread_id)
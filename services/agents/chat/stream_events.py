@@ -0,0 +1,181 @@
+"""
+Translation of chat graph stream chunks into SSE events for `/agent/chat/stream`.
+
+The graph is streamed with `stream_mode=["debug", "messages", "values"]`:
+- `debug` task / task_result chunks become `node_start` / `node_end`, and the messages a
+  node writes become `tool_call` (AI tool calls) and `tool_result` (tool outputs)
+- `messages` chunks of the response-writing nodes become `delta` events; those nodes
+  return structured JSON, so only the text of its `response` field is relayed. A node
+  task can make several LLM runs (a hedged duplicate, a tier escalation retry); one run
+  is relayed at a time, and a `reset` event carries the full text so far when a later
+  run replaces it
+- `values` chunks are kept so the route can build the closing `ChatResponse`
+"""
+import json
+import logging
+from typing import Any, Dict, List, Optional
+
+from langchain_core.messages import AIMessage, ToolMessage
+
+from services.sse import format_sse_event
+
+logger = logging.getLogger(__name__)
+
+# Nodes whose structured output carries the user-facing `response` text
+RESPONSE_NODES = {"final_responder_node", "single_pass_node"}
+_TOOL_RESULT_PREVIEW_CHARS = 500
+
+
+class ResponseFieldExtractor:
+    """Incrementally decodes one string field of a JSON object that arrives in pieces."""
+
+    _ESCAPES = {'"': '"', "\\": "\\", "/": "/", "b": "\b", "f": "\f", "n": "\n", "r": "\r", "t": "\t"}
+
+    def __init__(self, field: str = "response"):
+        self.marker = f'"{field}"'
+        self.buffer = ""
+        self.position: Optional[int] = None  # Index of the next undecoded character of the value
+        self.done = False
+
+    def feed(self, piece: str) -> str:
+        """Add raw JSON text; return the newly decoded part of the field value."""
+        self.buffer += piece
+        if self.done:
+            return ""
+        if self.position is None:
+            start = self.buffer.find(self.marker)
+            if start < 0:
+                return ""
+            rest = self.buffer[start + len(self.marker):]
+            stripped = rest.lstrip()
+            if not stripped.startswith(":"):
+                return ""
+            value = stripped[1:].lstrip()
+            if not value.startswith('"'):
+                return ""
+            self.position = len(self.buffer) - len(value) + 1
+
+        decoded = []
+        i = self.position
+        while i < len(self.buffer):
+            char = self.buffer[i]
+            if char == '"':
+                self.done = True
+                i += 1
+                break
+            if char != "\\":
+                decoded.append(char)
+                i += 1
+                continue
+            if i + 1 >= len(self.buffer):
+                break  # Wait for the rest of the escape sequence
+            code = self.buffer[i + 1]
+            if code == "u":
+                if i + 6 > len(self.buffer):
+                    break
+                try:
+                    decoded.append(chr(int(self.buffer[i + 2:i + 6], 16)))
+                except ValueError:
+                    pass
+                i += 6
+            else:
+                decoded.append(self._ESCAPES.get(code, code))
+                i += 2
+        self.position = i
+        return "".join(decoded)
+
+
+class _RunText:
+    """Response text decoded so far from one LLM run."""
+
+    def __init__(self, follows_finished: bool):
+        self.extractor = ResponseFieldExtractor()
+        self.text = ""
+        self.follows_finished = follows_finished  # Started after the relayed run had finished
+
+
+class _TaskStream:
+    """LLM runs of one node task and the run being relayed."""
+
+    def __init__(self):
+        self.runs: Dict[str, _RunText] = {}
+        self.relayed: Optional[str] = None
+
+
+def _preview(content: Any) -> str:
+    text = content if isinstance(content, str) else json.dumps(content, default=str)
+    return text if len(text) <= _TOOL_RESULT_PREVIEW_CHARS else text[:_TOOL_RESULT_PREVIEW_CHARS] + "..."
+
+
+class ChatStreamRelay:
+    """Turns `(mode, chunk)` pairs from the chat graph into SSE-formatted strings."""
+
+    def __init__(self):
+        self.final_state: Optional[Dict[str, Any]] = None
+        self._tasks: Dict[str, _TaskStream] = {}
+
+    def relay(self, mode: str, chunk: Any) -> List[str]:
+        if mode == "values":
+            self.final_state = chunk
+            return []
+        if mode == "messages":
+            return self._token_events(*chunk)
+        if mode == "debug":
+            return self._task_events(chunk)
+        return []
+
+    def _token_events(self, message: Any, metadata: Dict[str, Any]) -> List[str]:
+        node = metadata.get("langgraph_node")
+        if node not in RESPONSE_NODES or not isinstance(message.content, str) or not message.content:
+            return []
+        # A node that runs again is a new task; its LLM runs are told apart by message id
+        task = self._tasks.setdefault(f"{node}:{metadata.get('langgraph_checkpoint_ns', '')}", _TaskStream())
+        run_id = message.id or ""
+        run = task.runs.get(run_id)
+        if run is None:
+            run = task.runs[run_id] = _RunText(
+                task.relayed is not None and task.runs[task.relayed].extractor.done
+            )
+        text = run.extractor.feed(message.content)
+        if not text:
+            return []
+        run.text += text
+        if task.relayed is None:
+            task.relayed = run_id
+        elif run_id != task.relayed:
+            relayed = task.runs[task.relayed]
+            # Another run takes over when it finishes its response first (a hedge winner),
+            # or when it started after the relayed one finished (an escalation retry)
+            hedge_winner = run.extractor.done and not relayed.extractor.done
+            if not (hedge_winner or run.follows_finished):
+                return []
+            task.relayed = run_id
+            return [format_sse_event({"node": node, "text": run.text}, event="reset")]
+        return [format_sse_event({"node": node, "text": text}, event="delta")]
+
+    def _task_events(self, chunk: Dict[str, Any]) -> List[str]:
+        payload = chunk.get("payload") or {}
+        node = payload.get("name")
+        if chunk.get("type") == "task":
+            return [format_sse_event({"node": node, "step": chunk.get("step")}, event="node_start")]
+        if chunk.get("type") != "task_result":
+            return []
+
+        events = []
+        for channel, value in payload.get("result") or []:
+            if channel != "messages":
+                continue
+            for message in value if isinstance(value, list) else [value]:
+                if isinstance(message, AIMessage) and message.tool_calls:
+                    events.extend(
+                        format_sse_event({"node": node, "id": tc.get("id"), "name": tc.get("name"),
+                                          "args": tc.get("args")}, event="tool_call")
+                        for tc in message.tool_calls
+                    )
+                elif isinstance(message, ToolMessage):
+                    events.append(format_sse_event({"node": node, "id": message.tool_call_id,
+                                                    "content": _preview(message.content)}, event="tool_result"))
+        error = payload.get("error")
+        events.append(format_sse_event({"node": node, "step": chunk.get("step"),
+                                        "error": str(error) if error else None}, event="node_end"))
+        return events
@@ -5,7 +5,8 @@ from pydantic import BaseModel, Field
 
 from langchain_core.messages import AIMessage, SystemMessage, HumanMessage
 from ..agent_state import AgentState
-from ..llm_config import llm
+from ..llm_config import tier_structured_llm
+from ..model_tiers import ainvoke_tiered
 from ...templates.graph_instructions import CONFIRMATION_INTERPRETATION_PROMPT_TEMPLATE
 
 logger = logging.getLogger(__name__)
@@ -16,7 +17,7 @@ class ConfirmationDecision(BaseModel):
     changes: Optional[Dict[str, Any]] = Field(None, description="If decision is 'modify', this contains the parameters to change or their new values.")
     reasoning: Optional[str] = Field(None, description="Brief reasoning for the decision or a message to relay if modification is complex.")
 
-def handle_confirmation(state: AgentState) -> Dict[str, Any]:
+async def handle_confirmation(state: AgentState) -> Dict[str, Any]:
     logger.info(f"--- Entering Confirmation Handler ---")
     pending_operation_details = state['pending_operation_details']
     messages = state['messages']
@@ -30,7 +31,6 @@ def handle_confirmation(state: AgentState) -> Dict[str, Any]:
 
     logger.info(f"Awaiting confirmation for: {pending_operation_details}. User response: '{last_human_message_content}'")
 
-    confirmation_llm = llm.with_structured_output(ConfirmationDecision)
     system_prompt_confirm_interpret = CONFIRMATION_INTERPRETATION_PROMPT_TEMPLATE.format(
         operation=pending_operation_details['operation'],
         params=pending_operation_details['params'],
@@ -38,10 +38,14 @@ def handle_confirmation(state: AgentState) -> Dict[str, Any]:
     )
 
     try:
-        llm_confirm_response = confirmation_llm.invoke([
+        prompt_messages = [
             SystemMessage(content=system_prompt_confirm_interpret),
             HumanMessage(content=last_human_message_content)
-        ])
+        ]
+        llm_confirm_response = await ainvoke_tiered(
+            "confirmation", last_human_message_content,
+            lambda tier: tier_structured_llm(tier, ConfirmationDecision).ainvoke(prompt_messages)
+        )
         decision = llm_confirm_response.decision
         changes = llm_confirm_response.changes
         reasoning = llm_confirm_response.reasoning
@@ -1,21 +1,43 @@
 import logging
-from typing import Dict, Any
+from typing import Dict, Any, Sequence
 
-from langchain_core.messages import HumanMessage, SystemMessage, ToolMessage
+from langchain_core.messages import BaseMessage, HumanMessage, SystemMessage, ToolMessage
 from ..agent_state import AgentState
-from ..llm_config import llm_with_tools
+from ..llm_config import llm, tier_llm_with_tools
+from ..model_tiers import ainvoke_tiered, latest_user_text
 from ...templates.graph_instructions import  GENERAL_LLM_SYSTEM_PROMPT, TOOL_ERROR_RECOVERY_SYSTEM_PROMPT
 
 from ..message_utils import truncate_problematic_history, ensure_tool_call_integrity
+from ..history_compaction import compact_history
 
 
 logger = logging.getLogger(__name__)
 
-def call_general_llm(state: AgentState) -> Dict[str, Any]:
+async def call_general_llm(state: AgentState) -> Dict[str, Any]:
     logger.info("--- Entering General LLM Caller ---")
-    
-    current_messages = ensure_tool_call_integrity(state['messages'])
+
+    response = state.get('speculative_message')
+    if response is not None:
+        # Already generated concurrently with intent detection
+        logger.info("--- Using speculative general LLM response ---")
+    else:
+        response = await generate_general_response(state['messages'])
+
+    logger.info(f"General LLM response/tool call: {response}")
+    return {
+        "messages": [response],
+        "speculative_message": None,
+        "operation_intent": None, "operation_params": {}, "missing_params": [], # Reset intent state
+        "awaiting_confirmation": False, "pending_operation_details": None # Reset confirmation state
+    }
+
+
+async def generate_general_response(messages: Sequence[BaseMessage]) -> BaseMessage:
+    """Tool-enabled LLM call for a general reply, a new tool call, or processing tool results."""
+    current_messages = ensure_tool_call_integrity(messages)
     current_messages = truncate_problematic_history(current_messages)
+    current_messages = await compact_history(current_messages, llm.model_name)
+    user_text = latest_user_text(current_messages)
 
     # This node is called when no specific intent is active,
     # or after a tool call to process results.
@@ -29,7 +51,9 @@ def call_general_llm(state: AgentState) -> Dict[str, Any]:
             # For simplicity, appending here. Better logic might insert it before the tool message.
             current_messages.append(recovery_message)
             
-        response = llm_with_tools.invoke(current_messages)
+        response = await ainvoke_tiered(
+            "general", user_text, lambda tier: tier_llm_with_tools(tier).ainvoke(current_messages)
+        )
     else:
         logger.info("--- Calling LLM for general response or new tool call ---")
         # Add system instruction to detect execution opportunities
@@ -49,11 +73,8 @@ def call_general_llm(state: AgentState) -> Dict[str, Any]:
             if not inserted: # If no human message or empty, just append
                 augmented_messages.append(SystemMessage(content=GENERAL_LLM_SYSTEM_PROMPT))
 
-        response = llm_with_tools.invoke(augmented_messages)
+        response = await ainvoke_tiered(
+            "general", user_text, lambda tier: tier_llm_with_tools(tier).ainvoke(augmented_messages)
+        )
 
-    logger.info(f"General LLM response/tool call: {response}")
-    return {
-        "messages": [response],
-        "operation_intent": None, "operation_params": {}, "missing_params": [], # Reset intent state
-        "awaiting_confirmation": False, "pending_operation_details": None # Reset confirmation state
-    }
\ No newline at end of file
+    return response
\ No newline at end of file
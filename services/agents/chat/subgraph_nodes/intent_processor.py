@@ -4,7 +4,8 @@ from uuid import uuid4
 
 from langchain_core.messages import AIMessage, SystemMessage, HumanMessage
 from ..agent_state import AgentState
-from ..llm_config import llm
+from ..llm_config import tier_llm
+from ..model_tiers import ainvoke_tiered
 from ...templates.graph_instructions import CONFIRMATION_REQUIRED_OPERATIONS
 from services.agents.templates.fn_processor_config import PARAMETER_REFINEMENT_CONFIGS
 from services.agents.executor import EXECUTOR_MAP
@@ -22,7 +23,7 @@ def _trigger_refinement(param_value: Any, user_message: str, conditions: Dict) -
                 return True
     return False
 
-def process_intent(state: AgentState) -> Dict[str, Any]:
+async def process_intent(state: AgentState) -> Dict[str, Any]:
     logger.info(f"--- Entering Intent Processor ---")
     operation_intent = state['operation_intent']
     operation_params = state.get('operation_params', {})
@@ -70,7 +71,10 @@ def process_intent(state: AgentState) -> Dict[str, Any]:
                         HumanMessage(content=f"Refine this: {current_param_value}") # Generic human message part
                     ]
                     
-                    refined_response = llm.invoke(refinement_prompt_messages)
+                    refined_response = await ainvoke_tiered(
+                        "refinement", last_human_message_content,
+                        lambda tier: tier_llm(tier).ainvoke(refinement_prompt_messages)
+                    )
                     if refined_response.content:
                         logger.info(f"LLM refined '{param_name_to_refine}' to: {refined_response.content}")
                         refined_params[param_name_to_refine] = refined_response.content
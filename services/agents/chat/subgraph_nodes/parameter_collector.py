@@ -5,7 +5,7 @@ from ..agent_state import AgentState
 
 logger = logging.getLogger(__name__)
 
-def collect_parameters(state: AgentState) -> Dict[str, Any]:
+async def collect_parameters(state: AgentState) -> Dict[str, Any]:
     logger.info(f"--- Entering Parameter Collector ---")
     operation_intent = state['operation_intent']
     missing_params = state['missing_params']
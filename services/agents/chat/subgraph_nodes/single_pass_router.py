@@ -0,0 +1,145 @@
+import logging
+import time
+from typing import Any, Dict, List, Optional
+from uuid import uuid4
+
+from langchain_core.messages import AIMessage, SystemMessage
+from prometheus_client import Counter
+from pydantic import BaseModel, Field
+
+from schemas.agent import ChatResponse
+from helpers.provider_router import provider_router
+from services.agents.executor import EXECUTOR_MAP
+from services.agents.executors.suggestion_manager import (
+    expand_suggestion_ids, get_suggestion_prompt, get_suggestions_for_topic
+)
+from ..agent_state import AgentState
+from ..llm_config import llm, tier_llm, tier_structured_llm
+from ..model_tiers import ainvoke_tiered, is_uncertain, latest_user_text
+from ..message_utils import ensure_tool_call_integrity, truncate_problematic_history
+from ..history_compaction import compact_history
+from ...templates.graph_instructions import SINGLE_PASS_SYSTEM_PROMPT_TEMPLATE
+from ...templates.intent_instructions import operations_list_all
+
+logger = logging.getLogger(__name__)
+
+# Same threshold as the multi-call intent detection
+SINGLE_PASS_MIN_CONFIDENCE = 0.7
+LOOKUP_TOOLS = {
+    "CharacterLookupArgs", "StoryLookupArgs", "BeatLookupArgs", "SceneLookupArgs", "ProjectGapAnalysisArgs",
+    "ProjectContextSearchArgs"
+}
+TOPICS = {"character", "story", "faction", "other"}
+
+SINGLE_PASS_OUTCOMES = Counter(
+    "agent_single_pass_outcomes_total", "How single-pass chat turns were completed", ["outcome"]
+)
+
+
+class SinglePassToolCall(BaseModel):
+    """A read-only lookup requested by the single-pass router."""
+    name: str = Field(description="Name of the lookup tool.")
+    args: Dict[str, Any] = Field(default_factory=dict, description="Arguments for the lookup tool.")
+
+
+class SinglePassDecision(BaseModel):
+    """Intent, parameters, lookups and the user-facing reply from one structured call."""
+    operation: Optional[str] = Field(None, description="Operation to execute, or null.")
+    confidence: float = Field(0.0, description="Confidence in the detected operation (0-1).")
+    parameters: Dict[str, Any] = Field(default_factory=dict, description="Extracted operation parameters.")
+    missing_params: List[str] = Field(default_factory=list, description="Required parameters not provided.")
+    tool_calls: List[SinglePassToolCall] = Field(default_factory=list, description="Read-only lookups to run first.")
+    detected_topic: Optional[str] = Field(None, description="'character', 'story', 'faction' or 'other'.")
+    response: str = Field(description="Reply shown to the user.")
+    suggestion_ids: List[str] = Field(default_factory=list, description="IDs of the relevant suggestions.")
+    needs_full_pipeline: bool = Field(False, description="True if the multi-step pipeline is required.")
+
+
+async def _decide(prompt: List[Any], tier: str) -> SinglePassDecision:
+    tier_model = tier_llm(tier)
+    with provider_router.track(tier_model.admission_provider, tier_model.model_name):
+        return await tier_structured_llm(tier, SinglePassDecision).ainvoke(prompt)
+
+
+def _clear_intent() -> Dict[str, Any]:
+    return {"operation_intent": None, "operation_params": {}, "missing_params": [], "single_pass_fallback": False}
+
+
+def _fallback(update: Dict[str, Any]) -> Dict[str, Any]:
+    """Hand the turn to the multi-call path, starting with intent detection."""
+    SINGLE_PASS_OUTCOMES.labels(outcome="fallback").inc()
+    return {**update, "single_pass_fallback": True}
+
+
+async def route_single_pass(state: AgentState) -> Dict[str, Any]:
+    """
+    Handles a chat turn with one structured call. Conversational turns are answered
+    directly; operations and lookups are handed to the existing multi-call nodes without
+    repeating intent detection. Turns the single call can't finish (a router error, the
+    model asking for the full pipeline, an unknown operation) go through intent detection.
+    """
+    logger.info("--- Entering Single-Pass Router ---")
+    messages = truncate_problematic_history(ensure_tool_call_integrity(state['messages']))
+    messages = await compact_history(messages, llm.model_name)
+    request_type = state.get("request_type") or "general"
+
+    prompt = [SystemMessage(content=SINGLE_PASS_SYSTEM_PROMPT_TEMPLATE.format(
+        project_id=state.get("project_id"), operations=operations_list_all
+    ))]
+    prompt.extend(messages)
+    entity_id = state.get("character_id") or state.get("act_id")
+    suggestions = get_suggestions_for_topic(project_id=state.get("project_id"), topic=request_type, entity_id=entity_id)
+    prompt.append(SystemMessage(content=get_suggestion_prompt(
+        topic=request_type, potential_suggestions=suggestions, entity_id=entity_id
+    )))
+
+    start = time.perf_counter()
+    try:
+        decision: SinglePassDecision = await ainvoke_tiered(
+            "single_pass", latest_user_text(messages), lambda tier: _decide(prompt, tier),
+            uncertain=lambda d: is_uncertain(d.operation, d.confidence)
+        )
+    except Exception as e:
+        logger.error(f"Single-pass router failed, falling back to the multi-call path: {e}", exc_info=True)
+        SINGLE_PASS_OUTCOMES.labels(outcome="error").inc()
+        return {**_clear_intent(), "final_response": None, "single_pass_fallback": True}
+    logger.info(f"Single-pass decision in {time.perf_counter() - start:.2f}s: {decision}")
+
+    update: Dict[str, Any] = {**_clear_intent(), "final_response": None}
+    if request_type == "general" and decision.detected_topic in TOPICS:
+        update["request_type"] = decision.detected_topic
+
+    if decision.needs_full_pipeline:
+        return _fallback(update)
+
+    operation = decision.operation if decision.confidence >= SINGLE_PASS_MIN_CONFIDENCE else None
+    if operation:
+        if operation not in EXECUTOR_MAP:
+            logger.warning(f"Single-pass router returned unknown operation '{operation}'")
+            return _fallback(update)
+        SINGLE_PASS_OUTCOMES.labels(outcome="operation").inc()
+        update.update({
+            "operation_intent": operation,
+            "operation_params": decision.parameters,
+            "missing_params": decision.missing_params,
+        })
+        return update
+
+    lookups = [call for call in decision.tool_calls if call.name in LOOKUP_TOOLS]
+    if lookups:
+        SINGLE_PASS_OUTCOMES.labels(outcome="tool").inc()
+        update["messages"] = [AIMessage(
+            content=decision.response,
+            tool_calls=[{"name": call.name, "args": call.args, "id": f"t_{str(uuid4())}"} for call in lookups],
+        )]
+        return update
+
+    SINGLE_PASS_OUTCOMES.labels(outcome="answered").inc()
+    update["messages"] = [AIMessage(content=decision.response)]
+    update["final_response"] = ChatResponse(
+        response=decision.response,
+        suggestions=expand_suggestion_ids(decision.suggestion_ids, suggestions),
+        be_function=state.get("be_function"),
+        db_updated=state.get("db_updated", False),
+    )
+    return update
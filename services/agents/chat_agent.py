@@ -3,7 +3,7 @@ Main chat agent implementation using langgraph
 """
 import logging
 from langgraph.graph import StateGraph, END
-from langgraph.checkpoint.memory import MemorySaver
+from services.agents.chat.checkpointer import create_checkpointer
 
 from services.agents.pre_processors.intent_detection import extract_operation_intent
 from services.agents.chat.agent_state import AgentState
@@ -16,11 +16,12 @@ from services.agents.chat.subgraph_nodes.confirmation_handler import handle_conf
 from services.agents.chat.subgraph_nodes.parameter_collector import collect_parameters
 from services.agents.chat.subgraph_nodes.intent_processor import process_intent
 from services.agents.chat.subgraph_nodes.general_llm_caller import call_general_llm
+from services.agents.chat.subgraph_nodes.single_pass_router import route_single_pass
 from langchain_core.messages import AIMessage
 
 logger = logging.getLogger(__name__)
 
-memory = MemorySaver()
+memory = create_checkpointer()
 workflow = StateGraph(AgentState)
 
 # --- Add Nodes ---
@@ -31,12 +32,18 @@ workflow.add_node("process_intent_node", process_intent)
 workflow.add_node("call_general_llm_node", call_general_llm)
 workflow.add_node("call_tool_node", tool_node_executor) # Renamed for clarity if needed, but "call_tool" is fine
 workflow.add_node("final_responder_node", generate_final_response)
-
-# --- Define Entry Point ---
-workflow.set_entry_point("extract_operations")
+workflow.add_node("single_pass_node", route_single_pass)
 
 # --- Define Routing Logic ---
 
+def route_entry(state: AgentState):
+    """'single' graph mode answers with one structured call; 'multi' detects intent first."""
+    if state.get('graph_mode') == "single":
+        if state.get('awaiting_confirmation') and state.get('pending_operation_details'):
+            return "handle_confirmation_node"
+        return "single_pass_node"
+    return "extract_operations"
+
 def route_initial_request(state: AgentState):
     logger.debug(f"Routing initial request. Awaiting_confirmation: {state.get('awaiting_confirmation')}, Intent: {state.get('operation_intent')}, Missing_params: {state.get('missing_params')}")
     if state.get('awaiting_confirmation') and state.get('pending_operation_details'):
@@ -68,7 +75,40 @@ def route_after_subgraph_processing(state: AgentState):
         logger.debug("Routing to final_responder_node.")
         return "final_responder_node"
 
+def route_after_single_pass(state: AgentState):
+    """Finish when the single pass produced the response, otherwise continue on the multi-call path."""
+    if state.get('final_response'):
+        return END
+    if state.get('single_pass_fallback'):
+        return "extract_operations"
+    messages = state['messages']
+    if messages and isinstance(messages[-1], AIMessage) and messages[-1].tool_calls:
+        return "call_tool_node"
+    return route_initial_request(state)
+
 # --- Add Edges ---
+workflow.set_conditional_entry_point(
+    route_entry,
+    {
+        "extract_operations": "extract_operations",
+        "single_pass_node": "single_pass_node",
+        "handle_confirmation_node": "handle_confirmation_node"
+    }
+)
+
+workflow.add_conditional_edges(
+    "single_pass_node",
+    route_after_single_pass,
+    {
+        END: END,
+        "extract_operations": "extract_operations",
+        "call_tool_node": "call_tool_node",
+        "collect_parameters_node": "collect_parameters_node",
+        "process_intent_node": "process_intent_node",
+        "call_general_llm_node": "call_general_llm_node"
+    }
+)
+
 workflow.add_conditional_edges(
     "extract_operations",
     route_initial_request,
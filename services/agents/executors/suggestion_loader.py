@@ -1,81 +1,180 @@
+"""
+Suggestion catalog, loaded once into an index by topic, `be_function` and `fe_function`.
+
+Topics come from `suggestions_{topic}.json` (or `.ts` with `//` comment lines) files in
+SUGGESTIONS_DIR, with the in-code `suggestion_data` for topics that have no file. Entries
+are validated against `schemas.agent.Suggestion` when the catalog is built; invalid ones
+are logged and skipped. The directory's file mtimes are checked at most every
+SUGGESTIONS_RELOAD_INTERVAL seconds and the index is rebuilt when they change.
+"""
 import json
 import os
-from typing import List, Dict, Any
+import threading
+import time
+from dataclasses import dataclass, field
+from typing import List, Dict, Any, Optional, Tuple
 import logging
+
+from prometheus_client import Counter, Gauge
+from pydantic import ValidationError
+
+from schemas.agent import Suggestion
 from services.agents.executors.suggestions import suggestion_data
 logger = logging.getLogger(__name__)
 
 # Define the base path relative to this file or use absolute paths
 # Adjust this path as necessary
 SUGGESTIONS_DIR = os.path.join(os.path.dirname(__file__), '..', 'data')
+SUGGESTIONS_RELOAD_INTERVAL = float(os.getenv("SUGGESTIONS_RELOAD_INTERVAL", "5"))
+
+# Older catalog entries name the frontend location `fe_location`
+_FIELD_ALIASES = {"fe_location": "fe_navigation"}
+
+SUGGESTION_CATALOG_RELOADS = Counter("agent_suggestion_catalog_reloads_total", "Suggestion catalog index rebuilds")
+SUGGESTION_CATALOG_ENTRIES = Gauge("agent_suggestion_catalog_entries", "Valid entries in the suggestion catalog index")
+SUGGESTION_CATALOG_INVALID = Gauge("agent_suggestion_catalog_invalid_entries", "Catalog entries rejected by validation")
+
+
+def _normalize(raw: Any, source: str) -> Optional[Dict[str, Any]]:
+    """The entry as a validated Suggestion dict (None values dropped), or None if it is invalid."""
+    if not isinstance(raw, dict):
+        logger.error(f"Invalid suggestion in {source}: expected an object, got {type(raw).__name__}")
+        return None
+    entry = {}
+    for key, value in raw.items():
+        alias = _FIELD_ALIASES.get(key)
+        if alias and alias not in raw:
+            key = alias
+        if key in Suggestion.model_fields:
+            entry[key] = value
+    try:
+        return Suggestion.model_validate(entry).model_dump(exclude_none=True)
+    except ValidationError as e:
+        logger.error(f"Invalid suggestion '{raw.get('feature')}' in {source}: {e.errors()}")
+        return None
+
+
+def _read_file(file_path: str) -> List[Any]:
+    with open(file_path, 'r', encoding='utf-8') as f:
+        # .ts files hold a JSON array; drop `//` comment lines before parsing
+        content = "".join(line for line in f if not line.strip().startswith('//'))
+    suggestions = json.loads(content)
+    if not isinstance(suggestions, list):
+        raise ValueError("expected a JSON list")
+    return suggestions
+
+
+@dataclass
+class SuggestionIndex:
+    by_topic: Dict[str, Tuple[Dict[str, Any], ...]] = field(default_factory=dict)
+    by_be_function: Dict[str, Dict[str, Any]] = field(default_factory=dict)
+    by_fe_function: Dict[str, Dict[str, Any]] = field(default_factory=dict)
+    builtin: Tuple[Dict[str, Any], ...] = ()  # In-code entries, for topics without a file or matches
+
+
+class SuggestionCatalog:
+    """Hot-reloaded suggestion index; lookups never touch the filesystem between checks."""
+
+    def __init__(self, directory: str = SUGGESTIONS_DIR, reload_interval: float = SUGGESTIONS_RELOAD_INTERVAL):
+        self.directory = directory
+        self.reload_interval = reload_interval
+        self._lock = threading.Lock()
+        self._index: Optional[SuggestionIndex] = None
+        self._signature: Optional[Tuple] = None
+        self._checked_at = 0.0
+
+    def _file_signature(self) -> Tuple:
+        """(file name, mtime, size) of every suggestion file in the directory."""
+        try:
+            entries = [e for e in os.scandir(self.directory)
+                       if e.name.startswith("suggestions_") and e.name.endswith((".json", ".ts"))]
+        except FileNotFoundError:
+            return ()
+        return tuple(sorted((e.name, e.stat().st_mtime_ns, e.stat().st_size) for e in entries))
+
+    def _build(self, signature: Tuple) -> SuggestionIndex:
+        index = SuggestionIndex()
+        invalid = 0
+
+        builtin = []
+        for raw in suggestion_data:
+            entry = _normalize(raw, "suggestion_data")
+            if entry is None:
+                invalid += 1
+            else:
+                builtin.append(entry)
+        index.builtin = tuple(builtin)
+        by_topic: Dict[str, List[Dict[str, Any]]] = {}
+        for entry in builtin:
+            by_topic.setdefault(entry["topic"].lower(), []).append(entry)
+
+        # A topic file replaces the in-code entries of that topic; .json wins over .ts
+        file_names = {name for name, _, _ in signature}
+        for name in sorted(file_names, key=lambda n: n.endswith(".json")):
+            topic = name[len("suggestions_"):].rsplit(".", 1)[0].lower()
+            file_path = os.path.join(self.directory, name)
+            try:
+                raw_entries = _read_file(file_path)
+            except Exception as e:
+                logger.error(f"Error loading suggestions from {file_path}: {e}")
+                continue
+            entries = [entry for entry in (_normalize(raw, file_path) for raw in raw_entries) if entry is not None]
+            invalid += len(raw_entries) - len(entries)
+            by_topic[topic] = entries
+            logger.info(f"Loaded {len(entries)} suggestions for topic '{topic}' from {file_path}")
+
+        index.by_topic = {topic: tuple(entries) for topic, entries in by_topic.items()}
+        for entries in index.by_topic.values():
+            for entry in entries:
+                if entry.get("be_function"):
+                    index.by_be_function.setdefault(entry["be_function"], entry)
+                if entry.get("fe_function"):
+                    index.by_fe_function.setdefault(entry["fe_function"], entry)
+
+        SUGGESTION_CATALOG_RELOADS.inc()
+        SUGGESTION_CATALOG_ENTRIES.set(sum(len(entries) for entries in index.by_topic.values()))
+        SUGGESTION_CATALOG_INVALID.set(invalid)
+        return index
+
+    def index(self) -> SuggestionIndex:
+        now = time.monotonic()
+        if self._index is not None and now - self._checked_at < self.reload_interval:
+            return self._index
+        with self._lock:
+            if self._index is None or now - self._checked_at >= self.reload_interval:
+                signature = self._file_signature()
+                if self._index is None or signature != self._signature:
+                    if self._index is not None:
+                        logger.info(f"Suggestion files changed in {self.directory}, rebuilding the catalog")
+                    self._index = self._build(signature)
+                    self._signature = signature
+                self._checked_at = now
+            return self._index
+
+    def for_topic(self, topic: str) -> List[Dict[str, Any]]:
+        index = self.index()
+        entries = index.by_topic.get(topic.lower())
+        if entries is None:
+            # Unknown topics (e.g. 'general') get the whole in-code catalog
+            logger.debug(f"No suggestions indexed for topic '{topic}', using all {len(index.builtin)} in-code suggestions")
+            entries = index.builtin
+        return list(entries)
+
+
+catalog = SuggestionCatalog()
+
 
 def load_suggestions_by_topic(topic: str) -> List[Dict[str, Any]]:
     """
-    Loads suggestion definitions from a JSON/TS file based on topic.
-    Falls back to in-code suggestion_data if file not found.
+    Suggestion definitions for a topic from the catalog index. The list is a fresh copy;
+    the entries are shared and must not be modified.
     """
-    # Assuming files are named like 'suggestions_{topic}.json'
-    # Handle potential .ts extension if needed (might require a TS parser or saving as JSON)
-    file_path_json = os.path.join(SUGGESTIONS_DIR, f"suggestions_{topic}.json")
-    file_path_ts = os.path.join(SUGGESTIONS_DIR, f"suggestions_{topic}.ts") # Check for .ts too
-
-    file_path = None
-    if os.path.exists(file_path_json):
-        file_path = file_path_json
-    elif os.path.exists(file_path_ts):
-        # Basic handling for TS-like JSON array structure
-        file_path = file_path_ts
-    else:
-        logger.warning(f"Suggestion file not found for topic '{topic}' in {SUGGESTIONS_DIR}")
-        # Fall back to in-code suggestion_data filtered by topic
-        if suggestion_data:
-            filtered_suggestions = [s for s in suggestion_data if s.get("topic", "").lower() == topic.lower()]
-            if filtered_suggestions:
-                logger.info(f"Using {len(filtered_suggestions)} hardcoded suggestions for topic '{topic}'")
-                return filtered_suggestions
-            else:
-                logger.info(f"No matching hardcoded suggestions for topic '{topic}'. Using all {len(suggestion_data)} suggestions.")
-                return suggestion_data
-        return []
+    return catalog.for_topic(topic)
 
-    try:
-        with open(file_path, 'r', encoding='utf-8') as f:
-            # Handle potential comments if reading .ts file directly
-            # A simple approach: read lines, filter comments, join, parse
-            content = "".join(line for line in f if not line.strip().startswith('//'))
-            suggestions = json.loads(content)
-            if isinstance(suggestions, list):
-                # Basic validation: check if items are dicts
-                if all(isinstance(item, dict) for item in suggestions):
-                    logger.info(f"Loaded {len(suggestions)} suggestions for topic '{topic}' from {file_path}")
-                    return suggestions
-                else:
-                    logger.error(f"Invalid format in suggestion file {file_path}: expected list of objects.")
-                    return []
-            else:
-                 logger.error(f"Invalid format in suggestion file {file_path}: expected a JSON list.")
-                 return []
-    except json.JSONDecodeError as e:
-        logger.error(f"Error decoding JSON from {file_path}: {e}")
-        return []
-    except Exception as e:
-        logger.error(f"Error loading suggestions from {file_path}: {e}")
-        return []
-
-# Example usage (optional, for testing)
-if __name__ == '__main__':
-    # Create dummy data file if it doesn't exist
-    dummy_topic = "character"
-    dummy_file_path = os.path.join(SUGGESTIONS_DIR, f"suggestions_{dummy_topic}.json")
-    if not os.path.exists(dummy_file_path):
-         os.makedirs(SUGGESTIONS_DIR, exist_ok=True)
-         try:
-             with open(dummy_file_path, 'w', encoding='utf-8') as f:
-                 json.dump(suggestion_data, f, indent=2)
-             print(f"Created dummy suggestion file: {dummy_file_path}")
-         except Exception as e:
-             print(f"Error creating dummy file: {e}")
-
-
-    loaded = load_suggestions_by_topic(dummy_topic)
-    print(f"Loaded suggestions for '{dummy_topic}': {loaded}")
\ No newline at end of file
+
+def find_suggestion_by_be_function(be_function: str) -> Optional[Dict[str, Any]]:
+    return catalog.index().by_be_function.get(be_function)
+
+
+def find_suggestion_by_fe_function(fe_function: str) -> Optional[Dict[str, Any]]:
+    return catalog.index().by_fe_function.get(fe_function)
@@ -1,13 +1,21 @@
 import logging
-import json
 from typing import List, Dict, Any, Optional
 from uuid import UUID
+from prometheus_client import Counter, Histogram
 from schemas.agent import Suggestion
+from services.llm.admission import estimate_tokens
 
 logger = logging.getLogger(__name__)
 
-# Import the suggestion data - adjust path if needed
-from services.agents.executors.suggestions import suggestion_data
+SUGGESTION_PROMPT_TOKENS = Histogram(
+    "agent_suggestion_prompt_tokens", "Estimated tokens of the suggestion section of agent prompts",
+    buckets=(25, 50, 100, 200, 400, 800, 1600, 3200)
+)
+SUGGESTION_IDS = Counter(
+    "agent_suggestion_ids_total", "Suggestion IDs returned by the model, by outcome", ["outcome"]
+)
+
+from services.agents.executors.suggestion_loader import load_suggestions_by_topic
 
 def get_suggestions_for_topic(topic: str, entity_id: Optional[UUID] = None, **context) -> List[Dict[str, Any]]:
     """
@@ -23,15 +31,9 @@ def get_suggestions_for_topic(topic: str, entity_id: Optional[UUID] = None, **co
     """
     logger.info(f"Getting suggestions for topic '{topic}', entity_id={entity_id}")
     
-    # Get all suggestions for the topic
-    from services.agents.executors.suggestion_loader import load_suggestions_by_topic
+    # Get all suggestions for the topic (a fresh list from the precompiled catalog index)
     potential_suggestions = load_suggestions_by_topic(topic)
     
-    # If no suggestions were loaded, fall back to hardcoded suggestions
-    if not potential_suggestions:
-        logger.warning(f"No suggestions loaded for topic '{topic}'. Falling back to hardcoded suggestions.")
-        potential_suggestions = [s for s in suggestion_data if s.get("topic", "").lower() == topic.lower()]
-    
     # Handle entity ID requirements based on topic
     if topic.lower() == "character" and entity_id is None:
         select_character_exists = any(
@@ -70,9 +72,18 @@ def get_suggestions_for_topic(topic: str, entity_id: Optional[UUID] = None, **co
     logger.info(f"Returning {len(potential_suggestions)} potential suggestions")
     return potential_suggestions
 
+def suggestion_id(position: int) -> str:
+    """Short ID of the candidate at `position` in a turn's potential suggestions list."""
+    return f"s{position + 1}"
+
+
 def get_suggestion_prompt(topic: str, potential_suggestions: List[Dict[str, Any]], entity_id: Optional[UUID] = None) -> str:
     """
     Generates the LLM prompt part for suggestions.
+
+    Candidates are listed as short IDs with their feature and one-line initiator
+    condition; the model returns the IDs of relevant ones in 'suggestion_ids' and
+    `expand_suggestion_ids` turns them back into Suggestion objects.
     
     Args:
         topic: The topic/request_type for suggestions
@@ -82,36 +93,49 @@ def get_suggestion_prompt(topic: str, potential_suggestions: List[Dict[str, Any]
     Returns:
         Formatted prompt string about suggestions
     """
-    if potential_suggestions:
-        suggestions_list_str = json.dumps(potential_suggestions, indent=2)
-        return (
-            f"\n\nConsider the following potential suggestions for the user (topic: {topic}). "
-            f"Evaluate if any are relevant based on their 'initiator' condition and the current conversation context. "
-            f"Include relevant ones in the 'suggestions' list in your JSON output. Only include suggestions if their initiator condition is met by the current context.\n"
-            f"You MUST include multiple suggestions in the list if they are all relevant to the conversation.\n"
-            f"If the conversation is about {topic} but no specific {topic} ID is set, ALWAYS include the 'select_{topic}' suggestion.\n\n"
-            f"Potential Suggestions:\n{suggestions_list_str}"
-        )
-    else:
-        # Create a minimal prompt with just the required selection suggestion if applicable
-        entity_missing = (
-            (topic.lower() == "character" and entity_id is None) or
-            (topic.lower() == "faction" and entity_id is None) or
-            (topic.lower() == "story" and entity_id is None) or 
-            (topic.lower() == "scene" and entity_id is None)
-            
-            # Add more entity types as needed
-        )
-        
-        if entity_missing:
-            select_suggestion = get_default_select_suggestion(topic)
-            suggestions_list_str = json.dumps([select_suggestion], indent=2)
-            return (
-                f"\n\nYou MUST include the following suggestion in your response:\n"
-                f"{suggestions_list_str}"
-            )
-        else:
-            return "\n\nNo specific suggestions available for this topic."
+    if not potential_suggestions:
+        return "\n\nNo specific suggestions available for this topic. Return an empty 'suggestion_ids' list."
+
+    lines = []
+    select_ids = []
+    for position, suggestion in enumerate(potential_suggestions):
+        sid = suggestion_id(position)
+        initiator = " ".join(str(suggestion.get("initiator", "")).split())
+        lines.append(f"{sid}: {suggestion.get('feature')} - when: {initiator}")
+        if suggestion.get("be_function") == f"select_{topic}" or suggestion.get("fe_function") == f"{topic}_select":
+            select_ids.append(sid)
+
+    prompt = (
+        f"\n\nPotential suggestions for the user (topic: {topic}), as 'ID: feature - when: condition'. "
+        f"Put the IDs of every suggestion whose condition is met by the current conversation in 'suggestion_ids' "
+        f"(several if several apply, none if none do). Use only IDs from this list.\n"
+    )
+    if select_ids and entity_id is None:
+        prompt += f"If the conversation is about {topic} but no specific {topic} is selected, ALWAYS include {select_ids[0]}.\n"
+    SUGGESTION_PROMPT_TOKENS.observe(estimate_tokens(prompt, *lines))
+    return prompt + "\n".join(lines)
+
+
+def expand_suggestion_ids(suggestion_ids: List[str], potential_suggestions: List[Dict[str, Any]]) -> List[Suggestion]:
+    """Suggestion objects for the IDs the model returned; unknown IDs and duplicates are skipped."""
+    by_id = {suggestion_id(position): s for position, s in enumerate(potential_suggestions)}
+    expanded = []
+    seen = set()
+    for sid in suggestion_ids:
+        sid = sid.strip().lower()
+        candidate = by_id.get(sid)
+        if candidate is None or sid in seen:
+            SUGGESTION_IDS.labels(outcome="unknown" if candidate is None else "duplicate").inc()
+            logger.warning(f"Ignoring suggestion ID '{sid}' returned by the model")
+            continue
+        seen.add(sid)
+        try:
+            expanded.append(Suggestion(**candidate))
+            SUGGESTION_IDS.labels(outcome="expanded").inc()
+        except Exception as e:
+            SUGGESTION_IDS.labels(outcome="invalid").inc()
+            logger.error(f"Suggestion '{sid}' could not be expanded: {e}")
+    return expanded
 
 def get_default_select_suggestion(entity_type: str) -> Dict[str, Any]:
     """
@@ -0,0 +1,161 @@
+"""
+Declarative rules that evaluate suggestion initiators against the agent state.
+
+Each rule is keyed by a suggestion's `fe_function` (or `be_function`) and combines small
+predicates over a `RuleContext`: the topic, which entities are selected, the operation
+being collected/confirmed, operations executed this turn, and keywords of the user's
+message. Suggestions without a rule are never selected locally; they are left to the LLM.
+"""
+import logging
+import re
+from dataclasses import dataclass, field
+from typing import Any, Callable, Dict, List, Optional, Set
+
+from langchain_core.messages import AIMessage, HumanMessage, ToolMessage
+
+from schemas.agent import Suggestion
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass
+class RuleContext:
+    topic: str
+    selected: Set[str]  # State keys of the selected entities, e.g. {'character_id'}
+    operation: Optional[str]  # Operation being collected or confirmed
+    executed: Set[str] = field(default_factory=set)  # Operations executed during this turn
+    message: str = ""  # The user's latest message
+
+
+Condition = Callable[[RuleContext], bool]
+
+# Tool node output of a failed executor call: "Error: ...", "Error executing tool ..." or
+# "Executed function 'x': Error: ..." when the executor itself reports the failure
+_ERROR_RESULT = re.compile(r"^(?:Executed function '[^']*': )?Error\b")
+
+
+def context_from_state(state: Dict[str, Any]) -> RuleContext:
+    messages = list(state.get("messages") or [])
+    turn_start = max((i for i, m in enumerate(messages) if isinstance(m, HumanMessage)), default=0)
+    turn = messages[turn_start:]
+    # Only executor calls that got a non-error result count as executed
+    succeeded = {
+        m.tool_call_id for m in turn
+        if isinstance(m, ToolMessage) and not _ERROR_RESULT.match(str(m.content))
+    }
+    executed = set()
+    for message in turn:
+        if isinstance(message, AIMessage):
+            executed.update(
+                tc.get("args", {}).get("function_name") for tc in message.tool_calls or []
+                if tc.get("name") == "ExecutorFunctionArgs" and tc.get("id") in succeeded
+            )
+    pending = state.get("pending_operation_details") or {}
+    return RuleContext(
+        topic=(state.get("request_type") or "general").lower(),
+        selected={key for key in ("character_id", "act_id") if state.get(key)},
+        operation=state.get("operation_intent") or pending.get("operation"),
+        executed={op for op in executed if op},
+        message=messages[turn_start].content.lower() if messages and isinstance(messages[turn_start], HumanMessage) else "",
+    )
+
+
+# --- Predicates ---
+
+def topic_is(*topics: str) -> Condition:
+    return lambda ctx: ctx.topic in topics
+
+
+def not_selected(state_key: str) -> Condition:
+    return lambda ctx: state_key not in ctx.selected
+
+
+def operation_is(*operations: str) -> Condition:
+    return lambda ctx: ctx.operation in operations and ctx.operation not in ctx.executed
+
+
+def executed(*operations: str) -> Condition:
+    return lambda ctx: bool(ctx.executed.intersection(operations))
+
+
+def not_executed(operation: str) -> Condition:
+    return lambda ctx: operation not in ctx.executed
+
+
+def mentions(verbs: str, nouns: str) -> Condition:
+    """The user's message contains one of `verbs` and one of `nouns` (whole-word regex alternations)."""
+    verb_pattern, noun_pattern = re.compile(rf"\b(?:{verbs})\b"), re.compile(rf"\b(?:{nouns})\b")
+    return lambda ctx: bool(verb_pattern.search(ctx.message) and noun_pattern.search(ctx.message))
+
+
+def all_of(*conditions: Condition) -> Condition:
+    return lambda ctx: all(condition(ctx) for condition in conditions)
+
+
+def any_of(*conditions: Condition) -> Condition:
+    return lambda ctx: any(condition(ctx) for condition in conditions)
+
+
+# Whole words, with their inflections spelled out
+_CREATE = r"creat(?:e|es|ed|ing)|add(?:s|ed|ing)?|mak(?:e|es|ing)|new|introduc(?:e|es|ed|ing)|writ(?:e|es|ing)"
+_RENAME = r"renam(?:e|es|ed|ing)|call(?:s|ed|ing)? it"
+_EDIT = r"edit(?:s|ed|ing)?|chang(?:e|es|ed|ing)|updat(?:e|es|ed|ing)|rewrit(?:e|es|ing)|redesign(?:s|ed|ing)?|improv(?:e|es|ed|ing)"
+_CONCEPT = r"concepts?|designs?|ideas?|brainstorm(?:s|ing)?|outlines?"
+
+
+def _operation_rule(operation: str, verbs: str, nouns: str, *after: str) -> Condition:
+    """
+    Suggest an operation while it is being collected/confirmed, when asked for (unless it
+    already ran this turn), or after `after` ran.
+    """
+    return any_of(operation_is(operation), all_of(mentions(verbs, nouns), not_executed(operation)), executed(*after))
+
+
+SUGGESTION_RULES: Dict[str, Condition] = {
+    # Entity selection
+    "character_select": all_of(topic_is("character"), not_selected("character_id")),
+    "faction_select": topic_is("faction"),
+    "scene_select": topic_is("scene"),
+    # Character
+    "character_create": _operation_rule("character_create", _CREATE, r"characters?|npcs?"),
+    "character_rename": _operation_rule("character_rename", _RENAME, r"characters?|names?"),
+    "trait_add": _operation_rule("trait_add", _CREATE + "|" + _EDIT,
+                                 r"traits?|behaviou?rs?|humou?rs?|speech|knowledge", "character_create"),
+    "relationship_add": _operation_rule("relationship_add", _CREATE,
+                                        r"relationships?|friends?|rivals?|enem(?:y|ies)|all(?:y|ies)",
+                                        "character_create"),
+    # Faction
+    "faction_create": _operation_rule("faction_create", _CREATE, r"factions?"),
+    "faction_rename": _operation_rule("faction_rename", _RENAME, r"factions?"),
+    # Story
+    "act_concept": mentions(_CONCEPT, r"acts?"),
+    "act_create": _operation_rule("act_create", _CREATE, r"acts?"),
+    "act_edit": _operation_rule("act_edit", _EDIT, r"acts?", "act_create"),
+    "beat_concept": mentions(_CONCEPT, r"beats?"),
+    "beat_create": _operation_rule("beat_create", _CREATE, r"beats?", "act_create"),
+    "beat_edit": _operation_rule("beat_edit", _EDIT, r"beats?", "beat_create"),
+    "scene_concept": mentions(_CONCEPT, r"scenes?"),
+    "scene_create": _operation_rule("scene_create", _CREATE, r"scenes?", "beat_create"),
+}
+
+
+def _rule_for(suggestion: Dict[str, Any]) -> Optional[Condition]:
+    return SUGGESTION_RULES.get(suggestion.get("fe_function")) or SUGGESTION_RULES.get(suggestion.get("be_function"))
+
+
+def select_suggestions(state: Dict[str, Any], candidates: List[Dict[str, Any]]) -> List[Suggestion]:
+    """The candidates whose initiator rule holds for `state`, in catalog order."""
+    context = context_from_state(state)
+    selected, seen = [], set()
+    for candidate in candidates:
+        rule = _rule_for(candidate)
+        key = candidate.get("fe_function") or candidate.get("be_function")
+        if rule is None or key in seen or not rule(context):
+            continue
+        seen.add(key)
+        try:
+            selected.append(Suggestion(**candidate))
+        except Exception as e:
+            logger.error(f"Suggestion '{key}' selected by rule could not be built: {e}")
+    logger.info(f"Rule-selected suggestions for topic '{context.topic}': {[s.feature for s in selected]}")
+    return selected
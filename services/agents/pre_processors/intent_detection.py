@@ -1,15 +1,30 @@
 """
 Intent detection system for parsing user messages into structured operations
 """
+import asyncio
 import logging
+import os
 from typing import Dict, Any, Optional, Tuple, List
+from prometheus_client import Counter
 from services.agents.chat.agent_state import AgentState
 from services.agents.pre_processors.name_extraction import extract_character_name
+from services.agents.pre_processors.local_intent import classify_intent
+from services.agents.chat.model_tiers import ainvoke_tiered, is_uncertain
 from ..templates.intent_instructions import operations_list_all, operations_list_char, operations_list_story
 
 logger = logging.getLogger(__name__)
 
-def detect_operation_intent(
+# Intent chains are built once per request type and model tier instead of on every message
+_intent_chains: Dict[Tuple[str, str], Any] = {}
+
+# Start the general LLM call together with intent detection and drop it if an operation is found
+AGENT_SPECULATIVE_GENERAL_LLM = os.getenv("AGENT_SPECULATIVE_GENERAL_LLM", "false").lower() == "true"
+
+SPECULATIVE_GENERAL_RESULTS = Counter(
+    "agent_speculative_general_total", "Speculative general LLM calls by outcome (used, cancelled, failed)", ["outcome"]
+)
+
+async def detect_operation_intent(
     message: str, 
     request_type: str = "general"
 ) -> Tuple[Optional[str], Dict[str, Any], List[str], Optional[str]]: # Added Optional[str] for detected_topic
@@ -17,7 +32,48 @@ def detect_operation_intent(
     Analyzes the user message to detect operation intent and extract parameters.
     Returns tuple of (detected_function, extracted_params, missing_info, detected_topic)
     """
-    from langchain_openai import ChatOpenAI
+    # Formulaic requests are answered by the local classifier without an LLM call
+    local_intent = classify_intent(message, request_type)
+    if local_intent is not None:
+        detected_topic = local_intent.topic if request_type == "general" else None
+        return local_intent.operation, local_intent.params, [], detected_topic
+
+    try:
+        result = await ainvoke_tiered(
+            "intent", message, lambda tier: _invoke_intent_chain(request_type, tier, message),
+            uncertain=lambda r: is_uncertain(r.get("operation"), r.get("confidence"))
+        )
+        logger.info(f"Intent detection result: {result}")
+        
+        operation = result.get("operation")
+        confidence = result.get("confidence") or 0
+        parameters = result.get("parameters", {})
+        missing_info = result.get("missing_info", []) 
+        detected_topic = result.get("detected_topic") if request_type == "general" else None
+
+        if operation is None or confidence < 0.7: # Adjust confidence as needed
+            return None, {}, [], detected_topic # Return detected_topic even if no op
+        
+        return operation, parameters, missing_info, detected_topic
+    except Exception as e:
+        logger.error(f"Error in intent detection: {e}")
+        return None, {}, [], None
+
+
+async def _invoke_intent_chain(request_type: str, tier: str, message: str) -> Dict[str, Any]:
+    chain = _intent_chains.get((request_type, tier))
+    if chain is None:
+        chain = _build_intent_chain(request_type, tier)
+        _intent_chains[(request_type, tier)] = chain
+    result = await chain.ainvoke({"input": message})
+    if not isinstance(result, dict):
+        raise ValueError(f"expected a JSON object, got {type(result).__name__}")
+    return result
+
+
+def _build_intent_chain(request_type: str, tier: str):
+    """Prompt | model | JSON parser chain for LLM intent detection on a model tier."""
+    from services.agents.chat.llm_config import tier_llm
     from langchain_core.output_parsers import JsonOutputParser
     from langchain_core.prompts import ChatPromptTemplate
 
@@ -67,30 +123,12 @@ Supported operations for {request_type} context:
         ("human", human_template),
     ])
     
-    model = ChatOpenAI(model="gpt-4o") 
+    model = tier_llm(tier)
     parser = JsonOutputParser()
     
-    chain = chat_prompt | model | parser
+    return chat_prompt | model | parser
     
-    try:
-        result = chain.invoke({"input": message})
-        logger.info(f"Intent detection result: {result}")
-        
-        operation = result.get("operation")
-        confidence = result.get("confidence", 0)
-        parameters = result.get("parameters", {})
-        missing_info = result.get("missing_info", []) 
-        detected_topic = result.get("detected_topic") if request_type == "general" else None
-
-        if operation is None or confidence < 0.7: # Adjust confidence as needed
-            return None, {}, [], detected_topic # Return detected_topic even if no op
-        
-        return operation, parameters, missing_info, detected_topic
-    except Exception as e:
-        logger.error(f"Error in intent detection: {e}")
-        return None, {}, [], None
-    
-def extract_operation_intent(state: AgentState) -> Dict[str, Any]:
+async def extract_operation_intent(state: AgentState) -> Dict[str, Any]:
     """
     Analyzes the user's message to detect operation intent and parameters.
     Updates state with operation_intent, operation_params, and potentially request_type.
@@ -115,11 +153,35 @@ def extract_operation_intent(state: AgentState) -> Dict[str, Any]:
     last_human_msg = human_messages[-1].content
     current_request_type = updated_state.get('request_type', 'general')
 
-    # 1. Detect operation and topic first
-    operation, params, missing, detected_topic = detect_operation_intent(
-        last_human_msg,
-        request_type=current_request_type
-    )
+    # 1. Detect operation and topic first, optionally racing the general LLM reply alongside
+    speculative_task = None
+    if AGENT_SPECULATIVE_GENERAL_LLM and not (updated_state.get('awaiting_confirmation') and updated_state.get('pending_operation_details')):
+        from services.agents.chat.subgraph_nodes.general_llm_caller import generate_general_response
+        speculative_task = asyncio.ensure_future(generate_general_response(messages))
+
+    try:
+        operation, params, missing, detected_topic = await detect_operation_intent(
+            last_human_msg,
+            request_type=current_request_type
+        )
+    except BaseException:
+        if speculative_task:
+            speculative_task.cancel()
+        raise
+
+    updated_state['speculative_message'] = None
+    if speculative_task and operation:
+        speculative_task.cancel()
+        SPECULATIVE_GENERAL_RESULTS.labels(outcome="cancelled").inc()
+        logger.info("Operation detected; cancelled speculative general LLM call.")
+    elif speculative_task:
+        try:
+            updated_state['speculative_message'] = await speculative_task
+            SPECULATIVE_GENERAL_RESULTS.labels(outcome="used").inc()
+        except Exception as e:
+            # The general LLM node will make the call itself
+            SPECULATIVE_GENERAL_RESULTS.labels(outcome="failed").inc()
+            logger.warning(f"Speculative general LLM call failed: {e}")
 
     if operation:
         logger.info(f"Detected operation intent: {operation} with params: {params}, missing: {missing}")
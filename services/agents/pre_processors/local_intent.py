@@ -0,0 +1,235 @@
+"""
+Local intent classifier that handles formulaic operation requests without an LLM call.
+
+A message skips the LLM only when two signals agree:
+- a multinomial naive Bayes model, trained at import time on the operation catalogs in
+  `templates/intent_instructions.py` and a few seed phrasings per operation, and
+- a pattern rule for that operation which also extracts every required parameter. It only
+  matches imperative requests that open with the create verb, since local hits run without
+  confirmation.
+Low confidence, disagreement, a missing parameter, or a negated, hypothetical or question-form
+message all fall through to LLM intent detection.
+"""
+import logging
+import math
+import os
+import re
+from collections import Counter as TermCounter
+from dataclasses import dataclass, field
+from typing import Any, Dict, List, Optional, Tuple
+
+from prometheus_client import Counter
+
+from services.agents.pre_processors.name_extraction import CHARACTER_NAME_PATTERNS
+from ..templates.intent_instructions import operations_list_all, operations_list_char, operations_list_story
+
+logger = logging.getLogger(__name__)
+
+LOCAL_INTENT_ENABLED = os.getenv("AGENT_LOCAL_INTENT_ENABLED", "true").lower() == "true"
+LOCAL_INTENT_MIN_CONFIDENCE = float(os.getenv("AGENT_LOCAL_INTENT_MIN_CONFIDENCE", "0.8"))
+
+NO_OPERATION = "none"
+
+LOCAL_INTENT_RESULTS = Counter(
+    "agent_local_intent_total", "Local intent classifications by predicted operation and outcome (hit or deferred)",
+    ["operation", "outcome"]
+)
+
+
+def _parse_catalog(catalog: str) -> Dict[str, str]:
+    """'- name: description' lines of an operations catalog -> {name: description}."""
+    operations = {}
+    for line in catalog.splitlines():
+        match = re.match(r"\s*-\s*(\w+):\s*(.*)", line)
+        if match:
+            operations[match.group(1)] = match.group(2)
+    return operations
+
+
+OPERATION_DESCRIPTIONS = _parse_catalog(operations_list_all)
+_CHARACTER_OPERATIONS = set(_parse_catalog(operations_list_char))
+_STORY_OPERATIONS = set(_parse_catalog(operations_list_story))
+OPERATION_TOPICS = {
+    op: "character" if op in _CHARACTER_OPERATIONS else "story" if op in _STORY_OPERATIONS else "faction"
+    for op in OPERATION_DESCRIPTIONS
+}
+
+_SEED_EXAMPLES: Dict[str, List[str]] = {
+    "character_create": ["create a character named", "create a new character called", "add a character named",
+                         "make a new character", "introduce a new character called", "new character named",
+                         "add a new npc called"],
+    "character_rename": ["rename the character to", "rename character", "change the character's name to",
+                         "call this character instead"],
+    "trait_add": ["add a trait to the character", "give the character a trait", "add a behavior trait",
+                  "the character should have the trait"],
+    "relationship_add": ["add a relationship between", "make them friends", "create a relationship with",
+                         "they are rivals add relationship"],
+    "act_create": ["create an act called", "add a new act named", "add an act titled", "make a new act",
+                   "add an act called with description", "create a new act about"],
+    "act_edit": ["edit the act description", "change the act description to", "update the act",
+                 "rewrite the act"],
+    "beat_create": ["create a beat named", "add a new beat called", "add a beat", "new story beat titled",
+                    "add a beat called with description", "create a new beat where"],
+    "beat_edit": ["edit the beat description", "update the beat", "change the beat to"],
+    "scene_create": ["create a scene named", "add a new scene called", "write a scene where", "new scene titled",
+                     "add a scene called about", "create a scene named with description"],
+    "faction_create": ["create a faction named", "add a new faction called", "new faction", "form a faction",
+                       "add a faction called with description", "create a new faction about"],
+    "faction_rename": ["rename the faction to", "change the faction name to"],
+    NO_OPERATION: ["tell me about the story", "what is the character like", "who is", "how can i improve the plot",
+                   "analyze the story progress", "what happens in the act", "describe the faction",
+                   "give me ideas for", "summarize the beats", "hello", "thanks", "what do you think about",
+                   "help me with", "which characters are in the story", "why does the hero"],
+}
+
+_TOKEN = re.compile(r"[a-z0-9']+")
+
+
+def _features(text: str) -> List[str]:
+    tokens = _TOKEN.findall(text.lower())
+    return tokens + [f"{a} {b}" for a, b in zip(tokens, tokens[1:])]
+
+
+class NaiveBayesIntentModel:
+    """Multinomial naive Bayes over unigrams and bigrams with uniform class priors."""
+
+    def __init__(self, examples: Dict[str, List[str]], alpha: float = 1.0):
+        self.alpha = alpha
+        self.term_counts: Dict[str, TermCounter] = {label: TermCounter() for label in examples}
+        for label, texts in examples.items():
+            for text in texts:
+                self.term_counts[label].update(_features(text))
+        self.totals = {label: sum(counts.values()) for label, counts in self.term_counts.items()}
+        self.vocabulary = set().union(*self.term_counts.values())
+
+    def predict(self, text: str) -> List[Tuple[str, float]]:
+        """Class posteriors, most likely first. Terms never seen in training are ignored."""
+        features = [f for f in _features(text) if f in self.vocabulary]
+        vocabulary_size = len(self.vocabulary)
+        log_scores = {}
+        for label, counts in self.term_counts.items():
+            denominator = self.totals[label] + self.alpha * vocabulary_size
+            log_scores[label] = sum(math.log((counts[f] + self.alpha) / denominator) for f in features)
+        top = max(log_scores.values())
+        weights = {label: math.exp(score - top) for label, score in log_scores.items()}
+        norm = sum(weights.values())
+        return sorted(((label, weight / norm) for label, weight in weights.items()), key=lambda item: -item[1])
+
+
+def _training_examples() -> Dict[str, List[str]]:
+    examples = {label: list(texts) for label, texts in _SEED_EXAMPLES.items()}
+    for op, description in OPERATION_DESCRIPTIONS.items():
+        # The catalog summary ("Creates a new character") without the extraction hints
+        examples.setdefault(op, []).append(description.split("(")[0])
+    return examples
+
+
+_model = NaiveBayesIntentModel(_training_examples())
+
+# --- Rules: imperative create requests with the entity name in the message ---
+
+# The create verb must open the message (optionally after "please"): "Create a character named Bob"
+_CREATE_RULE = re.compile(
+    r"^\s*(?:please[\s,]+)?(?:create|add|make|introduce|start|write|new)\b(?:\s+(?:a|an|the|another|new|story))*"
+    r"\s+(?P<noun>character|npc|act|beat|scene|faction)\b",
+    re.IGNORECASE,
+)
+_NOUN_OPERATIONS = {
+    "character": "character_create", "npc": "character_create", "act": "act_create",
+    "beat": "beat_create", "scene": "scene_create", "faction": "faction_create",
+}
+_NAME_PARAMS = {
+    "character_create": "target_char_name", "act_create": "act_name", "beat_create": "beat_name",
+    "scene_create": "scene_name", "faction_create": "faction_name",
+}
+_DESCRIPTION_PARAMS = {
+    "act_create": "act_description", "beat_create": "beat_description",
+    "scene_create": "scene_description", "faction_create": "faction_description",
+}
+_QUOTED = r"[\"“‘'](?P<quoted>[^\"”’']+)[\"”’']"
+# Case-sensitive on purpose: unquoted names are runs of capitalised words
+_NAMED = re.compile(rf"^\s*(?i:named|called|titled)\s+(?:{_QUOTED}|(?P<plain>[^\s,.;:!?]+(?:\s+[A-Z][^\s,.;:!?]*)*))")
+_BARE = re.compile(rf"^\s*(?:{_QUOTED}|(?P<plain>[A-Z][^\s,.;:!?]*(?:\s+[A-Z][^\s,.;:!?]*)*))")
+_DESCRIPTION = re.compile(
+    r"^\s*[,.;:]?\s*(?i:with (?:the |a )?description|described as|description|about|where|in which)\s*:?\s*(?P<description>.+)$",
+    re.DOTALL,
+)
+# Negated, hypothetical or question-form requests are left to the LLM
+_NOT_IMPERATIVE = re.compile(
+    r"\b(?:not|never|no|don'?t|doesn'?t|won'?t|can'?t|shouldn'?t|how|why|what|whether|"
+    r"can|could|would|should|shall|may|might|must)\b|n't\b|\?\s*$",
+    re.IGNORECASE,
+)
+_OPERATION_VERBS = re.compile(
+    r"\b(?:create|add|make|new|rename|edit|update|change|delete|remove|introduce|write|give)\b", re.IGNORECASE
+)
+
+
+def _extract_create(message: str) -> Optional[Tuple[str, Dict[str, Any]]]:
+    """(operation, params) for an imperative create request that names the entity."""
+    if _NOT_IMPERATIVE.search(message):
+        return None
+    rule = _CREATE_RULE.match(message)
+    if not rule:
+        return None
+    operation = _NOUN_OPERATIONS[rule.group("noun").lower()]
+    remainder = message[rule.end():]
+
+    name_match = _NAMED.match(remainder) or _BARE.match(remainder)
+    name = None
+    if name_match:
+        name = (name_match.group("quoted") or name_match.group("plain") or "").strip()
+        remainder = remainder[name_match.end():]
+    elif operation == "character_create":
+        found = re.search(CHARACTER_NAME_PATTERNS[0], message)  # "character named Malak"
+        if found:
+            name = found.group(1)
+    if not name:
+        return None
+
+    params: Dict[str, Any] = {_NAME_PARAMS[operation]: name}
+    description = _DESCRIPTION.match(remainder)
+    if description and operation in _DESCRIPTION_PARAMS:
+        params[_DESCRIPTION_PARAMS[operation]] = description.group("description").strip().rstrip(".")
+    return operation, params
+
+
+@dataclass
+class LocalIntent:
+    """Intent decided without the LLM; `operation` is None for a confident 'no operation'."""
+    operation: Optional[str]
+    params: Dict[str, Any] = field(default_factory=dict)
+    topic: Optional[str] = None
+    confidence: float = 0.0
+
+
+def _allowed_operations(request_type: str) -> set:
+    if request_type == "general":
+        return set(OPERATION_DESCRIPTIONS)
+    return {op for op, topic in OPERATION_TOPICS.items() if topic == request_type}
+
+
+def classify_intent(message: str, request_type: str = "general") -> Optional[LocalIntent]:
+    """Return the intent when the local classifier is confident, otherwise None (ask the LLM)."""
+    if not LOCAL_INTENT_ENABLED or not message:
+        return None
+
+    label, probability = _model.predict(message)[0]
+    rule = _extract_create(message)
+    result = None
+
+    if rule and rule[0] == label and probability >= LOCAL_INTENT_MIN_CONFIDENCE \
+            and label in _allowed_operations(request_type):
+        operation, params = rule
+        result = LocalIntent(operation, params, OPERATION_TOPICS.get(operation), probability)
+    elif label == NO_OPERATION and probability >= LOCAL_INTENT_MIN_CONFIDENCE and not rule \
+            and not _OPERATION_VERBS.search(message) and request_type != "general":
+        # General requests still need the LLM to categorise the topic
+        result = LocalIntent(None, {}, None, probability)
+
+    LOCAL_INTENT_RESULTS.labels(operation=label, outcome="hit" if result else "deferred").inc()
+    if result:
+        logger.info(f"Local intent: {result.operation or NO_OPERATION} ({probability:.2f}) params={result.params}")
+    else:
+        logger.debug(f"Local intent deferred to LLM: best guess '{label}' ({probability:.2f}), rule={rule}")
+    return result
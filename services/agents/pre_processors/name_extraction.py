@@ -3,6 +3,15 @@ import logging
 import re
 
 logger = logging.getLogger(__name__)
+
+# Pattern matching for common character name request formats
+CHARACTER_NAME_PATTERNS = [
+    r"(?:character|person|npc)(?:\s+named|\s+called)?\s+([A-Z][a-z]+)",  # "character named Malak"
+    r"(?:about|on|regarding)\s+([A-Z][a-z]+)",  # "about Malak"
+    r"(?:what|who|tell me about)\s+(?:is|about)?\s+([A-Z][a-z]+)",  # "what is Malak"
+    r"([A-Z][a-z]+)(?:'s|\s+is|\s+was|\s+has)",  # "Malak's" or "Malak is"
+]
+
 def extract_character_name(state):
     """
     Analyzes the user's message to extract potential character names.
@@ -30,16 +39,8 @@ def extract_character_name(state):
     last_human_msg = human_messages[-1].content
     logger.info(f"Extracting character name from: {last_human_msg[:100]}...")
     
-    # Pattern matching for common character name request formats
-    patterns = [
-        r"(?:character|person|npc)(?:\s+named|\s+called)?\s+([A-Z][a-z]+)",  # "character named Malak"
-        r"(?:about|on|regarding)\s+([A-Z][a-z]+)",  # "about Malak"
-        r"(?:what|who|tell me about)\s+(?:is|about)?\s+([A-Z][a-z]+)",  # "what is Malak"
-        r"([A-Z][a-z]+)(?:'s|\s+is|\s+was|\s+has)",  # "Malak's" or "Malak is"
-    ]
-    
     extracted_names = []
-    for pattern in patterns:
+    for pattern in CHARACTER_NAME_PATTERNS:
         matches = re.findall(pattern, last_human_msg)
         extracted_names.extend(matches)
     
@@ -7,12 +7,14 @@ from .tool_schemas import (
     BeatLookupArgs,
     ProjectGapAnalysisArgs,
     SceneLookupArgs,
+    ProjectContextSearchArgs,
 )
 
-from .db_tool_executor import execute_db_tool
+from .db_tool_executor import execute_db_tool, run_db_tool
 from .db_character_tools import db_character_lookup_tool
 from .db_story_tools import db_story_lookup_tool, db_beat_lookup_tool, db_scene_lookup_tool
 from .db_analysis_tools import db_gap_analysis_tool
+from .db_search_tools import db_project_search_tool
 from .youtube_tools import YouTubeSearchArgs, execute_youtube_tool
 from .tool_schemas import ExecutorFunctionArgs
 
@@ -22,13 +24,16 @@ __all__ = [
     'BeatLookupArgs',
     'ProjectGapAnalysisArgs',
     'SceneLookupArgs',
+    'ProjectContextSearchArgs',
     'YouTubeSearchArgs',
     'ExecutorFunctionArgs',
     'execute_db_tool',
+    'run_db_tool',
     'execute_youtube_tool',
     'db_character_lookup_tool',
     'db_story_lookup_tool',
     'db_beat_lookup_tool',
     'db_scene_lookup_tool',
-    'db_gap_analysis_tool'
+    'db_gap_analysis_tool',
+    'db_project_search_tool'
 ]
\ No newline at end of file
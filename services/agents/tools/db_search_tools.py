@@ -0,0 +1,64 @@
+"""
+Database lookup tool returning only the project content relevant to a query
+"""
+import logging
+import os
+from typing import List, Optional
+from uuid import UUID
+from sqlalchemy.orm import Session
+
+from services.llm.admission import estimate_tokens
+from .project_retrieval import DOCUMENT_KINDS, project_retrieval
+
+logger = logging.getLogger(__name__)
+
+AGENT_RETRIEVAL_TOP_K = int(os.getenv("AGENT_RETRIEVAL_TOP_K", "8"))
+AGENT_RETRIEVAL_MAX_TOP_K = int(os.getenv("AGENT_RETRIEVAL_MAX_TOP_K", "20"))
+# Token budget of the whole tool result
+AGENT_RETRIEVAL_TOKEN_BUDGET = int(os.getenv("AGENT_RETRIEVAL_TOKEN_BUDGET", "800"))
+AGENT_RETRIEVAL_SNIPPET_CHARS = int(os.getenv("AGENT_RETRIEVAL_SNIPPET_CHARS", "600"))
+
+
+def db_project_search_tool(
+    db: Session,
+    project_id: UUID,
+    query: str,
+    entity_types: Optional[List[str]] = None,
+    top_k: Optional[int] = None
+) -> str:
+    """
+    Retrieves the top-k project snippets (characters, traits, scenes, acts, beats,
+    paragraphs, dialog lines) most similar to the query, within the token budget.
+    """
+    logger.info("--- Running DB Project Search ---")
+    logger.info(f"Project ID: {project_id}, Query: '{query}', Types: {entity_types}, Top k: {top_k}")
+
+    if not query or not query.strip():
+        return "Error: a search query is required."
+    kinds = [kind.lower().rstrip("s") for kind in entity_types or []]
+    unknown = [kind for kind in kinds if kind not in DOCUMENT_KINDS]
+    if unknown:
+        return f"Error: unknown entity types {unknown}. Use any of: {', '.join(DOCUMENT_KINDS)}."
+    top_k = max(1, min(top_k or AGENT_RETRIEVAL_TOP_K, AGENT_RETRIEVAL_MAX_TOP_K))
+
+    hits = project_retrieval.search(db, project_id, query, top_k, kinds or None)
+    if not hits:
+        return f"No project content found matching '{query}'."
+
+    result = f"Project content relevant to '{query}' (most relevant first):\n"
+    used = estimate_tokens(result)
+    included = 0
+    for hit in hits:
+        text = hit.text if len(hit.text) <= AGENT_RETRIEVAL_SNIPPET_CHARS else hit.text[:AGENT_RETRIEVAL_SNIPPET_CHARS] + "..."
+        line = f"- [{hit.kind}] {text}\n"
+        tokens = estimate_tokens(line)
+        if included and used + tokens > AGENT_RETRIEVAL_TOKEN_BUDGET:
+            break
+        result += line
+        used += tokens
+        included += 1
+    if included < len(hits):
+        result += f"({len(hits) - included} less relevant matches omitted to stay within the context budget.)\n"
+
+    logger.info(f"Project Search Result ({included} snippets, ~{used} tokens):\n{result}")
+    return result
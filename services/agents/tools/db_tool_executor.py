@@ -11,11 +11,14 @@ from .tool_schemas import (
     StoryLookupArgs, 
     BeatLookupArgs, 
     ProjectGapAnalysisArgs,
-    SceneLookupArgs
+    SceneLookupArgs,
+    ProjectContextSearchArgs
 )
 from .db_character_tools import db_character_lookup_tool
 from .db_story_tools import db_story_lookup_tool, db_beat_lookup_tool, db_scene_lookup_tool
 from .db_analysis_tools import db_gap_analysis_tool
+from .db_search_tools import db_project_search_tool
+from .project_snapshot import project_snapshots
 
 logger = logging.getLogger(__name__)
 
@@ -38,12 +41,22 @@ def execute_db_tool(state: Dict[str, Any], db: Session) -> Dict[str, Any]:
     tool_args = tool_call['args']
     tool_call_id = tool_call['id']
 
+    tool_result_content = run_db_tool(tool_name, tool_args, state, db)
+    return {"messages": [ToolMessage(content=tool_result_content, tool_call_id=tool_call_id)]}
+
+
+def run_db_tool(tool_name: str, tool_args: Dict[str, Any], state: Dict[str, Any], db: Session) -> str:
+    """
+    Executes one database lookup tool by SCHEMA NAME and returns its text result.
+    `state` supplies the context (project_id, character_id, extracted_character_names).
+    Project-wide lookups are served from the project's snapshot cache until it is written to.
+    """
     logger.info(f"Executing tool: '{tool_name}' with args: {tool_args}")
 
     project_id = state.get('project_id')
     if not project_id:
          logger.error("project_id missing in state during tool execution.")
-         return {"messages": [ToolMessage(content="Error: project_id missing in state.", tool_call_id=tool_call_id)]}
+         return "Error: project_id missing in state."
 
     tool_result_content = ""
 
@@ -54,43 +67,56 @@ def execute_db_tool(state: Dict[str, Any], db: Session) -> Dict[str, Any]:
             character_name = parsed_args.character_name
             
             # If character_name is None but we have extracted names, use the first one
-            if not character_name and not character_id and "extracted_character_names" in state:
+            if not character_name and not character_id and state.get("extracted_character_names"):
                 extracted_names = state["extracted_character_names"]
                 if extracted_names:
                     character_name = extracted_names[0]
                     logger.info(f"Using extracted character name: {character_name}")
             
-            tool_result_content = db_character_lookup_tool(
-                db=db,
-                project_id=project_id,
-                character_id=character_id,
-                character_name=character_name
+            tool_result_content = project_snapshots.get_or_build(
+                project_id, ("character", str(character_id or ""), (character_name or "").lower()),
+                lambda: db_character_lookup_tool(
+                    db=db,
+                    project_id=project_id,
+                    character_id=character_id,
+                    character_name=character_name
+                )
             )
         elif tool_name == StoryLookupArgs.__name__:
-            tool_result_content = db_story_lookup_tool(
-                db=db,
-                project_id=project_id
+            tool_result_content = project_snapshots.get_or_build(
+                project_id, ("story",), lambda: db_story_lookup_tool(db=db, project_id=project_id)
             )
         elif tool_name == BeatLookupArgs.__name__:
-            tool_result_content = db_beat_lookup_tool(
-                db=db,
-                project_id=project_id
+            tool_result_content = project_snapshots.get_or_build(
+                project_id, ("beats",), lambda: db_beat_lookup_tool(db=db, project_id=project_id)
             )
         elif tool_name == ProjectGapAnalysisArgs.__name__:
             parsed_args = ProjectGapAnalysisArgs.parse_obj(tool_args)
-            tool_result_content = db_gap_analysis_tool(
-                db=db,
-                project_id=project_id,
-                topic=parsed_args.topic,
-                character_id=parsed_args.character_id or state.get('character_id')
+            gap_character_id = parsed_args.character_id or state.get('character_id')
+            tool_result_content = project_snapshots.get_or_build(
+                project_id, ("gap_analysis", parsed_args.topic.lower(), str(gap_character_id or "")),
+                lambda: db_gap_analysis_tool(
+                    db=db,
+                    project_id=project_id,
+                    topic=parsed_args.topic,
+                    character_id=gap_character_id
+                )
             )
         elif tool_name == SceneLookupArgs.__name__:
             parsed_args = SceneLookupArgs.parse_obj(tool_args)
             tool_result_content = db_scene_lookup_tool(
                 db=db,
-                project_id=project_id,
                 scene_id=parsed_args.scene_id
             )
+        elif tool_name == ProjectContextSearchArgs.__name__:
+            parsed_args = ProjectContextSearchArgs.parse_obj(tool_args)
+            tool_result_content = db_project_search_tool(
+                db=db,
+                project_id=project_id,
+                query=parsed_args.query,
+                entity_types=parsed_args.entity_types,
+                top_k=parsed_args.top_k
+            )
         else:
             logger.error(f"Unknown tool schema name received: '{tool_name}'")
             tool_result_content = f"Error: Unknown tool '{tool_name}' called."
@@ -100,4 +126,4 @@ def execute_db_tool(state: Dict[str, Any], db: Session) -> Dict[str, Any]:
         tool_result_content = f"Error executing tool {tool_name}: {str(e)}"
 
     logger.info(f"Tool '{tool_name}' result content length: {len(tool_result_content)}") 
-    return {"messages": [ToolMessage(content=tool_result_content, tool_call_id=tool_call_id)]}
\ No newline at end of file
+    return tool_result_content
\ No newline at end of file
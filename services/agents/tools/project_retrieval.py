@@ -0,0 +1,386 @@
+"""
+Per-project retrieval index over characters, traits, scenes, acts, beats, paragraphs
+and dialog lines, used to give the agent only the snippets relevant to a question.
+
+Documents are vectorized locally with hashed word unigrams and bigrams (sublinear TF,
+smoothed IDF); no model or external service is involved. A project's index is built
+from the database on its first search and then kept current from the same SessionLocal
+commit events as `project_snapshot`: written entities are re-vectorized on their own and
+the NumPy arrays are recompiled lazily on the next search. Renaming a character or scene
+(whose names appear in trait and line documents) drops the project's index instead.
+
+Like the snapshot cache the index is per process; AGENT_RETRIEVAL_TTL_SECONDS bounds how
+long writes made by other workers go unseen.
+"""
+import logging
+import math
+import os
+import re
+import threading
+import time
+import zlib
+from collections import Counter as TermCounter, OrderedDict
+from dataclasses import dataclass
+from typing import Any, Dict, Iterable, List, Optional, Sequence, Tuple
+
+import numpy as np
+from prometheus_client import Counter, Gauge, Histogram
+from sqlalchemy import event, inspect
+from sqlalchemy.orm import Session
+
+from database import SessionLocal
+from models.models import Act, Beat, Character, CharacterTrait, Line, Paragraph, Scene
+from .project_snapshot import project_of
+
+logger = logging.getLogger(__name__)
+
+AGENT_RETRIEVAL_ENABLED = os.getenv("AGENT_RETRIEVAL_ENABLED", "true").lower() == "true"
+AGENT_RETRIEVAL_HASH_BITS = int(os.getenv("AGENT_RETRIEVAL_HASH_BITS", "20"))
+AGENT_RETRIEVAL_MAX_PROJECTS = int(os.getenv("AGENT_RETRIEVAL_MAX_PROJECTS", "64"))
+AGENT_RETRIEVAL_TTL_SECONDS = float(os.getenv("AGENT_RETRIEVAL_TTL_SECONDS", "600"))
+
+RETRIEVAL_BUILDS = Counter("agent_retrieval_index_builds_total", "Project retrieval indexes built from the database")
+RETRIEVAL_UPDATES = Counter("agent_retrieval_index_updates_total", "Incremental retrieval index updates", ["op"])
+RETRIEVAL_DOCUMENTS = Gauge("agent_retrieval_index_documents", "Documents in the loaded project retrieval indexes")
+RETRIEVAL_SEARCH_SECONDS = Histogram(
+    "agent_retrieval_search_seconds", "Retrieval search duration, including lazy compilation",
+    buckets=(0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1)
+)
+
+_KINDS = {
+    Character: "character", CharacterTrait: "trait", Scene: "scene", Act: "act",
+    Beat: "beat", Paragraph: "paragraph", Line: "line",
+}
+DOCUMENT_KINDS = tuple(_KINDS.values())
+
+_TOKEN = re.compile(r"[a-z0-9]+(?:'[a-z]+)?")
+_STOPWORDS = frozenset(
+    "a an and are as at be but by for from has have he her his i in is it its me my of on or our she so "
+    "that the their them they this to was we were what when where which who will with you your".split()
+)
+_HASH_MASK = (1 << AGENT_RETRIEVAL_HASH_BITS) - 1
+
+DocKey = Tuple[str, str]  # (kind, entity id)
+
+
+def _normalize(word: str) -> str:
+    """Light stemming: drop plural/third-person `s` and possessive `'s` so 'distrusts' matches 'distrust'."""
+    if word.endswith("'s"):
+        word = word[:-2]
+    if len(word) > 3 and word.endswith("s") and not word.endswith("ss"):
+        word = word[:-1]
+    return word
+
+
+def _terms(text: str) -> List[str]:
+    words = [_normalize(w) for w in _TOKEN.findall(text.lower()) if w not in _STOPWORDS]
+    return words + [f"{a} {b}" for a, b in zip(words, words[1:])]
+
+
+def vectorize(text: str) -> Tuple[np.ndarray, np.ndarray]:
+    """(hashed term ids, sublinear term frequencies) of a text; crc32 keeps ids stable across processes."""
+    counts = TermCounter(zlib.crc32(term.encode("utf-8")) & _HASH_MASK for term in _terms(text))
+    ids = np.fromiter(counts.keys(), dtype=np.int64, count=len(counts))
+    tf = np.fromiter(counts.values(), dtype=np.float32, count=len(counts))
+    return ids, (1.0 + np.log(tf)).astype(np.float32)
+
+
+# --- Documents ---
+
+def _name_of(session: Session, model, entity_id: Any) -> Optional[str]:
+    if not entity_id:
+        return None
+    with session.no_autoflush:
+        instance = session.get(model, entity_id)
+    return instance.name if instance is not None else None
+
+
+def document_of(session: Session, instance: Any) -> Optional[Tuple[DocKey, str]]:
+    """Document key and text of an indexed entity, or None for other instances."""
+    if isinstance(instance, Character):
+        kind, text = "character", f"Character {instance.name} ({instance.type}): {instance.description or ''}"
+    elif isinstance(instance, CharacterTrait):
+        owner = _name_of(session, Character, instance.character_id) or "Unknown character"
+        label = f" ({instance.label})" if instance.label else ""
+        kind, text = "trait", f"{owner} - {instance.type} trait{label}: {instance.description or ''}"
+    elif isinstance(instance, Scene):
+        kind, text = "scene", f"Scene {instance.name}: {instance.description or ''}"
+    elif isinstance(instance, Act):
+        kind, text = "act", f"Act {instance.order} ({instance.name}): {instance.description or ''}"
+    elif isinstance(instance, Beat):
+        status = "completed" if instance.completed else "not completed"
+        kind, text = "beat", f"Beat {instance.name} [{instance.type}, {status}]: {instance.description or ''}"
+    elif isinstance(instance, Paragraph):
+        kind, text = "paragraph", f"Paragraph {instance.title}: {instance.description or ''}"
+    elif isinstance(instance, Line):
+        speaker = _name_of(session, Character, instance.character_id) or "Narrator"
+        scene = _name_of(session, Scene, instance.scene_id) or "unknown scene"
+        kind, text = "line", f"{speaker} in scene {scene}: {instance.text}"
+    else:
+        return None
+    return (kind, str(instance.id)), text.strip()
+
+
+def _project_documents(db: Session, project_id: Any) -> Iterable[Tuple[DocKey, str]]:
+    # Characters and scenes first so trait/line documents resolve their names from the identity map
+    entities: List[Any] = []
+    for model in (Character, Scene, Act, Beat, Paragraph):
+        entities.extend(db.query(model).filter(model.project_id == project_id).all())
+    entities.extend(
+        db.query(CharacterTrait).join(Character, CharacterTrait.character_id == Character.id)
+        .filter(Character.project_id == project_id).all()
+    )
+    entities.extend(
+        db.query(Line).join(Scene, Line.scene_id == Scene.id).filter(Scene.project_id == project_id).all()
+    )
+    for entity in entities:
+        document = document_of(db, entity)
+        if document is not None:
+            yield document
+
+
+# --- Index ---
+
+@dataclass
+class RetrievalHit:
+    kind: str
+    entity_id: str
+    text: str
+    score: float
+
+
+@dataclass
+class _Document:
+    text: str
+    term_ids: np.ndarray
+    tf: np.ndarray
+
+
+class _Compiled:
+    """Inverted TF-IDF arrays of a project: postings sorted by term, with per-document norms."""
+
+    def __init__(self, documents: Dict[DocKey, _Document]):
+        self.keys: List[DocKey] = list(documents)
+        self.texts = [documents[key].text for key in self.keys]
+        self.kinds = np.array([kind for kind, _ in self.keys])
+        count = len(self.keys)
+        if count == 0:
+            self.terms = np.empty(0, dtype=np.int64)
+            self.starts = np.zeros(1, dtype=np.int64)
+            self.rows = np.empty(0, dtype=np.int64)
+            self.weights = np.empty(0, dtype=np.float32)
+            self.idf = np.empty(0, dtype=np.float32)
+            self.norms = np.empty(0, dtype=np.float32)
+            return
+        docs = [documents[key] for key in self.keys]
+        term_ids = np.concatenate([d.term_ids for d in docs])
+        tf = np.concatenate([d.tf for d in docs])
+        rows = np.repeat(np.arange(count), [len(d.term_ids) for d in docs])
+
+        order = np.argsort(term_ids, kind="stable")
+        term_ids, tf, rows = term_ids[order], tf[order], rows[order]
+        self.terms, first = np.unique(term_ids, return_index=True)
+        self.starts = np.append(first, len(term_ids))
+        df = np.diff(self.starts)
+        self.idf = (np.log((1 + count) / (1 + df)) + 1).astype(np.float32)
+        self.rows = rows
+        self.weights = tf * np.repeat(self.idf, df)
+        self.norms = np.sqrt(np.bincount(rows, weights=self.weights ** 2, minlength=count)).astype(np.float32)
+
+    def search(self, query_ids: np.ndarray, query_tf: np.ndarray, top_k: int,
+               kinds: Optional[Sequence[str]] = None) -> List[Tuple[int, float]]:
+        """(document row, cosine similarity) of the best `top_k` matches."""
+        if not len(self.terms) or not len(query_ids):
+            return []
+        positions = np.searchsorted(self.terms, query_ids)
+        positions = np.minimum(positions, len(self.terms) - 1)
+        found = self.terms[positions] == query_ids
+        positions, query_tf = positions[found], query_tf[found]
+        if not len(positions):
+            return []
+
+        query_weights = query_tf * self.idf[positions]
+        postings = [np.arange(self.starts[p], self.starts[p + 1]) for p in positions]
+        lengths = [len(p) for p in postings]
+        postings = np.concatenate(postings)
+        contributions = self.weights[postings] * np.repeat(query_weights, lengths)
+        scores = np.bincount(self.rows[postings], weights=contributions, minlength=len(self.keys))
+        query_norm = math.sqrt(float(np.sum(query_weights ** 2)))
+        scores = scores / (np.maximum(self.norms, 1e-9) * max(query_norm, 1e-9))
+        if kinds:
+            scores[~np.isin(self.kinds, list(kinds))] = 0.0
+
+        candidates = np.flatnonzero(scores > 0)
+        if len(candidates) > top_k:
+            candidates = candidates[np.argpartition(-scores[candidates], top_k - 1)[:top_k]]
+        candidates = candidates[np.argsort(-scores[candidates], kind="stable")]
+        return [(int(row), float(scores[row])) for row in candidates]
+
+
+class _ProjectIndex:
+    def __init__(self):
+        self.built_at = time.monotonic()
+        self.documents: Dict[DocKey, _Document] = {}
+        self._compiled: Optional[_Compiled] = None
+        self._lock = threading.Lock()
+
+    def upsert(self, key: DocKey, text: str):
+        term_ids, tf = vectorize(text)
+        with self._lock:
+            self.documents[key] = _Document(text, term_ids, tf)
+            self._compiled = None
+
+    def remove(self, key: DocKey):
+        with self._lock:
+            if self.documents.pop(key, None) is not None:
+                self._compiled = None
+
+    def search(self, query: str, top_k: int, kinds: Optional[Sequence[str]] = None) -> List[RetrievalHit]:
+        query_ids, query_tf = vectorize(query)
+        with self._lock:
+            if self._compiled is None:
+                self._compiled = _Compiled(self.documents)
+            compiled = self._compiled
+        return [
+            RetrievalHit(kind=compiled.keys[row][0], entity_id=compiled.keys[row][1], text=compiled.texts[row], score=score)
+            for row, score in compiled.search(query_ids, query_tf, top_k, kinds)
+        ]
+
+
+# Update: (document key, text) to index or replace, (document key, None) to remove, or None to drop the index
+Update = Optional[Tuple[DocKey, Optional[str]]]
+
+
+class ProjectRetrievalIndex:
+    """Retrieval indexes of recently searched projects, built on demand and updated on commit."""
+
+    def __init__(self, max_projects: int = AGENT_RETRIEVAL_MAX_PROJECTS, ttl_seconds: float = AGENT_RETRIEVAL_TTL_SECONDS):
+        self.max_projects = max_projects
+        self.ttl_seconds = ttl_seconds
+        self._lock = threading.Lock()
+        self._indexes: "OrderedDict[str, _ProjectIndex]" = OrderedDict()
+        self._building: Dict[str, List[Update]] = {}  # Updates committed while a project's index is built
+
+    def tracks(self, project_id: str) -> bool:
+        """Whether commits to the project have to be applied (its index is loaded or being built)."""
+        return project_id in self._indexes or project_id in self._building
+
+    def search(self, db: Session, project_id: Any, query: str, top_k: int,
+               kinds: Optional[Sequence[str]] = None) -> List[RetrievalHit]:
+        start = time.perf_counter()
+        hits = self._index_for(db, project_id).search(query, top_k, kinds)
+        RETRIEVAL_SEARCH_SECONDS.observe(time.perf_counter() - start)
+        return hits
+
+    def _index_for(self, db: Session, project_id: Any) -> _ProjectIndex:
+        project = str(project_id)
+        with self._lock:
+            index = self._indexes.get(project)
+            if index is not None and time.monotonic() - index.built_at <= self.ttl_seconds:
+                self._indexes.move_to_end(project)
+                return index
+            self._building.setdefault(project, [])
+
+        index = _ProjectIndex()
+        try:
+            for key, text in _project_documents(db, project_id):
+                index.upsert(key, text)
+        except Exception:
+            with self._lock:
+                self._building.pop(project, None)
+            raise
+        RETRIEVAL_BUILDS.inc()
+        logger.info(f"Built retrieval index for project {project} with {len(index.documents)} documents")
+
+        with self._lock:
+            pending = self._building.pop(project, [])
+            if None in pending:
+                # A rename committed during the build; this index answers the current search
+                # but is not kept, so the next search rebuilds it
+                RETRIEVAL_UPDATES.labels(op="drop").inc()
+                return index
+            for update in pending:
+                self._apply(index, update)
+            self._indexes[project] = index
+            self._indexes.move_to_end(project)
+            while len(self._indexes) > self.max_projects:
+                self._indexes.popitem(last=False)
+            RETRIEVAL_DOCUMENTS.set(sum(len(i.documents) for i in self._indexes.values()))
+        return index
+
+    @staticmethod
+    def _apply(index: _ProjectIndex, update: Update):
+        key, text = update
+        if text is None:
+            index.remove(key)
+            RETRIEVAL_UPDATES.labels(op="remove").inc()
+        else:
+            index.upsert(key, text)
+            RETRIEVAL_UPDATES.labels(op="upsert").inc()
+
+    def apply(self, updates: Dict[str, List[Update]]):
+        """Apply committed document changes to the loaded indexes."""
+        with self._lock:
+            for project, project_updates in updates.items():
+                if project in self._building:
+                    self._building[project].extend(project_updates)
+                if None in project_updates:
+                    if self._indexes.pop(project, None) is not None:
+                        RETRIEVAL_UPDATES.labels(op="drop").inc()
+                    continue
+                index = self._indexes.get(project)
+                if index is not None:
+                    for update in project_updates:
+                        self._apply(index, update)
+            RETRIEVAL_DOCUMENTS.set(sum(len(i.documents) for i in self._indexes.values()))
+
+
+project_retrieval = ProjectRetrievalIndex()
+
+
+# --- Updates from ORM writes ---
+
+# Their names are part of other documents (trait owner, line speaker and scene)
+_NAMED_PARENTS = (Character, Scene)
+
+
+@event.listens_for(SessionLocal, "after_flush")
+def _collect_document_updates(session: Session, flush_context):
+    if not AGENT_RETRIEVAL_ENABLED:
+        return
+    updates: Dict[str, List[Update]] = session.info.setdefault("retrieval_updates", {})
+    # Still the pre-flush collections at this point
+    dirty = {instance for instance in session.dirty if session.is_modified(instance, include_collections=False)}
+    for instances, deleted in ((list(session.new) + list(dirty), False), (list(session.deleted), True)):
+        for instance in instances:
+            if type(instance) not in _KINDS:
+                continue
+            try:
+                project = project_of(session, instance)
+                if not project or not project_retrieval.tracks(project):
+                    continue
+                if deleted:
+                    update = ((_KINDS[type(instance)], str(instance.id)), None)
+                elif (isinstance(instance, _NAMED_PARENTS) and instance not in session.new
+                      and inspect(instance).attrs.name.history.has_changes()):
+                    # Renamed: the old name is in other documents. The old value is not loaded
+                    # when the name was set on an expired instance, so any set counts.
+                    update = None
+                else:
+                    update = document_of(session, instance)
+            except Exception as e:
+                logger.warning(f"Could not index a written {type(instance).__name__}: {e}")
+                continue
+            updates.setdefault(project, []).append(update)
+
+
+@event.listens_for(SessionLocal, "after_commit")
+def _apply_document_updates(session: Session):
+    updates = session.info.pop("retrieval_updates", None)
+    if updates:
+        project_retrieval.apply(updates)
+
+
+@event.listens_for(SessionLocal, "after_rollback")
+def _discard_document_updates(session: Session):
+    session.info.pop("retrieval_updates", None)
@@ -0,0 +1,180 @@
+"""
+Per-project snapshot cache of rendered agent lookup-tool outputs.
+
+Every project has a revision number that is bumped after a commit that wrote any of its
+entities through a `SessionLocal` session (routes, executors and tools all use one).
+Cached outputs are tagged with the revision they were built at and served until the
+revision moves on. Entities without a `project_id` column are resolved through their
+parent (trait -> character, line -> scene, ...); writes that cannot be attributed to a
+project bump a global epoch, which invalidates every snapshot.
+
+Revisions are per process, so with several workers a write in one worker is only seen by
+the others after AGENT_SNAPSHOT_TTL_SECONDS.
+"""
+import logging
+import os
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Callable, Dict, Hashable, Optional, Set, Tuple
+
+from prometheus_client import Counter, Gauge
+from sqlalchemy import event
+from sqlalchemy.orm import Session
+
+from database import SessionLocal
+from models.models import (
+    AgentCheckpoint, AgentCheckpointBlob, AgentCheckpointWrite, Character, CharacterRelationshipEvent,
+    CharacterTrait, Faction, FactionRelationship, Line, Project, Scene, SceneParams
+)
+
+logger = logging.getLogger(__name__)
+
+AGENT_SNAPSHOT_CACHE_ENABLED = os.getenv("AGENT_SNAPSHOT_CACHE_ENABLED", "true").lower() == "true"
+AGENT_SNAPSHOT_MAX_PROJECTS = int(os.getenv("AGENT_SNAPSHOT_MAX_PROJECTS", "256"))
+AGENT_SNAPSHOT_TTL_SECONDS = float(os.getenv("AGENT_SNAPSHOT_TTL_SECONDS", "300"))
+
+SNAPSHOT_LOOKUPS = Counter("agent_snapshot_lookups_total", "Agent tool snapshot cache lookups", ["tool", "outcome"])
+SNAPSHOT_INVALIDATIONS = Counter("agent_snapshot_invalidations_total", "Project revision bumps", ["scope"])
+SNAPSHOT_PROJECTS = Gauge("agent_snapshot_projects", "Projects with a cached tool snapshot")
+
+# Entities without a project_id column: (foreign key attribute, parent model)
+_PARENTS = {
+    CharacterTrait: ("character_id", Character),
+    CharacterRelationshipEvent: ("character_a_id", Character),
+    FactionRelationship: ("faction_a_id", Faction),
+    Line: ("scene_id", Scene),
+    SceneParams: ("scene_id", Scene),
+}
+_IGNORED = (AgentCheckpoint, AgentCheckpointBlob, AgentCheckpointWrite)
+_GLOBAL = "*"
+
+
+class _Snapshot:
+    def __init__(self, revision: Tuple[int, int]):
+        self.revision = revision
+        self.created_at = time.monotonic()
+        self.outputs: Dict[Hashable, str] = {}
+
+
+class ProjectSnapshotCache:
+    """Rendered tool outputs per project, valid for one (project revision, global epoch)."""
+
+    def __init__(self, max_projects: int = AGENT_SNAPSHOT_MAX_PROJECTS, ttl_seconds: float = AGENT_SNAPSHOT_TTL_SECONDS):
+        self.max_projects = max_projects
+        self.ttl_seconds = ttl_seconds
+        self._lock = threading.Lock()
+        self._revisions: Dict[str, int] = {}
+        self._epoch = 0
+        self._snapshots: "OrderedDict[str, _Snapshot]" = OrderedDict()
+
+    def revision(self, project_id: Any) -> Tuple[int, int]:
+        with self._lock:
+            return self._revision(str(project_id))
+
+    def _revision(self, project: str) -> Tuple[int, int]:
+        return self._revisions.get(project, 0), self._epoch
+
+    def bump(self, project_ids: Set[str]):
+        """Invalidate the snapshots of `project_ids` (or all of them when it contains '*')."""
+        with self._lock:
+            if _GLOBAL in project_ids:
+                self._epoch += 1
+                self._snapshots.clear()
+                SNAPSHOT_INVALIDATIONS.labels(scope="global").inc()
+            else:
+                for project_id in project_ids:
+                    self._revisions[project_id] = self._revisions.get(project_id, 0) + 1
+                    self._snapshots.pop(project_id, None)
+                    SNAPSHOT_INVALIDATIONS.labels(scope="project").inc()
+            SNAPSHOT_PROJECTS.set(len(self._snapshots))
+
+    def get_or_build(self, project_id: Any, key: Tuple, build: Callable[[], str]) -> str:
+        """The cached output for `key`, or `build()` stored at the revision read before building."""
+        if not AGENT_SNAPSHOT_CACHE_ENABLED or project_id is None:
+            return build()
+        project = str(project_id)
+        tool = str(key[0])
+        revision = self.revision(project)
+        with self._lock:
+            snapshot = self._snapshots.get(project)
+            if snapshot is not None and (snapshot.revision != revision
+                                         or time.monotonic() - snapshot.created_at > self.ttl_seconds):
+                del self._snapshots[project]
+                snapshot = None
+            if snapshot is not None and key in snapshot.outputs:
+                self._snapshots.move_to_end(project)
+                SNAPSHOT_LOOKUPS.labels(tool=tool, outcome="hit").inc()
+                return snapshot.outputs[key]
+
+        SNAPSHOT_LOOKUPS.labels(tool=tool, outcome="miss").inc()
+        output = build()
+        if output.startswith("Error"):
+            return output
+
+        with self._lock:
+            if self._revision(project) != revision:
+                # A write was committed while building; the output may already be stale
+                return output
+            snapshot = self._snapshots.get(project)
+            if snapshot is None:
+                snapshot = self._snapshots[project] = _Snapshot(revision)
+            snapshot.outputs[key] = output
+            self._snapshots.move_to_end(project)
+            while len(self._snapshots) > self.max_projects:
+                self._snapshots.popitem(last=False)
+            SNAPSHOT_PROJECTS.set(len(self._snapshots))
+        return output
+
+
+project_snapshots = ProjectSnapshotCache()
+
+
+# --- Invalidation from ORM writes ---
+
+def project_of(session: Session, instance: Any) -> Optional[str]:
+    """Project id of an ORM instance, through its parent for entities without a project_id."""
+    if isinstance(instance, Project):
+        return str(instance.id) if instance.id else None
+    project_id = getattr(instance, "project_id", None)
+    if project_id:
+        return str(project_id)
+    parent = _PARENTS.get(type(instance))
+    if parent is None:
+        return None
+    fk_attr, parent_model = parent
+    parent_id = getattr(instance, fk_attr, None)
+    if not parent_id:
+        return None
+    with session.no_autoflush:
+        parent_instance = session.get(parent_model, parent_id)
+    return str(parent_instance.project_id) if parent_instance is not None and parent_instance.project_id else None
+
+
+@event.listens_for(SessionLocal, "after_flush")
+def _collect_written_projects(session: Session, flush_context):
+    written = session.info.setdefault("snapshot_projects", set())
+    # Still the pre-flush collections at this point
+    dirty = [instance for instance in session.dirty if session.is_modified(instance, include_collections=False)]
+    for instance in list(session.new) + dirty + list(session.deleted):
+        if isinstance(instance, _IGNORED):
+            continue
+        try:
+            project = project_of(session, instance)
+        except Exception as e:
+            logger.warning(f"Could not resolve the project of a written {type(instance).__name__}: {e}")
+            project = None
+        written.add(project or _GLOBAL)
+
+
+@event.listens_for(SessionLocal, "after_commit")
+def _bump_written_projects(session: Session):
+    written = session.info.pop("snapshot_projects", None)
+    if written:
+        project_snapshots.bump(written)
+        logger.debug(f"Bumped snapshot revisions for projects: {written}")
+
+
+@event.listens_for(SessionLocal, "after_rollback")
+def _discard_written_projects(session: Session):
+    session.info.pop("snapshot_projects", None)
@@ -1,7 +1,7 @@
 """
 Schema definitions for database tool arguments
 """
-from typing import Optional, Dict, Any
+from typing import Optional, Dict, Any, List
 from uuid import UUID
 from enum import Enum
 from langchain_core.pydantic_v1 import BaseModel as LangchainBaseModel, Field
@@ -28,6 +28,12 @@ class SceneLookupArgs(LangchainBaseModel):
     """Arguments for looking up scene details."""
     scene_id: UUID = Field(..., description="The ID of the scene to look up.")
 
+class ProjectContextSearchArgs(LangchainBaseModel):
+    """Arguments for searching the project's characters, traits, scenes, acts, beats, paragraphs and dialog lines for the snippets most relevant to a question."""
+    query: str = Field(..., description="What to look for, in natural language (e.g. 'why does Mara distrust the guild').")
+    entity_types: Optional[List[str]] = Field(None, description="Limit the search to these types: 'character', 'trait', 'scene', 'act', 'beat', 'paragraph', 'line'.")
+    top_k: Optional[int] = Field(None, description="Maximum number of snippets to return.")
+
 class ExecutorFunctionType(str, Enum):
     CHARACTER_CREATE = "character_create"
     CHARACTER_RENAME = "character_rename"
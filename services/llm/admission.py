@@ -0,0 +1,303 @@
+"""
+Central admission control for outbound LLM calls.
+
+Every provider has a concurrency limit plus optional requests-per-minute and
+tokens-per-minute token buckets. Callers queue in strict FIFO order per provider,
+so a burst cannot starve earlier requests, and give up with `AdmissionTimeout`
+once their deadline passes instead of piling retries onto a rate-limited provider.
+
+Limits come from the environment; a provider-specific variable overrides the default:
+
+- LLM_MAX_CONCURRENCY / LLM_MAX_CONCURRENCY_<PROVIDER>  (default 16)
+- LLM_RPM_LIMIT / LLM_RPM_LIMIT_<PROVIDER>              (0 = unlimited)
+- LLM_TPM_LIMIT / LLM_TPM_LIMIT_<PROVIDER>              (0 = unlimited)
+- LLM_ADMISSION_TIMEOUT                                  (seconds a caller may queue)
+
+Both blocking callers (`admit`) and coroutines (`aadmit`) share the same queues.
+"""
+import asyncio
+import logging
+import os
+import threading
+import time
+from collections import deque
+from contextlib import asynccontextmanager, contextmanager
+from typing import Dict, Optional
+
+from prometheus_client import Counter, Gauge, Histogram
+
+logger = logging.getLogger(__name__)
+
+LLM_MAX_CONCURRENCY = int(os.getenv("LLM_MAX_CONCURRENCY", "16"))
+LLM_RPM_LIMIT = int(os.getenv("LLM_RPM_LIMIT", "0"))
+LLM_TPM_LIMIT = int(os.getenv("LLM_TPM_LIMIT", "0"))
+LLM_ADMISSION_TIMEOUT = float(os.getenv("LLM_ADMISSION_TIMEOUT", "30"))
+
+ADMISSION_QUEUE_DEPTH = Gauge("llm_admission_queue_depth", "LLM calls waiting for admission", ["provider"])
+ADMISSION_IN_FLIGHT = Gauge("llm_admission_in_flight", "Admitted LLM calls currently in flight", ["provider"])
+ADMISSION_WAIT_SECONDS = Histogram(
+    "llm_admission_wait_seconds", "Time LLM calls spent queued for admission", ["provider"],
+    buckets=(0.005, 0.025, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60)
+)
+ADMISSION_TIMEOUTS = Counter("llm_admission_timeouts_total", "LLM calls rejected after waiting past their deadline", ["provider"])
+
+
+class AdmissionTimeout(Exception):
+    """Raised when an LLM call could not be admitted before its deadline."""
+
+    def __init__(self, provider: str, waited: float):
+        super().__init__(f"LLM provider '{provider}' is saturated; waited {waited:.1f}s for admission")
+        self.provider = provider
+        self.waited = waited
+
+
+def estimate_tokens(*texts: str, max_tokens: int = 0) -> int:
+    """Rough token cost of a call (about 4 characters per token plus the completion budget)."""
+    return sum(len(text or "") for text in texts) // 4 + (max_tokens or 0)
+
+
+def _limit(name: str, provider: str, default: int) -> int:
+    return int(os.getenv(f"{name}_{provider.upper()}", str(default)))
+
+
+class TokenBucket:
+    """Per-minute budget refilled continuously; a rate of 0 means unlimited."""
+
+    def __init__(self, per_minute: int):
+        self.capacity = float(per_minute)
+        self.level = float(per_minute)
+        self.rate = per_minute / 60.0
+        self.updated_at = time.monotonic()
+
+    def _refill(self, now: float):
+        self.level = min(self.capacity, self.level + (now - self.updated_at) * self.rate)
+        self.updated_at = now
+
+    def wait_time(self, amount: float, now: float) -> float:
+        """Seconds until `amount` is available (0 if it is available now)."""
+        if self.rate <= 0:
+            return 0.0
+        self._refill(now)
+        # Requests larger than the whole bucket are admitted once it is full
+        amount = min(amount, self.capacity)
+        if self.level >= amount:
+            return 0.0
+        return (amount - self.level) / self.rate
+
+    def consume(self, amount: float):
+        if self.rate > 0:
+            self.level -= amount
+
+    def refund(self, amount: float):
+        if self.rate > 0:
+            self.level = min(self.capacity, self.level + amount)
+
+
+class _Waiter:
+    """A queued caller, woken either through a threading.Event or an asyncio.Event."""
+
+    def __init__(self, tokens: int, loop: Optional[asyncio.AbstractEventLoop] = None):
+        self.tokens = tokens
+        self.granted = False
+        self._loop = loop
+        self._event = asyncio.Event() if loop is not None else threading.Event()
+
+    def wake(self):
+        if self._loop is None:
+            self._event.set()
+        else:
+            self._loop.call_soon_threadsafe(self._event.set)
+
+    def clear(self):
+        self._event.clear()
+
+
+class AdmissionTicket:
+    """Handle for an admitted call; `settle` corrects the token charge with actual usage."""
+
+    def __init__(self, gate: "ProviderGate", tokens: int):
+        self._gate = gate
+        self.tokens = tokens
+
+    def settle(self, actual_tokens: Optional[int]):
+        if actual_tokens is None:
+            return
+        with self._gate._lock:
+            difference = self.tokens - actual_tokens
+            if difference > 0:
+                self._gate.token_bucket.refund(difference)
+            else:
+                self._gate.token_bucket.consume(-difference)
+            self.tokens = actual_tokens
+
+
+class ProviderGate:
+    """FIFO admission queue for a single provider."""
+
+    def __init__(self, provider: str, max_concurrency: int, rpm: int, tpm: int):
+        self.provider = provider
+        self.max_concurrency = max(1, max_concurrency)
+        self.request_bucket = TokenBucket(rpm)
+        self.token_bucket = TokenBucket(tpm)
+        self.in_flight = 0
+        self._queue: "deque[_Waiter]" = deque()
+        self._lock = threading.Lock()
+
+    def _dispatch_locked(self, caller: Optional[_Waiter] = None) -> Optional[float]:
+        """
+        Admit waiters from the head of the queue while capacity allows. Returns the
+        seconds until the head can be admitted if it is blocked on a rate budget.
+        """
+        while self._queue:
+            head = self._queue[0]
+            if self.in_flight >= self.max_concurrency:
+                return None  # A release will dispatch again
+            now = time.monotonic()
+            wait = max(self.request_bucket.wait_time(1, now), self.token_bucket.wait_time(head.tokens, now))
+            if wait > 0:
+                if head is not caller:
+                    # Let the head schedule its own retry for when the budget refills
+                    head.wake()
+                return wait
+            self.request_bucket.consume(1)
+            self.token_bucket.consume(head.tokens)
+            self.in_flight += 1
+            self._queue.popleft()
+            head.granted = True
+            head.wake()
+        return None
+
+    def _enqueue(self, waiter: _Waiter) -> Optional[float]:
+        with self._lock:
+            self._queue.append(waiter)
+            ADMISSION_QUEUE_DEPTH.labels(provider=self.provider).inc()
+            return self._dispatch_locked(waiter)
+
+    def _poll(self, waiter: _Waiter) -> Optional[float]:
+        with self._lock:
+            if waiter.granted:
+                return None
+            waiter.clear()
+            return self._dispatch_locked(waiter)
+
+    def _abandon(self, waiter: _Waiter) -> bool:
+        """Leave the queue; returns True if the waiter was admitted in the meantime."""
+        with self._lock:
+            if waiter.granted:
+                return True
+            self._queue.remove(waiter)
+            self._dispatch_locked()
+            return False
+
+    def _admitted(self, waiter: _Waiter, started: float):
+        ADMISSION_QUEUE_DEPTH.labels(provider=self.provider).dec()
+        ADMISSION_IN_FLIGHT.labels(provider=self.provider).inc()
+        ADMISSION_WAIT_SECONDS.labels(provider=self.provider).observe(time.monotonic() - started)
+
+    def _timed_out(self, started: float) -> AdmissionTimeout:
+        ADMISSION_QUEUE_DEPTH.labels(provider=self.provider).dec()
+        ADMISSION_TIMEOUTS.labels(provider=self.provider).inc()
+        waited = time.monotonic() - started
+        logger.warning(f"Admission timed out for provider '{self.provider}' after {waited:.2f}s")
+        return AdmissionTimeout(self.provider, waited)
+
+    def _cancel(self, waiter: _Waiter, started: float):
+        """Interrupted while queued: give the slot back if it was granted concurrently."""
+        if self._abandon(waiter):
+            self._admitted(waiter, started)
+            self.release()
+        else:
+            ADMISSION_QUEUE_DEPTH.labels(provider=self.provider).dec()
+
+    def release(self):
+        with self._lock:
+            self.in_flight -= 1
+            ADMISSION_IN_FLIGHT.labels(provider=self.provider).dec()
+            self._dispatch_locked()
+
+    def acquire(self, tokens: int, timeout: float) -> AdmissionTicket:
+        started = time.monotonic()
+        deadline = started + timeout
+        waiter = _Waiter(tokens)
+        retry = self._enqueue(waiter)
+        try:
+            while not waiter.granted:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                waiter._event.wait(min(remaining, retry) if retry else remaining)
+                retry = self._poll(waiter)
+        except BaseException:
+            self._cancel(waiter, started)
+            raise
+        if not waiter.granted and not self._abandon(waiter):
+            raise self._timed_out(started)
+        self._admitted(waiter, started)
+        return AdmissionTicket(self, tokens)
+
+    async def aacquire(self, tokens: int, timeout: float) -> AdmissionTicket:
+        started = time.monotonic()
+        deadline = started + timeout
+        waiter = _Waiter(tokens, asyncio.get_running_loop())
+        retry = self._enqueue(waiter)
+        try:
+            while not waiter.granted:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                try:
+                    await asyncio.wait_for(waiter._event.wait(), min(remaining, retry) if retry else remaining)
+                except asyncio.TimeoutError:
+                    pass
+                retry = self._poll(waiter)
+        except BaseException:
+            self._cancel(waiter, started)
+            raise
+        if not waiter.granted and not self._abandon(waiter):
+            raise self._timed_out(started)
+        self._admitted(waiter, started)
+        return AdmissionTicket(self, tokens)
+
+
+class AdmissionController:
+    """Registry of per-provider gates configured from the environment."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._gates: Dict[str, ProviderGate] = {}
+
+    def gate(self, provider: str) -> ProviderGate:
+        with self._lock:
+            gate = self._gates.get(provider)
+            if gate is None:
+                gate = ProviderGate(
+                    provider,
+                    max_concurrency=_limit("LLM_MAX_CONCURRENCY", provider, LLM_MAX_CONCURRENCY),
+                    rpm=_limit("LLM_RPM_LIMIT", provider, LLM_RPM_LIMIT),
+                    tpm=_limit("LLM_TPM_LIMIT", provider, LLM_TPM_LIMIT),
+                )
+                self._gates[provider] = gate
+            return gate
+
+    @contextmanager
+    def admit(self, provider: str, tokens: int = 0, timeout: Optional[float] = None):
+        """Block until the call may proceed; the slot is released on exit."""
+        gate = self.gate(provider)
+        ticket = gate.acquire(tokens, LLM_ADMISSION_TIMEOUT if timeout is None else timeout)
+        try:
+            yield ticket
+        finally:
+            gate.release()
+
+    @asynccontextmanager
+    async def aadmit(self, provider: str, tokens: int = 0, timeout: Optional[float] = None):
+        """Async counterpart of `admit`."""
+        gate = self.gate(provider)
+        ticket = await gate.aacquire(tokens, LLM_ADMISSION_TIMEOUT if timeout is None else timeout)
+        try:
+            yield ticket
+        finally:
+            gate.release()
+
+
+admission_controller = AdmissionController()
@@ -1,13 +1,100 @@
 import logging
 from typing import Optional
 from fastapi import HTTPException
-from helpers.model_helpers import ModelProvider, determine_provider_and_model
+from openai import AsyncOpenAI
+from helpers.model_helpers import ModelProvider, determine_provider_and_model, initialize_client
+from helpers.provider_router import provider_router
+from services.llm.admission import AdmissionTimeout, admission_controller, estimate_tokens
+from services.llm.blocking import run_blocking
+from services.llm.response_cache import CachePolicy, make_cache_key, response_cache
+from services.llm.single_flight import async_single_flight, single_flight
 
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
 
-def generate_response(system_message: str, user_input: str, model: Optional[str] = None, temperature: float = 0.7):
+DEFAULT_MAX_TOKENS = 1500
+
+def _chat_messages(system_message: str, user_input: str) -> list:
+    return [
+        {
+            "role": "system",
+            "content": system_message,
+        },
+        {
+            "role": "user",
+            "content": user_input
+        }
+    ]
+
+def _complete_blocking(client, provider: ModelProvider, model: str, system_message: str, user_input: str, temperature: float) -> str:
+    """Run a single completion on a synchronous provider client."""
+    if provider == ModelProvider.GEMINI:
+        if hasattr(client, "models") and hasattr(client.models, "generate_content"):
+            response = client.chat.completions.create(
+                messages=_chat_messages(system_message, user_input),
+                model=model,
+            )
+            # Extract the text based on the response structure
+            if hasattr(response, "text"):
+                return response.text.strip()
+            elif hasattr(response, "candidates"):
+                return response.candidates[0].content.parts[0].text.strip()
+            else:
+                return str(response)
+        else:
+            raise ValueError(f"Unsupported Gemini client type: {type(client)}")
+    # Groq and GPT use the same chat completions API structure
+    response = client.chat.completions.create(
+            messages=_chat_messages(system_message, user_input),
+            model=model,
+            temperature=temperature,
+            max_tokens=DEFAULT_MAX_TOKENS,
+        )
+    return response.choices[0].message.content.strip()
+
+async def _complete_async(client, provider: ModelProvider, model: str, system_message: str, user_input: str, temperature: float) -> str:
+    """Run a single completion on an async client, or in the bounded executor for blocking-only providers."""
+    if provider == ModelProvider.GEMINI or not isinstance(client, AsyncOpenAI):
+        return await run_blocking(_complete_blocking, client, provider, model, system_message, user_input, temperature)
+    response = await client.chat.completions.create(
+            messages=_chat_messages(system_message, user_input),
+            model=model,
+            temperature=temperature,
+            max_tokens=DEFAULT_MAX_TOKENS,
+        )
+    return response.choices[0].message.content.strip()
+
+def _admitted_complete(client, provider: ModelProvider, model: str, system_message: str, user_input: str, temperature: float) -> str:
+    """`_complete_blocking` gated by admission control and tracked by the provider router."""
+    tokens = estimate_tokens(system_message, user_input, max_tokens=DEFAULT_MAX_TOKENS)
+    with admission_controller.admit(provider.value, tokens):
+        with provider_router.track(provider.value, model):
+            return _complete_blocking(client, provider, model, system_message, user_input, temperature)
+
+async def _aadmitted_complete(client, provider: ModelProvider, model: str, system_message: str, user_input: str, temperature: float) -> str:
+    """`_complete_async` gated by admission control and tracked by the provider router."""
+    tokens = estimate_tokens(system_message, user_input, max_tokens=DEFAULT_MAX_TOKENS)
+    async with admission_controller.aadmit(provider.value, tokens):
+        with provider_router.track(provider.value, model):
+            return await _complete_async(client, provider, model, system_message, user_input, temperature)
+
+async def acomplete_with_provider(provider: ModelProvider, model: str, system_message: str, user_input: str, temperature: float) -> str:
+    """Run a completion on an explicit provider/model, bypassing routing (used for hedged duplicates)."""
+    client, success = initialize_client(provider, asynchronous=True)
+    if not success:
+        raise ValueError(f"Could not initialize {provider.value} client")
+    return await _aadmitted_complete(client, provider, model, system_message, user_input, temperature)
+
+def _response_cache_key(provider: ModelProvider, model: str, system_message: str, user_input: str, temperature: float) -> str:
+    return make_cache_key(provider.value, model, system_message, user_input, temperature, DEFAULT_MAX_TOKENS)
+
+def _single_flight_key(provider: ModelProvider, model: str, system_message: str, user_input: str, temperature: float) -> str:
+    """Request key for deduplicating in-flight calls; prompts are compared without surrounding whitespace."""
+    return make_cache_key(provider.value, model, system_message.strip(), user_input.strip(), temperature, DEFAULT_MAX_TOKENS)
+
+def generate_response(system_message: str, user_input: str, model: Optional[str] = None, temperature: float = 0.7,
+                      cache_policy: Optional[CachePolicy] = None):
     """
     Helper function to call LLM API and return the generated response.
     
@@ -16,6 +103,7 @@ def generate_response(system_message: str, user_input: str, model: Optional[str]
         user_input: The user's input
         model: Optional model name to use (default: None, which will use Groq llama3-70b-8192)
         temperature: Creativity parameter (default: 0.7)
+        cache_policy: Response cache policy for this call (default: None, no caching)
     
     Returns:
         The generated text response
@@ -24,53 +112,113 @@ def generate_response(system_message: str, user_input: str, model: Optional[str]
         client, model, provider = determine_provider_and_model(model)
         logger.info(f"Using {provider.value} client with model {model}")
         
-        # Generate response based on provider
-        if provider == ModelProvider.GEMINI:
-            if hasattr(client, "models") and hasattr(client.models, "generate_content"):
-                response = client.chat.completions.create(
-                    messages=[
-                        {
-                            "role": "system",
-                            "content": system_message,
-                        },
-                        {
-                            "role": "user",
-                            "content": user_input
-                        }
-                    ],
-                    model=model,
-                )
-                # Extract the text based on the response structure
-                if hasattr(response, "text"):
-                    return response.text.strip()
-                elif hasattr(response, "candidates"):
-                    return response.candidates[0].content.parts[0].text.strip()
-                else:
-                    return str(response)
-            else:
-                raise ValueError(f"Unsupported Gemini client type: {type(client)}")
-        else:
-            # Groq and GPT use the same chat completions API structure
-            response = client.chat.completions.create(
-                    messages=[
-                        {
-                            "role": "system",
-                            "content": system_message,
-                        },
-                        {
-                            "role": "user",
-                            "content": user_input
-                        }
-                    ],
-                    model=model,
-                    temperature=temperature,
-                    max_tokens=1500,
-                )
-            return response.choices[0].message.content.strip()
+        cache_key = _response_cache_key(provider, model, system_message, user_input, temperature) if cache_policy else None
+        if cache_policy and cache_policy.read:
+            cached = response_cache.get(cache_key)
+            if cached is not None:
+                logger.info(f"Response cache hit for model {model}")
+                return cached
+        
+        # Identical concurrent requests share one upstream completion
+        text = single_flight.do(
+            _single_flight_key(provider, model, system_message, user_input, temperature),
+            lambda: _admitted_complete(client, provider, model, system_message, user_input, temperature)
+        )
+        if cache_policy and cache_policy.write:
+            response_cache.set(cache_key, text)
+        return text
+    except AdmissionTimeout as e:
+        raise HTTPException(status_code=503, detail=str(e))
+    except Exception as e:
+        logger.error(f"API error with model {model}: {str(e)}")
+        raise HTTPException(status_code=500, detail=f"Failed to generate response from API using {model}.")
+
+async def agenerate_response(system_message: str, user_input: str, model: Optional[str] = None, temperature: float = 0.7,
+                             cache_policy: Optional[CachePolicy] = None):
+    """
+    Async twin of `generate_response`.
+    
+    OpenAI-compatible providers are awaited on their async client; blocking-only
+    providers (Gemini) run in the bounded LLM executor.
+    
+    Returns:
+        The generated text response
+    """
+    try:
+        client, model, provider = determine_provider_and_model(model, asynchronous=True)
+        logger.info(f"Using async {provider.value} client with model {model}")
+        
+        cache_key = _response_cache_key(provider, model, system_message, user_input, temperature) if cache_policy else None
+        if cache_policy and cache_policy.read:
+            cached = response_cache.get(cache_key)
+            if cached is not None:
+                logger.info(f"Response cache hit for model {model}")
+                return cached
+        
+        # Identical concurrent requests share one upstream completion
+        text = await async_single_flight.do(
+            _single_flight_key(provider, model, system_message, user_input, temperature),
+            lambda: _aadmitted_complete(client, provider, model, system_message, user_input, temperature)
+        )
+        if cache_policy and cache_policy.write:
+            response_cache.set(cache_key, text)
+        return text
+    except AdmissionTimeout as e:
+        raise HTTPException(status_code=503, detail=str(e))
     except Exception as e:
         logger.error(f"API error with model {model}: {str(e)}")
         raise HTTPException(status_code=500, detail=f"Failed to generate response from API using {model}.")
     
+async def astream_response(system_message: str, user_input: str, model: Optional[str] = None, temperature: float = 0.7):
+    """
+    Stream a completion as it is generated.
+    
+    Yields ("delta", text) tuples for each token chunk, then a single ("done", info)
+    tuple where info holds `model_used` and `usage` (None if the provider doesn't report it).
+    Blocking-only providers produce the full completion as a single delta.
+    """
+    try:
+        client, model, provider = determine_provider_and_model(model, asynchronous=True)
+    except Exception as e:
+        logger.error(f"Could not select a model for streaming: {str(e)}")
+        raise HTTPException(status_code=500, detail="No language model clients could be initialized.")
+    logger.info(f"Streaming from {provider.value} client with model {model}")
+
+    if provider == ModelProvider.GEMINI or not isinstance(client, AsyncOpenAI):
+        text = await _aadmitted_complete(client, provider, model, system_message, user_input, temperature)
+        yield "delta", text
+        yield "done", {"model_used": model, "usage": None}
+        return
+
+    request_params = {
+        "messages": _chat_messages(system_message, user_input),
+        "model": model,
+        "temperature": temperature,
+        "max_tokens": DEFAULT_MAX_TOKENS,
+        "stream": True,
+    }
+    # Only OpenAI documents usage reporting on streams; other compatible providers may reject the option
+    if provider == ModelProvider.GPT:
+        request_params["stream_options"] = {"include_usage": True}
+
+    usage = None
+    tokens = estimate_tokens(system_message, user_input, max_tokens=DEFAULT_MAX_TOKENS)
+    # The admission slot is held for the whole stream
+    async with admission_controller.aadmit(provider.value, tokens) as ticket:
+        # Health is judged on time to the first byte; mid-stream failures surface to the caller
+        with provider_router.track(provider.value, model):
+            stream = await client.chat.completions.create(**request_params)
+        async for chunk in stream:
+            if getattr(chunk, "usage", None):
+                usage = chunk.usage.model_dump()
+            for choice in chunk.choices:
+                delta = choice.delta.content if choice.delta else None
+                if delta:
+                    yield "delta", delta
+        if usage:
+            ticket.settle(usage.get("total_tokens"))
+    yield "done", {"model_used": model, "usage": usage}
+
 def get_system_prompt(tone: Optional[str], setting: Optional[str]) -> str:
     """Generate a detailed system prompt based on optional parameters."""
     base_prompt = (
@@ -127,4 +275,22 @@ def generate_dialog(client, model: str, system_message: str, user_message: str,
         return response.output_text
     except Exception as e:
         logger.error(f"API error with {model}: {str(e)}")
-        raise HTTPException(status_code=500, detail=f"Failed to generate dialog using {model}.")
\ No newline at end of file
+        raise HTTPException(status_code=500, detail=f"Failed to generate dialog using {model}.")
+
+async def agenerate_dialog(client, model: str, system_message: str, user_message: str, temperature: float) -> str:
+    """Async twin of `generate_dialog`; sync clients are run in the bounded LLM executor."""
+    if not isinstance(client, AsyncOpenAI):
+        return await run_blocking(generate_dialog, client, model, system_message, user_message, temperature)
+    try:
+        response = await client.responses.create(
+            model=model,
+            instructions=system_message,
+            input=user_message,
+            temperature=temperature,
+            max_tokens=1500
+        )
+
+        return response.output_text
+    except Exception as e:
+        logger.error(f"API error with {model}: {str(e)}")
+        raise HTTPException(status_code=500, detail=f"Failed to generate dialog using {model}.")
@@ -0,0 +1,106 @@
+"""
+Concurrent fan-out for batches of improvement jobs.
+
+Each job goes through the same prompts and async completion path as the single
+/improve endpoints. Concurrency is capped per provider (LLM_BATCH_CONCURRENCY, or
+LLM_BATCH_CONCURRENCY_<PROVIDER> to override one provider), and a failing job is
+reported in its own result without affecting the rest of the batch.
+"""
+import asyncio
+import logging
+import os
+from typing import AsyncIterator, Dict, List, Mapping, Optional
+
+from fastapi import HTTPException
+
+from helpers.model_helpers import provider_for_model, select_model
+from schemas.improve import BatchImproveItem, BatchImproveKind, BatchImproveResult
+from services.llm.basic_response import agenerate_response
+from services.llm.response_cache import cache_policy_for
+from templates.improvement_temps import avatar_temp, char_temp, scene_temp
+
+logger = logging.getLogger(__name__)
+
+LLM_BATCH_CONCURRENCY = int(os.getenv("LLM_BATCH_CONCURRENCY", "8"))
+
+# Endpoint names used for the response cache policy of each job kind
+_CACHE_ENDPOINTS = {
+    BatchImproveKind.CHARACTER: "improve.character",
+    BatchImproveKind.SCENE: "improve.character",
+    BatchImproveKind.AVATAR: "improve.avatar",
+    BatchImproveKind.UNI: "improve.uni",
+}
+
+_provider_semaphores: Dict[str, asyncio.Semaphore] = {}
+
+
+def _provider_limit(provider: str) -> int:
+    return int(os.getenv(f"LLM_BATCH_CONCURRENCY_{provider.upper()}", str(LLM_BATCH_CONCURRENCY)))
+
+
+def _semaphore_for(provider: str) -> asyncio.Semaphore:
+    semaphore = _provider_semaphores.get(provider)
+    if semaphore is None:
+        semaphore = asyncio.Semaphore(_provider_limit(provider))
+        _provider_semaphores[provider] = semaphore
+    return semaphore
+
+
+def _prompts_for(item: BatchImproveItem):
+    """Return (system_message, user_input) exactly as the single-item endpoints build them."""
+    if item.kind == BatchImproveKind.CHARACTER:
+        return char_temp, item.text
+    if item.kind == BatchImproveKind.SCENE:
+        return scene_temp, item.text
+    if item.kind == BatchImproveKind.AVATAR:
+        return avatar_temp, item.text
+    return item.instructions, item.text
+
+
+async def _run_item(index: int, item: BatchImproveItem, headers: Optional[Mapping[str, str]]) -> BatchImproveResult:
+    model = None
+    try:
+        # The universal endpoint uses a fixed creativity; keep batch jobs consistent with it
+        creativity = 0.7 if item.kind == BatchImproveKind.UNI else item.creativity
+        _, model, temperature = select_model(item.model_provider, item.model_name, creativity)
+        resolved = provider_for_model(model)
+        provider = resolved.value if resolved else item.model_provider.value
+        system_message, user_input = _prompts_for(item)
+
+        async with _semaphore_for(provider):
+            improved_text = await agenerate_response(
+                system_message, user_input, model, temperature,
+                cache_policy=cache_policy_for(_CACHE_ENDPOINTS[item.kind], headers)
+            )
+        return BatchImproveResult(
+            index=index, id=item.id, kind=item.kind, status="ok",
+            improved_text=improved_text, model_used=model
+        )
+    except Exception as e:
+        detail = e.detail if isinstance(e, HTTPException) else str(e)
+        logger.error(f"Batch item {index} ({item.kind.value}) failed: {detail}")
+        return BatchImproveResult(
+            index=index, id=item.id, kind=item.kind, status="error",
+            model_used=model, error=str(detail)
+        )
+
+
+async def iter_batch_results(items: List[BatchImproveItem],
+                             headers: Optional[Mapping[str, str]] = None) -> AsyncIterator[BatchImproveResult]:
+    """Run all jobs concurrently and yield results in completion order."""
+    tasks = [asyncio.create_task(_run_item(index, item, headers)) for index, item in enumerate(items)]
+    try:
+        for next_done in asyncio.as_completed(tasks):
+            yield await next_done
+    finally:
+        # Client disconnects cancel the generator; don't leave orphaned completions running
+        for task in tasks:
+            if not task.done():
+                task.cancel()
+
+
+async def run_batch(items: List[BatchImproveItem],
+                    headers: Optional[Mapping[str, str]] = None) -> List[BatchImproveResult]:
+    """Run all jobs concurrently and return results in request order."""
+    results = [result async for result in iter_batch_results(items, headers)]
+    return sorted(results, key=lambda r: r.index)
@@ -0,0 +1,24 @@
+"""
+Bounded thread pool for LLM providers that only ship blocking clients.
+
+Async handlers hand blocking provider calls to this pool instead of running them
+on the event loop, so a slow completion cannot stall SSE streams or health checks.
+"""
+import asyncio
+import functools
+import logging
+import os
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable
+
+logger = logging.getLogger(__name__)
+
+LLM_BLOCKING_WORKERS = int(os.getenv("LLM_BLOCKING_WORKERS", "16"))
+
+_executor = ThreadPoolExecutor(max_workers=LLM_BLOCKING_WORKERS, thread_name_prefix="llm-blocking")
+
+
+async def run_blocking(func: Callable[..., Any], *args, **kwargs) -> Any:
+    """Run a blocking provider call in the bounded LLM executor and await its result."""
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(_executor, functools.partial(func, *args, **kwargs))
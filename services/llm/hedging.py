@@ -0,0 +1,131 @@
+"""
+Hedged LLM requests for tail-latency reduction.
+
+When hedging is enabled and the primary call has not finished within a delay taken
+from the primary provider's recent latency percentile, a duplicate request is sent to
+a secondary provider from PROVIDER_CONFIG. The first successful response wins and the
+other is cancelled. A primary that fails before the delay triggers the hedge at once.
+
+Async callers use `ahedged`; synchronous callers (LangChain `.invoke`) use `hedged_call`,
+where a losing thread cannot be interrupted and its result is simply discarded.
+"""
+import asyncio
+import logging
+import os
+import time
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from typing import Any, Awaitable, Callable, Optional, Tuple
+
+from prometheus_client import Counter
+
+from helpers.model_helpers import ModelProvider, healthiest_providers
+from helpers.provider_router import provider_router
+
+logger = logging.getLogger(__name__)
+
+LLM_HEDGING_ENABLED = os.getenv("LLM_HEDGING_ENABLED", "false").lower() == "true"
+LLM_HEDGE_PERCENTILE = float(os.getenv("LLM_HEDGE_PERCENTILE", "0.95"))
+# Below this many latency samples the default delay is used instead of the percentile
+LLM_HEDGE_MIN_SAMPLES = int(os.getenv("LLM_HEDGE_MIN_SAMPLES", "20"))
+LLM_HEDGE_DEFAULT_DELAY = float(os.getenv("LLM_HEDGE_DEFAULT_DELAY", "3.0"))
+LLM_HEDGE_MIN_DELAY = float(os.getenv("LLM_HEDGE_MIN_DELAY", "0.25"))
+LLM_HEDGE_WORKERS = int(os.getenv("LLM_HEDGE_WORKERS", "16"))
+
+# Providers a LangChain ChatOpenAI client can talk to
+OPENAI_COMPATIBLE_PROVIDERS = {ModelProvider.GPT, ModelProvider.GROQ, ModelProvider.NVIDIA, ModelProvider.STUB}
+
+HEDGES_FIRED = Counter("llm_hedges_fired_total", "Duplicate LLM requests sent by hedging", ["call"])
+HEDGES_WON = Counter("llm_hedges_won_total", "Hedged LLM requests won by the duplicate", ["call"])
+HEDGE_OVERHEAD_SECONDS = Counter(
+    "llm_hedge_overhead_seconds_total", "Time duplicate LLM requests spent in flight alongside the primary", ["call"]
+)
+
+_hedge_executor = ThreadPoolExecutor(max_workers=LLM_HEDGE_WORKERS, thread_name_prefix="llm-hedge")
+
+
+def hedging_enabled(requested: Optional[bool] = None) -> bool:
+    """Per-request opt in/out, falling back to LLM_HEDGING_ENABLED."""
+    return LLM_HEDGING_ENABLED if requested is None else requested
+
+
+def hedge_delay(provider: str, model: str) -> float:
+    """Seconds to wait for the primary before hedging, from its latency percentile."""
+    delay = provider_router.latency_percentile(provider, model, LLM_HEDGE_PERCENTILE, LLM_HEDGE_MIN_SAMPLES)
+    if delay is None:
+        return LLM_HEDGE_DEFAULT_DELAY
+    return max(delay, LLM_HEDGE_MIN_DELAY)
+
+
+def hedge_target(primary: ModelProvider, openai_compatible: bool = False) -> Optional[Tuple[ModelProvider, str]]:
+    """Healthiest eligible provider other than the primary, with its default model."""
+    for provider, model in healthiest_providers(exclude=primary):
+        if openai_compatible and provider not in OPENAI_COMPATIBLE_PROVIDERS:
+            continue
+        return provider, model
+    return None
+
+
+async def ahedged(primary: Callable[[], Awaitable[Any]], secondary: Optional[Callable[[], Awaitable[Any]]],
+                  delay: float, call: str) -> Any:
+    """Await primary(); if it is slower than `delay` (or fails), race it against secondary()."""
+    if secondary is None:
+        return await primary()
+
+    first = asyncio.ensure_future(primary())
+    done, _ = await asyncio.wait({first}, timeout=delay)
+    if done and first.exception() is None:
+        return first.result()
+
+    HEDGES_FIRED.labels(call=call).inc()
+    logger.info(f"Hedging {call} after {delay:.2f}s")
+    hedge_start = time.monotonic()
+    second = asyncio.ensure_future(secondary())
+    pending = {first, second} - done
+    try:
+        while pending:
+            done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+            for task in done:
+                if task.exception() is None:
+                    if task is second:
+                        HEDGES_WON.labels(call=call).inc()
+                    return task.result()
+        logger.error(f"Both primary and hedged requests failed for {call}: {second.exception()}")
+        raise first.exception()
+    finally:
+        # provider_router.track does not record a cancelled loser against its provider
+        for task in (first, second):
+            if not task.done():
+                task.cancel()
+        HEDGE_OVERHEAD_SECONDS.labels(call=call).inc(time.monotonic() - hedge_start)
+
+
+def hedged_call(primary: Callable[[], Any], secondary: Optional[Callable[[], Any]], delay: float, call: str) -> Any:
+    """Blocking counterpart of `ahedged` for synchronous clients."""
+    if secondary is None:
+        return primary()
+
+    first = _hedge_executor.submit(primary)
+    done, _ = wait([first], timeout=delay)
+    if done and first.exception() is None:
+        return first.result()
+
+    HEDGES_FIRED.labels(call=call).inc()
+    logger.info(f"Hedging {call} after {delay:.2f}s")
+    hedge_start = time.monotonic()
+    second = _hedge_executor.submit(secondary)
+    pending = {first, second} - done
+    try:
+        while pending:
+            done, pending = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                if future.exception() is None:
+                    if future is second:
+                        HEDGES_WON.labels(call=call).inc()
+                    return future.result()
+        logger.error(f"Both primary and hedged requests failed for {call}: {second.exception()}")
+        raise first.exception()
+    finally:
+        # Running threads can't be interrupted; cancel() only drops work not yet started
+        for future in (first, second):
+            future.cancel()
+        HEDGE_OVERHEAD_SECONDS.labels(call=call).inc(time.monotonic() - hedge_start)
@@ -0,0 +1,205 @@
+"""
+Content-addressed cache for LLM text completions.
+
+Entries are keyed on a SHA-256 of (provider, model, system prompt, user prompt,
+temperature, max_tokens). The first tier is an in-memory LRU with TTL; an optional
+SQLite tier (LLM_CACHE_DISK_PATH) keeps entries across restarts. Endpoints opt in
+through `cache_policy_for`, and callers can bypass the cache with request headers:
+
+- `X-LLM-Cache: bypass` or `Cache-Control: no-store` - neither read nor write
+- `X-LLM-Cache: refresh` or `Cache-Control: no-cache` - skip the read, store the fresh result
+"""
+import hashlib
+import json
+import logging
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Mapping, Optional, Tuple
+
+from prometheus_client import Counter, Gauge
+
+logger = logging.getLogger(__name__)
+
+LLM_CACHE_ENABLED = os.getenv("LLM_CACHE_ENABLED", "true").lower() == "true"
+LLM_CACHE_MAX_ENTRIES = int(os.getenv("LLM_CACHE_MAX_ENTRIES", "1024"))
+LLM_CACHE_TTL_SECONDS = float(os.getenv("LLM_CACHE_TTL_SECONDS", "3600"))
+LLM_CACHE_DISK_PATH = os.getenv("LLM_CACHE_DISK_PATH")  # e.g. ./llm_cache.sqlite3; unset disables the disk tier
+LLM_CACHE_DISK_TTL_SECONDS = float(os.getenv("LLM_CACHE_DISK_TTL_SECONDS", str(7 * 24 * 3600)))
+
+# Endpoints that use the cache unless disabled via LLM_CACHE_DISABLED_ENDPOINTS (comma separated)
+DEFAULT_CACHED_ENDPOINTS = {
+    "improve.character",
+    "improve.dialog-advanced",
+    "improve.avatar",
+    "improve.uni",
+}
+
+CACHE_HITS = Counter("llm_response_cache_hits_total", "LLM response cache hits", ["tier"])
+CACHE_MISSES = Counter("llm_response_cache_misses_total", "LLM response cache misses")
+CACHE_EVICTIONS = Counter("llm_response_cache_evictions_total", "LLM response cache evictions", ["reason"])
+CACHE_SIZE = Gauge("llm_response_cache_entries", "Entries held in the in-memory LLM response cache")
+
+
+@dataclass(frozen=True)
+class CachePolicy:
+    """Whether a single call may read from and/or write to the response cache."""
+    read: bool = True
+    write: bool = True
+
+
+NO_CACHE = CachePolicy(read=False, write=False)
+
+
+def _configured_endpoints() -> set:
+    enabled = set(DEFAULT_CACHED_ENDPOINTS)
+    extra = os.getenv("LLM_CACHE_ENDPOINTS", "")
+    disabled = os.getenv("LLM_CACHE_DISABLED_ENDPOINTS", "")
+    enabled.update(e.strip() for e in extra.split(",") if e.strip())
+    enabled.difference_update(e.strip() for e in disabled.split(",") if e.strip())
+    return enabled
+
+
+def cache_policy_for(endpoint: str, headers: Optional[Mapping[str, str]] = None) -> CachePolicy:
+    """Resolve the cache policy for an endpoint, honouring bypass headers."""
+    if not LLM_CACHE_ENABLED or endpoint not in _configured_endpoints():
+        return NO_CACHE
+    if headers is None:
+        return CachePolicy()
+
+    directive = (headers.get("x-llm-cache") or "").strip().lower()
+    cache_control = (headers.get("cache-control") or "").lower()
+    if directive == "bypass" or "no-store" in cache_control:
+        return NO_CACHE
+    if directive == "refresh" or "no-cache" in cache_control:
+        return CachePolicy(read=False, write=True)
+    return CachePolicy()
+
+
+def make_cache_key(provider: str, model: str, system_message: str, user_input: str,
+                   temperature: Optional[float], max_tokens: Optional[int]) -> str:
+    """Content hash identifying a completion request."""
+    payload = json.dumps(
+        [provider, model, system_message, user_input, temperature, max_tokens],
+        ensure_ascii=False,
+        separators=(",", ":"),
+    )
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+class _DiskTier:
+    """SQLite-backed second tier; failures are logged and treated as misses."""
+
+    def __init__(self, path: str, ttl_seconds: float):
+        self.ttl_seconds = ttl_seconds
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS llm_response_cache ("
+            "key TEXT PRIMARY KEY, value TEXT NOT NULL, created_at REAL NOT NULL)"
+        )
+        self._conn.commit()
+
+    def get(self, key: str) -> Optional[str]:
+        try:
+            with self._lock:
+                row = self._conn.execute(
+                    "SELECT value, created_at FROM llm_response_cache WHERE key = ?", (key,)
+                ).fetchone()
+                if row is None:
+                    return None
+                value, created_at = row
+                if time.time() - created_at > self.ttl_seconds:
+                    self._conn.execute("DELETE FROM llm_response_cache WHERE key = ?", (key,))
+                    self._conn.commit()
+                    CACHE_EVICTIONS.labels(reason="disk_ttl").inc()
+                    return None
+                return value
+        except sqlite3.Error as e:
+            logger.error(f"LLM cache disk read failed: {str(e)}")
+            return None
+
+    def set(self, key: str, value: str):
+        try:
+            with self._lock:
+                self._conn.execute(
+                    "INSERT OR REPLACE INTO llm_response_cache (key, value, created_at) VALUES (?, ?, ?)",
+                    (key, value, time.time()),
+                )
+                self._conn.commit()
+        except sqlite3.Error as e:
+            logger.error(f"LLM cache disk write failed: {str(e)}")
+
+    def clear(self):
+        with self._lock:
+            self._conn.execute("DELETE FROM llm_response_cache")
+            self._conn.commit()
+
+
+class ResponseCache:
+    """Thread-safe LRU + TTL cache of completion texts with an optional disk tier."""
+
+    def __init__(self, max_entries: int = LLM_CACHE_MAX_ENTRIES, ttl_seconds: float = LLM_CACHE_TTL_SECONDS,
+                 disk_path: Optional[str] = LLM_CACHE_DISK_PATH):
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self._lock = threading.Lock()
+        self._entries: "OrderedDict[str, Tuple[str, float]]" = OrderedDict()
+        self._disk: Optional[_DiskTier] = None
+        if disk_path:
+            try:
+                self._disk = _DiskTier(disk_path, LLM_CACHE_DISK_TTL_SECONDS)
+                logger.info(f"LLM response cache disk tier enabled at {disk_path}")
+            except sqlite3.Error as e:
+                logger.error(f"Could not open LLM cache disk tier at {disk_path}: {str(e)}")
+
+    def get(self, key: str) -> Optional[str]:
+        now = time.monotonic()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                value, expires_at = entry
+                if expires_at > now:
+                    self._entries.move_to_end(key)
+                    CACHE_HITS.labels(tier="memory").inc()
+                    return value
+                del self._entries[key]
+                CACHE_EVICTIONS.labels(reason="ttl").inc()
+                CACHE_SIZE.set(len(self._entries))
+
+        if self._disk is not None:
+            value = self._disk.get(key)
+            if value is not None:
+                self._store_in_memory(key, value)
+                CACHE_HITS.labels(tier="disk").inc()
+                return value
+
+        CACHE_MISSES.inc()
+        return None
+
+    def set(self, key: str, value: str):
+        self._store_in_memory(key, value)
+        if self._disk is not None:
+            self._disk.set(key, value)
+
+    def _store_in_memory(self, key: str, value: str):
+        with self._lock:
+            self._entries[key] = (value, time.monotonic() + self.ttl_seconds)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                CACHE_EVICTIONS.labels(reason="lru").inc()
+            CACHE_SIZE.set(len(self._entries))
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            CACHE_SIZE.set(0)
+        if self._disk is not None:
+            self._disk.clear()
+
+
+response_cache = ResponseCache()
@@ -0,0 +1,104 @@
+"""
+Single-flight deduplication of identical in-flight LLM requests.
+
+Concurrent callers with the same request key share one upstream completion: the
+first caller starts it and later callers wait for its result (or its error). For
+coroutines the shared call runs as its own task; a cancelled waiter only detaches
+itself, and the shared call is cancelled once no waiters remain.
+"""
+import asyncio
+import logging
+import threading
+from typing import Any, Awaitable, Callable, Dict, Optional, Tuple
+
+from prometheus_client import Counter
+
+logger = logging.getLogger(__name__)
+
+SINGLE_FLIGHT_SHARED = Counter(
+    "llm_single_flight_shared_total", "LLM calls that joined an identical in-flight request", ["mode"]
+)
+
+
+class _AsyncCall:
+    def __init__(self, task: "asyncio.Task"):
+        self.task = task
+        self.waiters = 0
+
+
+class AsyncSingleFlight:
+    """Deduplicates concurrent coroutine calls by key."""
+
+    def __init__(self):
+        self._calls: Dict[Tuple[int, str], _AsyncCall] = {}
+
+    async def do(self, key: str, fn: Callable[[], Awaitable[Any]]) -> Any:
+        # Tasks are bound to their loop, so calls are only shared within one loop
+        call_key = (id(asyncio.get_running_loop()), key)
+        call = self._calls.get(call_key)
+        if call is None:
+            call = _AsyncCall(asyncio.ensure_future(fn()))
+            self._calls[call_key] = call
+            call.task.add_done_callback(lambda _: self._forget(call_key, call))
+        else:
+            SINGLE_FLIGHT_SHARED.labels(mode="async").inc()
+            logger.info(f"Joining in-flight LLM request {key[:12]}")
+
+        call.waiters += 1
+        try:
+            return await asyncio.shield(call.task)
+        finally:
+            call.waiters -= 1
+            if call.waiters == 0 and not call.task.done():
+                # Every waiter went away; nobody needs the result any more
+                call.task.cancel()
+
+    def _forget(self, call_key: Tuple[int, str], call: _AsyncCall):
+        if self._calls.get(call_key) is call:
+            del self._calls[call_key]
+
+
+class _ThreadCall:
+    def __init__(self):
+        self.done = threading.Event()
+        self.result: Any = None
+        self.error: Optional[BaseException] = None
+
+
+class SingleFlight:
+    """Deduplicates concurrent blocking calls by key."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._calls: Dict[str, _ThreadCall] = {}
+
+    def do(self, key: str, fn: Callable[[], Any]) -> Any:
+        with self._lock:
+            call = self._calls.get(key)
+            leader = call is None
+            if leader:
+                call = _ThreadCall()
+                self._calls[key] = call
+
+        if not leader:
+            SINGLE_FLIGHT_SHARED.labels(mode="sync").inc()
+            logger.info(f"Joining in-flight LLM request {key[:12]}")
+            call.done.wait()
+            if call.error is not None:
+                raise call.error
+            return call.result
+
+        try:
+            call.result = fn()
+            return call.result
+        except BaseException as e:
+            call.error = e
+            raise
+        finally:
+            with self._lock:
+                del self._calls[key]
+            call.done.set()
+
+
+single_flight = SingleFlight()
+async_single_flight = AsyncSingleFlight()
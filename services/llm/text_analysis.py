@@ -4,8 +4,10 @@ from templates.improvement_temps import transcription_temp
 import re
 from dotenv import load_dotenv
 from fastapi import HTTPException
-from openai import OpenAI
-from helpers.model_helpers import select_model, ModelProvider
+from openai import AsyncOpenAI
+from helpers.model_helpers import select_model, provider_for_model, ModelProvider
+from services.llm.admission import AdmissionTimeout, admission_controller, estimate_tokens
+from services.llm.blocking import run_blocking
 import logging
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
@@ -13,6 +15,27 @@ logger = logging.getLogger(__name__)
 #--------Analysis---------
 class TextInput(BaseModel):
     text: str
+
+def _blocking_personality_call(client, model: str, temperature: float, system_message: str, user_message: str) -> str:
+    """Personality extraction for blocking-only clients (e.g. Gemini)."""
+    try:
+        response = client.chat.completions.create(
+            model=model,
+            messages=[
+                {"role": "system", "content": system_message},
+                {"role": "user", "content": user_message}
+            ],
+            temperature=temperature
+        )
+        return response.choices[0].message.content.strip()
+    except AttributeError:
+        # Fallback if the client doesn't follow the OpenAI/Groq API pattern
+        logger.warning("Using alternative API pattern for the current client")
+        # For Gemini or other non-standard clients
+        if hasattr(client, "generate_content"):
+            response = client.generate_content([system_message, user_message])
+            return response.text.strip()
+        raise ValueError(f"Unsupported client type: {type(client)}")
     
 async def extract_personality(prompt_input: TextInput):
     """API endpoint to extract personality traits from a given text transcription."""
@@ -27,47 +50,34 @@ async def extract_personality(prompt_input: TextInput):
         client, model, temperature = select_model(
             ModelProvider.GPT,  # Preferably use GPT for structured JSON output
             "gpt-4o",           # Specific model request
-            0.3                 # Low creativity for consistent analysis
+            0.3,                # Low creativity for consistent analysis
+            asynchronous=True
         )
         
+        user_message = f"Analyze this transcription and provide the results as JSON: {prompt_input.text}"
+        
+        provider = provider_for_model(model) or ModelProvider.GPT
+        
         # Handle different client types based on the provider
-        # The client returned from select_model could be OpenAI, Groq, or Gemini
-        if isinstance(client, OpenAI):
-            # OpenAI client approach
-            response = client.chat.completions.create(
-                model=model,
-                messages=[
-                    {"role": "system", "content": system_message},
-                    {"role": "user", "content": f"Analyze this transcription and provide the results as JSON: {prompt_input.text}"}
-                ],
-                response_format={"type": "json_object"},  # Enforce JSON format
-                temperature=temperature
-            )
-            response_text = response.choices[0].message.content.strip()
-        else:
-            # Generic approach for other providers (Groq, Gemini)
-            # This may need to be adjusted based on the actual client API
-            try:
-                response = client.chat.completions.create(
+        # The client returned from select_model could be async OpenAI-compatible (GPT, Groq) or blocking Gemini
+        async with admission_controller.aadmit(provider.value, estimate_tokens(system_message, user_message)) as ticket:
+            if isinstance(client, AsyncOpenAI):
+                # OpenAI client approach
+                response = await client.chat.completions.create(
                     model=model,
                     messages=[
                         {"role": "system", "content": system_message},
-                        {"role": "user", "content": f"Analyze this transcription and provide the results as JSON: {prompt_input.text}"}
+                        {"role": "user", "content": user_message}
                     ],
+                    response_format={"type": "json_object"},  # Enforce JSON format
                     temperature=temperature
                 )
                 response_text = response.choices[0].message.content.strip()
-            except AttributeError:
-                # Fallback if the client doesn't follow the OpenAI/Groq API pattern
-                logger.warning("Using alternative API pattern for the current client")
-                # For Gemini or other non-standard clients
-                if hasattr(client, "generate_content"):
-                    response = client.generate_content(
-                        [system_message, f"Analyze this transcription and provide the results as JSON: {prompt_input.text}"]
-                    )
-                    response_text = response.text.strip()
-                else:
-                    raise ValueError(f"Unsupported client type: {type(client)}")
+                if response.usage:
+                    ticket.settle(response.usage.total_tokens)
+            else:
+                # Blocking-only clients run in the bounded LLM executor
+                response_text = await run_blocking(_blocking_personality_call, client, model, temperature, system_message, user_message)
         
         logger.info(f"Raw response: {response_text[:100]}...")
         
@@ -115,6 +125,8 @@ async def extract_personality(prompt_input: TextInput):
         logger.info("Personality extraction completed successfully.")
         return personality_data
         
+    except AdmissionTimeout as e:
+        raise HTTPException(status_code=503, detail=str(e))
     except Exception as e:
         logger.error(f"Error in extract_personality: {str(e)}")
         raise HTTPException(status_code=500, detail=f"Failed to extract personality: {str(e)}")
\ No newline at end of file
@@ -10,6 +10,13 @@ class EventData(BaseModel):
 
 CONNECTIONS: Dict[str, asyncio.Queue] = {}
 
+# Response headers for text/event-stream endpoints (no caching or proxy buffering)
+SSE_HEADERS = {
+    "Cache-Control": "no-cache",
+    "Connection": "keep-alive",
+    "X-Accel-Buffering": "no"
+}
+
 async def add_client(client_id: str) -> asyncio.Queue:
     queue = asyncio.Queue()
     CONNECTIONS[client_id] = queue